@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Album Art Store
+Content-addressed storage for embedded cover images. Each distinct source image is
+saved once under a hash of its bytes, so every track of an album shares one file.
+Resized variants are rendered on first request and kept alongside the source.
+"""
+
+import io
+import os
+import re
+import base64
+import hashlib
+import tempfile
+import threading
+import importlib.util
+from pathlib import Path
+
+# Pillow is imported when the first thumbnail is rendered
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_ART_PATH = SCRIPT_DIR / '.cache' / 'art'
+
+# Thumbnail edge lengths the server will render (pixels)
+ART_SIZES = (64, 300, 600)
+DEFAULT_ART_SIZE = 300
+
+_HASH_RE = re.compile(r'^[0-9a-f]{32}$')
+_EXTENSIONS = {'image/png': '.png', 'image/jpeg': '.jpg', 'image/gif': '.gif',
+               'image/webp': '.webp', 'image/bmp': '.bmp'}
+_MIME_TYPES = {ext: mime for mime, ext in _EXTENSIONS.items()}
+# Images in no format above are kept as they are and served as opaque bytes
+_UNKNOWN_EXTENSION = '.bin'
+_MIME_TYPES[_UNKNOWN_EXTENSION] = 'application/octet-stream'
+# Variants of sources other than JPEG are rendered as PNG (keeps transparency)
+_VARIANT_EXTENSIONS = {'.jpg': '.jpg'}
+
+
+def art_hash(data):
+    """Return the content hash used to address an image."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def image_type(data):
+    """
+    Find the MIME type an embedded picture is stored and served under.
+
+    The leading bytes decide, since tags often carry a wrong or missing MIME
+    type (GIF and WebP covers labelled image/jpeg, or no type at all).
+
+    Args:
+        data (bytes): Picture data
+
+    Returns:
+        tuple: (mime, extension); unrecognized bytes are application/octet-stream
+    """
+    mime = None
+    if data[:3] == b'\xff\xd8\xff':
+        mime = 'image/jpeg'
+    elif data[:8] == b'\x89PNG\r\n\x1a\n':
+        mime = 'image/png'
+    elif data[:6] in (b'GIF87a', b'GIF89a'):
+        mime = 'image/gif'
+    elif data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        mime = 'image/webp'
+    elif data[:2] == b'BM':
+        mime = 'image/bmp'
+    if mime is None:
+        return _MIME_TYPES[_UNKNOWN_EXTENSION], _UNKNOWN_EXTENSION
+    return mime, _EXTENSIONS[mime]
+
+
+def is_valid_hash(value):
+    """Check that a string looks like an art hash (guards against path tricks)."""
+    return bool(value) and bool(_HASH_RE.match(value))
+
+
+class ArtStore:
+    """
+    Directory of cover images addressed by content hash.
+
+    Layout: ``<root>/<hh>/<hash>.<ext>`` for the original image and
+    ``<root>/<hh>/<hash>-<size>.<ext>`` for resized variants. Writes go
+    through a temporary file and ``os.replace`` so concurrent threads and
+    processes never observe a partial image.
+    """
+
+    def __init__(self, root=DEFAULT_ART_PATH):
+        self.root = Path(root)
+        self._render_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Picklable for process pools; each process gets its own render lock
+        return {'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'])
+
+    def _dir_for(self, digest):
+        return self.root / digest[:2]
+
+    def _write_atomic(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def put(self, data, mime=None):
+        """
+        Store source image bytes if not already present.
+
+        Args:
+            data (bytes): Embedded picture data
+            mime (str): MIME type reported by the tag; the stored type is taken
+                from the image bytes instead (see image_type)
+
+        Returns:
+            str: Content hash of the image
+        """
+        digest = art_hash(data)
+        if self.source_path(digest) is None:
+            _, ext = image_type(data)
+            self._write_atomic(self._dir_for(digest) / f'{digest}{ext}', data)
+        return digest
+
+    def source_path(self, digest):
+        """Return the path of the original image, or None if unknown."""
+        if not is_valid_hash(digest):
+            return None
+        for ext in _MIME_TYPES:
+            path = self._dir_for(digest) / f'{digest}{ext}'
+            if path.exists():
+                return path
+        return None
+
+    def get(self, digest, size=DEFAULT_ART_SIZE):
+        """
+        Return a cover image resized to fit within ``size`` x ``size``.
+
+        Variants are rendered once and reused. Images that already fit, or
+        that Pillow cannot decode, are served as the original bytes.
+
+        Args:
+            digest (str): Content hash returned by put()
+            size (int): One of ART_SIZES
+
+        Returns:
+            tuple: (path, mime) of the image file, or None if the hash is unknown
+        """
+        source = self.source_path(digest)
+        if source is None:
+            return None
+        if size not in ART_SIZES or not PIL_AVAILABLE:
+            return source, _MIME_TYPES[source.suffix]
+
+        variant = source.with_name(f'{digest}-{size}{_VARIANT_EXTENSIONS.get(source.suffix, ".png")}')
+        if variant.exists():
+            return variant, _MIME_TYPES[variant.suffix]
+
+        with self._render_lock:
+            if not variant.exists():
+                rendered = self._render(source, size, variant.suffix)
+                if rendered is None:
+                    return source, _MIME_TYPES[source.suffix]
+                self._write_atomic(variant, rendered)
+        return variant, _MIME_TYPES[variant.suffix]
+
+    def _render(self, source, size, suffix):
+        """Resize an image with LANCZOS into ``suffix``'s format; None if no resize is needed or possible."""
+        from PIL import Image
+        try:
+            with Image.open(source) as image:
+                if image.width <= size and image.height <= size:
+                    return None
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                output = io.BytesIO()
+                if suffix == '.png':
+                    image.save(output, format='PNG')
+                else:
+                    if image.mode not in ('RGB', 'L'):
+                        image = image.convert('RGB')
+                    image.save(output, format='JPEG', quality=85)
+                return output.getvalue()
+        except Exception:
+            return None
+
+    def read_base64(self, digest, size=DEFAULT_ART_SIZE):
+        """
+        Return a cover image as base64 for inline embedding.
+
+        Returns:
+            dict: Album art with 'data' (base64) and 'mime' fields, or None
+        """
+        found = self.get(digest, size)
+        if found is None:
+            return None
+        path, mime = found
+        return {
+            "data": base64.b64encode(path.read_bytes()).decode('utf-8'),
+            "mime": mime,
+        }
+
+
+# Version: v5.2.0
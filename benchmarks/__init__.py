@@ -0,0 +1,12 @@
+"""
+Liquid Music Benchmarks
+Reproducible performance measurements for the metadata pipeline and server.
+
+    python -m benchmarks.synthetic_library --size 10k   # build a test library
+    python -m benchmarks.bench_metadata --size 10k       # time every stage
+
+Libraries are generated deterministically under ``.cache/bench`` and results
+are written as JSON to ``benchmarks/results`` so runs can be compared.
+"""
+
+# Version: v5.2.0
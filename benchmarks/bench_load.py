@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+"""
+HTTP Load Benchmark
+Starts the server against a library and simulates concurrent clients, to find how
+many simultaneous listeners one instance sustains before playback stutters.
+
+Every client keeps one HTTP/1.1 connection open and repeatedly picks an action
+(weighted by --mix), with a short think time in between:
+
+    listen      play a track: sequential 256 KiB Range reads from the start
+    seek        jump to random offsets of a track (Range reads)
+    browse      fetch the folder listing (/api/music-folder)
+    metadata    burst of /api/music-metadata requests, like the folder loader
+    library     the streamed batch listing (/api/music-library)
+    upload      POST a file to /extract-metadata, like dropping a file on the page
+
+Reported per endpoint: requests/s, MB/s, errors, time to first byte and
+p50/p95/p99 latency. Audio reads slower than --stall-ms count as stalls (the
+player would stutter). Server RSS and CPU are sampled throughout. With several
+client counts (``--clients 1,8,32``) each is run in turn and the largest one
+whose stall rate stays under --max-stall-rate is reported as sustained.
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import random
+import signal
+import argparse
+import threading
+import subprocess
+import http.client
+import urllib.parse
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
+
+from benchmarks.timing import save_results, percentile, peak_rss_mb, PSUTIL_AVAILABLE
+from benchmarks.synthetic_library import (LIBRARY_SIZES, DEFAULT_SEED, DEFAULT_LIBRARY_DIR,
+                                          generate_library, library_dir, parse_size, read_manifest)
+from benchmarks.bench_startup import prepare_site, _free_port, _wait_for, _count_audio_files
+
+if PSUTIL_AVAILABLE:
+    import psutil
+
+SITE_DIR = DEFAULT_LIBRARY_DIR / 'load-site'
+
+ACTIONS = ('listen', 'seek', 'browse', 'metadata', 'library', 'upload')
+DEFAULT_MIX = 'listen=60,seek=10,browse=10,metadata=10,library=5,upload=5'
+DEFAULT_CLIENTS = '1,8,32'
+DEFAULT_DURATION = 20.0
+DEFAULT_THINK = 0.05
+# Background workers would make runs hard to compare; leave them out unless asked
+DEFAULT_SERVER_ARGS = '--no-prewarm --hash-jobs 0'
+
+AUDIO_CHUNK = 256 * 1024
+SEEKS_PER_ACTION = 4
+METADATA_BURST = 10
+# An audio read slower than this would drain a typical player buffer
+DEFAULT_STALL_MS = 500.0
+DEFAULT_MAX_STALL_RATE = 0.01
+SAMPLE_INTERVAL = 0.5
+REQUEST_TIMEOUT = 60.0
+START_TIMEOUT = 600.0
+
+
+class EndpointStats:
+    """Latency, time to first byte, bytes and errors of one endpoint."""
+
+    def __init__(self):
+        self.latencies = []
+        self.ttfbs = []
+        self.bytes = 0
+        self.errors = 0
+        self.stalls = 0
+
+    def summary(self, seconds):
+        latencies = sorted(self.latencies)
+        ttfbs = sorted(self.ttfbs)
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'requests_per_sec': round(len(latencies) / seconds, 1) if seconds else None,
+            'mb_per_sec': round(self.bytes / seconds / (1024 * 1024), 2) if seconds else None,
+            'ttfb_p50_ms': _ms(percentile(ttfbs, 50)),
+            'ttfb_p99_ms': _ms(percentile(ttfbs, 99)),
+            'p50_ms': _ms(percentile(latencies, 50)),
+            'p95_ms': _ms(percentile(latencies, 95)),
+            'p99_ms': _ms(percentile(latencies, 99)),
+            'max_ms': _ms(latencies[-1] if latencies else None),
+            'stalls': self.stalls,
+        }
+
+
+class LoadClient(threading.Thread):
+    """
+    One simulated player on its own keep-alive connection.
+
+    Args:
+        port (int): Server port
+        tracks (list): (path, size) of library files
+        library (Path): Library folder, read for uploads
+        mix (list): (action, weight) pairs
+        think (float): Seconds to pause between actions
+        stall_ms (float): Audio reads slower than this count as stalls
+        stop (threading.Event): Set when the run is over
+        seed (int): Random seed of this client
+    """
+
+    def __init__(self, port, tracks, library, mix, think, stall_ms, stop, seed):
+        super().__init__(name=f'load-client-{seed}', daemon=True)
+        self.port = port
+        self.tracks = tracks
+        self.library = Path(library)
+        self.actions = [action for action, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.think = think
+        self.stall = stall_ms / 1000
+        self.stop = stop
+        self.rng = random.Random(seed)
+        self.stats = {}
+        self.conn = None
+
+    def run(self):
+        while not self.stop.is_set():
+            action = self.rng.choices(self.actions, self.weights)[0]
+            try:
+                getattr(self, f'do_{action}')()
+            except (OSError, http.client.HTTPException):
+                self._stats(action).errors += 1
+                self._reset()
+            if self.think:
+                self.stop.wait(self.rng.uniform(0, 2 * self.think))
+        self._reset()
+
+    def _stats(self, endpoint):
+        stats = self.stats.get(endpoint)
+        if stats is None:
+            stats = self.stats[endpoint] = EndpointStats()
+        return stats
+
+    def _reset(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def request(self, endpoint, method, path, body=None, headers=None, ok=(200,)):
+        """Send one request, recording time to first byte and total latency."""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=REQUEST_TIMEOUT)
+        started = time.perf_counter()
+        self.conn.request(method, path, body=body, headers=headers or {})
+        response = self.conn.getresponse()
+        ttfb = time.perf_counter() - started
+        data = response.read()
+        elapsed = time.perf_counter() - started
+        if response.will_close:
+            self._reset()
+        stats = self._stats(endpoint)
+        if response.status not in ok:
+            stats.errors += 1
+            return None
+        stats.latencies.append(elapsed)
+        stats.ttfbs.append(ttfb)
+        stats.bytes += len(data)
+        if endpoint in ('listen', 'seek') and elapsed > self.stall:
+            stats.stalls += 1
+        return data
+
+    def _track(self):
+        return self.rng.choice(self.tracks)
+
+    @staticmethod
+    def _file_url(path):
+        return '/api/music-file/' + urllib.parse.quote(path)
+
+    def do_listen(self):
+        path, size = self._track()
+        if not size:
+            self.request('listen', 'GET', self._file_url(path))
+            return
+        for start in range(0, size, AUDIO_CHUNK):
+            if self.stop.is_set():
+                return
+            end = min(start + AUDIO_CHUNK, size) - 1
+            self.request('listen', 'GET', self._file_url(path),
+                         headers={'Range': f'bytes={start}-{end}'}, ok=(200, 206))
+
+    def do_seek(self):
+        path, size = self._track()
+        if not size:
+            return self.do_listen()
+        for _ in range(SEEKS_PER_ACTION):
+            start = self.rng.randrange(size)
+            end = min(start + AUDIO_CHUNK, size) - 1
+            self.request('seek', 'GET', self._file_url(path),
+                         headers={'Range': f'bytes={start}-{end}'}, ok=(200, 206))
+
+    def do_browse(self):
+        self.request('browse', 'GET', '/api/music-folder')
+
+    def do_metadata(self):
+        for _ in range(METADATA_BURST):
+            path, _ = self._track()
+            self.request('metadata', 'GET', '/api/music-metadata/' + urllib.parse.quote(path))
+
+    def do_library(self):
+        self.request('library', 'GET', '/api/music-library')
+
+    def do_upload(self):
+        path, _ = self._track()
+        data = (self.library / path).read_bytes()
+        self.request('upload', 'POST', '/extract-metadata', body=data,
+                     headers={'X-Filename': urllib.parse.quote(path.rsplit('/', 1)[-1]),
+                              'Content-Type': 'application/octet-stream'})
+
+
+def process_usage(pid):
+    """
+    Return a process's current RSS (MiB) and CPU time used (seconds), or None.
+
+    Uses psutil when installed, /proc on Linux otherwise.
+    """
+    if PSUTIL_AVAILABLE:
+        try:
+            process = psutil.Process(pid)
+            times = process.cpu_times()
+            return process.memory_info().rss / (1024 * 1024), times.user + times.system
+        except psutil.Error:
+            return None
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        cpu = (int(fields[11]) + int(fields[12])) / ticks
+        rss = int(fields[21]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+        return rss, cpu
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class UsageSampler(threading.Thread):
+    """Samples the server's RSS and CPU every SAMPLE_INTERVAL seconds."""
+
+    def __init__(self, pid):
+        super().__init__(name='load-sampler', daemon=True)
+        self.pid = pid
+        self.samples = []   # (monotonic time, rss MiB, cpu seconds)
+        self._done = threading.Event()
+
+    def run(self):
+        while True:
+            usage = process_usage(self.pid)
+            if usage is not None:
+                self.samples.append((time.monotonic(), *usage))
+            if self._done.wait(SAMPLE_INTERVAL):
+                return
+
+    def finish(self):
+        self._done.set()
+        self.join()
+        if len(self.samples) < 2:
+            return None
+        rss = [sample[1] for sample in self.samples]
+        cpu = [(b[2] - a[2]) / (b[0] - a[0]) * 100
+               for a, b in zip(self.samples, self.samples[1:]) if b[0] > a[0]]
+        first, last = self.samples[0], self.samples[-1]
+        return {
+            'rss_mb_peak': round(max(rss), 1),
+            'rss_mb_mean': round(sum(rss) / len(rss), 1),
+            'cpu_percent_mean': round((last[2] - first[2]) / (last[0] - first[0]) * 100, 1),
+            'cpu_percent_peak': round(max(cpu), 1) if cpu else None,
+        }
+
+
+def run_step(port, server_pid, tracks, library, clients, duration, mix, think, stall_ms, seed):
+    """
+    Run one load level and summarize it.
+
+    Returns:
+        dict: Client count, per-endpoint summaries, stall rate and server usage
+    """
+    stop = threading.Event()
+    workers = [LoadClient(port, tracks, library, mix, think, stall_ms, stop, seed * 1000 + i)
+               for i in range(clients)]
+    sampler = UsageSampler(server_pid)
+    sampler.start()
+    client_cpu = time.process_time()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    client_cpu = time.process_time() - client_cpu
+
+    merged = {}
+    for worker in workers:
+        for endpoint, stats in worker.stats.items():
+            total = merged.setdefault(endpoint, EndpointStats())
+            total.latencies.extend(stats.latencies)
+            total.ttfbs.extend(stats.ttfbs)
+            total.bytes += stats.bytes
+            total.errors += stats.errors
+            total.stalls += stats.stalls
+    endpoints = {endpoint: merged[endpoint].summary(elapsed)
+                 for endpoint in ACTIONS if endpoint in merged}
+    audio_reads = sum(endpoints[e]['requests'] for e in ('listen', 'seek') if e in endpoints)
+    stalls = sum(endpoints[e]['stalls'] for e in ('listen', 'seek') if e in endpoints)
+    return {
+        'clients': clients,
+        'seconds': round(elapsed, 2),
+        'endpoints': endpoints,
+        'audio_reads': audio_reads,
+        'stall_rate': round(stalls / audio_reads, 4) if audio_reads else None,
+        'errors': sum(s['errors'] for s in endpoints.values()),
+        'server': sampler.finish(),
+        # A saturated load generator understates what the server can do
+        'client_cpu_percent': round(client_cpu / elapsed * 100, 1),
+    }
+
+
+def _library_tracks(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=START_TIMEOUT)
+    try:
+        conn.request('GET', '/api/music-folder')
+        listing = json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+    return [(item['path'], item['size']) for item in listing]
+
+
+def run_benchmark(library, file_count, levels, duration=DEFAULT_DURATION, mix=None,
+                  think=DEFAULT_THINK, stall_ms=DEFAULT_STALL_MS, server_args=(), seed=DEFAULT_SEED):
+    """
+    Start the server on a scratch copy of the app and run each load level against it.
+
+    Args:
+        library (str): Library folder
+        file_count (int): Audio files the listing must reach before the run starts
+        levels (list): Concurrent client counts, run in order
+        duration (float): Seconds per level
+        mix (list): (action, weight) pairs
+        think (float): Mean pause between a client's actions
+        stall_ms (float): Audio read latency counted as a stall
+        server_args (list): Extra command-line options for server.py
+        seed (int): Random seed of the clients
+
+    Returns:
+        list: One summary per level
+    """
+    site = prepare_site(library, SITE_DIR)
+    port = _free_port()
+    command = [sys.executable, 'server.py', '--no-browser', '--port', str(port), *server_args]
+    process = subprocess.Popen(command, cwd=site, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    steps = []
+    try:
+        _wait_for(port, '/api/music-folder',
+                  lambda status, body: status == 200 and len(json.loads(body)) >= file_count,
+                  time.monotonic() + START_TIMEOUT)
+        tracks = _library_tracks(port)
+        for clients in levels:
+            print(f"⏱️  {clients} client(s) for {duration:.0f}s...", end='', flush=True)
+            step = run_step(port, process.pid, tracks, library, clients, duration,
+                            mix, think, stall_ms, seed)
+            steps.append(step)
+            listen = step['endpoints'].get('listen', {})
+            print(f" {sum(s['requests_per_sec'] for s in step['endpoints'].values()):,.0f} req/s, "
+                  f"audio p99 {_fmt(listen.get('p99_ms'))} ms, "
+                  f"stalls {(step['stall_rate'] or 0) * 100:.2f}%")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return steps
+
+
+def sustained_clients(steps, max_stall_rate=DEFAULT_MAX_STALL_RATE):
+    """Largest client count whose audio stall rate stayed under the limit, or None."""
+    passing = [step['clients'] for step in steps
+               if step['stall_rate'] is not None and step['stall_rate'] <= max_stall_rate
+               and not step['errors']]
+    return max(passing) if passing else None
+
+
+def print_steps(steps):
+    """Print one table per load level."""
+    for step in steps:
+        server = step['server'] or {}
+        print(f"\n👥 {step['clients']} client(s): stalls {(step['stall_rate'] or 0) * 100:.2f}%, "
+              f"errors {step['errors']}, server RSS {_fmt(server.get('rss_mb_peak'))} MB peak, "
+              f"CPU {_fmt(server.get('cpu_percent_mean'))}% mean / "
+              f"{_fmt(server.get('cpu_percent_peak'))}% peak, "
+              f"load generator CPU {step['client_cpu_percent']}%")
+        print(f"{'endpoint':<10}{'req/s':>10}{'MB/s':>9}{'errors':>8}{'ttfb p50':>11}"
+              f"{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}")
+        for name, s in step['endpoints'].items():
+            print(f"{name:<10}{_fmt(s['requests_per_sec']):>10}{_fmt(s['mb_per_sec']):>9}"
+                  f"{s['errors']:>8}{_fmt(s['ttfb_p50_ms']):>11}{_fmt(s['p50_ms']):>11}"
+                  f"{_fmt(s['p95_ms']):>11}{_fmt(s['p99_ms']):>11}")
+
+
+def compare_steps(baseline, current):
+    """Print requests/s and p99 changes per level and endpoint between two result documents."""
+    old_steps = {step['clients']: step for step in baseline.get('steps', [])}
+    print(f"{'clients':<9}{'endpoint':<10}{'req/s':>10}{'change':>10}{'p99 ms':>11}{'change':>10}")
+    for step in current.get('steps', []):
+        old = old_steps.get(step['clients'], {}).get('endpoints', {})
+        for name, s in step['endpoints'].items():
+            o = old.get(name)
+            if not o:
+                print(f"{step['clients']:<9}{name:<10}{_fmt(s['requests_per_sec']):>10}{'new':>10}")
+                continue
+            print(f"{step['clients']:<9}{name:<10}{_fmt(s['requests_per_sec']):>10}"
+                  f"{_pct(o['requests_per_sec'], s['requests_per_sec']):>10}"
+                  f"{_fmt(s['p99_ms']):>11}{_pct(o['p99_ms'], s['p99_ms']):>10}")
+    print(f"\nSustained listeners: {baseline.get('sustained_clients')} -> "
+          f"{current.get('sustained_clients')}")
+
+
+def parse_mix(value):
+    """Parse ``action=weight,...`` into (action, weight) pairs."""
+    mix = []
+    for part in value.split(','):
+        action, _, weight = part.strip().partition('=')
+        if action not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"unknown action {action!r} (choose from {', '.join(ACTIONS)})")
+        try:
+            weight = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight for {action!r}: {weight!r}")
+        if weight > 0:
+            mix.append((action, weight))
+    if not mix:
+        raise argparse.ArgumentTypeError('the mix needs at least one action with a positive weight')
+    return mix
+
+
+def parse_levels(value):
+    """Parse a comma-separated list of client counts."""
+    try:
+        levels = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid client counts: {value!r}")
+    if not levels or min(levels) < 1:
+        raise argparse.ArgumentTypeError('client counts must be at least 1')
+    return levels
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:,}'
+
+
+def _pct(old, new):
+    if not old or new is None:
+        return '-'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Load-test the server with simulated concurrent listeners')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--size', type=parse_size, default=parse_size('1k'),
+                        help=f"Synthetic library size: {', '.join(LIBRARY_SIZES)} or a file count "
+                             "(generated on first use; default: 1k)")
+    source.add_argument('--library', help='Serve an existing music folder instead')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Library and client seed')
+    parser.add_argument('--clients', type=parse_levels, default=parse_levels(DEFAULT_CLIENTS),
+                        help=f'Comma-separated concurrent client counts, run in turn '
+                             f'(default: {DEFAULT_CLIENTS})')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                        help=f'Seconds per client count (default: {DEFAULT_DURATION:.0f})')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Action weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--think', type=float, default=DEFAULT_THINK,
+                        help=f'Mean seconds a client pauses between actions (default: {DEFAULT_THINK})')
+    parser.add_argument('--stall-ms', type=float, default=DEFAULT_STALL_MS,
+                        help=f'Audio read latency counted as a stall (default: {DEFAULT_STALL_MS:.0f})')
+    parser.add_argument('--max-stall-rate', type=float, default=DEFAULT_MAX_STALL_RATE,
+                        help=f'Stall rate a level may have to count as sustained '
+                             f'(default: {DEFAULT_MAX_STALL_RATE})')
+    parser.add_argument('--server-args', default=DEFAULT_SERVER_ARGS,
+                        help=f'Extra server.py options (default: "{DEFAULT_SERVER_ARGS}")')
+    parser.add_argument('-o', '--output', help='Result file (default: benchmarks/results/load-<time>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    if args.library:
+        root = Path(args.library)
+        if not root.is_dir():
+            print(f"❌ Library folder not found: {root}")
+            sys.exit(1)
+        file_count = _count_audio_files(root)
+        library = {'path': str(root), 'synthetic': False, 'count': file_count}
+    else:
+        size_name, count = args.size
+        root = library_dir(size_name)
+        manifest = read_manifest(root)
+        if not manifest or manifest.get('count') != count or manifest.get('seed') != args.seed:
+            print(f"🎼 Generating synthetic library ({count} files) in {root}")
+        manifest = generate_library(root, count, args.seed)
+        file_count = manifest['count']
+        library = dict(manifest, path=str(root), synthetic=True, size=size_name)
+
+    server_args = shlex.split(args.server_args)
+    started = time.perf_counter()
+    steps = run_benchmark(root, file_count, args.clients, args.duration, args.mix, args.think,
+                          args.stall_ms, server_args, args.seed)
+    results = {
+        'library': library,
+        'server_args': server_args,
+        'mix': dict(args.mix),
+        'think': args.think,
+        'stall_ms': args.stall_ms,
+        'duration': round(time.perf_counter() - started, 2),
+        'steps': steps,
+        'sustained_clients': sustained_clients(steps, args.max_stall_rate),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    print_steps(steps)
+    print(f"\n🎧 Sustained listeners (stall rate ≤ {args.max_stall_rate * 100:g}%, no errors): "
+          f"{_fmt(results['sustained_clients'])}")
+    path = save_results('load', results, args.output)
+    print(f"\n💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.compare}:")
+        compare_steps(baseline, results)
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
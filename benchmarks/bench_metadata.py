@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Metadata Pipeline Benchmark
+Times each stage of turning a music folder into library JSON, one stage at a time:
+
+    walk            full LibraryIndex scan (os.scandir + stat of every file)
+    rescan          quick LibraryIndex refresh of an unchanged tree
+    folder_list     /api/music-folder payload (index listing + JSON encode)
+    path_infer      infer_batch over every library path (untagged-file labels)
+    filename_parse  parse_filename_metadata on each file name
+    tag_parse       mutagen load + tag mapping, art skipped
+    fast_tag_parse  the same through the fast tag reader (mutagen for other formats)
+    art_extract     locating the embedded picture in loaded tags
+    art_resize      Pillow thumbnail to 300px and re-encode
+    base64          base64 of the resized cover
+    json_encode     json.dumps of one complete metadata record
+    extract         extract_metadata end to end (the uncached per-file cost)
+
+Each stage runs in a fresh process by default so its peak RSS is its own. Inputs a
+stage needs (loaded tags, cover bytes) are prepared outside the timed region.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
+
+from benchmarks.timing import Stage, save_results, print_stages, compare_stages, peak_rss_mb
+from benchmarks.synthetic_library import (LIBRARY_SIZES, DEFAULT_SEED, generate_library,
+                                          library_dir, parse_size, read_manifest)
+
+LIBRARY_STAGES = ('walk', 'rescan', 'folder_list', 'path_infer')
+FILE_STAGES = ('filename_parse', 'tag_parse', 'fast_tag_parse', 'art_extract', 'art_resize', 'base64',
+               'json_encode', 'extract')
+STAGES = LIBRARY_STAGES + FILE_STAGES
+
+# Whole-library stages are repeated so p50/p99 mean something
+DEFAULT_WALK_REPEATS = 5
+
+
+def _audio_files(root):
+    from metadata_reader import AUDIO_EXTENSIONS
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS:
+                files.append(os.path.join(dirpath, name))
+    return files
+
+
+def _bench_library_stage(name, root, repeats):
+    from library_index import LibraryIndex
+    from metadata_reader import AUDIO_EXTENSIONS
+    from path_metadata import infer_batch
+
+    stage = Stage(name, unit='library')
+    index = LibraryIndex(root, AUDIO_EXTENSIONS)
+    if name != 'walk':
+        index.refresh(full=True)
+    for _ in range(repeats):
+        if name == 'walk':
+            index = LibraryIndex(root, AUDIO_EXTENSIONS)
+            started = time.perf_counter()
+            index.refresh(full=True)
+            stage.add(time.perf_counter() - started, len(index))
+        elif name == 'rescan':
+            with stage.measure(items=len(index)):
+                index.refresh()
+        elif name == 'path_infer':
+            paths = [entry.path for entry in index.entries()]
+            with stage.measure(items=len(paths)):
+                infer_batch(paths)
+        else:
+            with stage.measure(items=len(index)):
+                json.dumps(index.listing()).encode('utf-8')
+    return stage
+
+
+def _bench_file_stage(name, files):
+    from mutagen import File
+    import metadata_reader as reader
+
+    stage = Stage(name)
+    for path in files:
+        if name == 'filename_parse':
+            filename = os.path.basename(path)
+            with stage.measure():
+                reader.parse_filename_metadata(filename)
+            continue
+
+        if name == 'extract':
+            with stage.measure():
+                reader.extract_metadata(path)
+            continue
+
+        if name == 'json_encode':
+            metadata = reader.extract_metadata(path)
+            with stage.measure():
+                json.dumps(metadata).encode('utf-8')
+            continue
+
+        if name == 'tag_parse':
+            size, filename = os.path.getsize(path), os.path.basename(path)
+            with stage.measure():
+                audio_file = File(path)
+                reader._metadata_from_audio_file(audio_file, size, filename, include_art=False)
+            continue
+
+        if name == 'fast_tag_parse':
+            with stage.measure():
+                reader.extract_metadata(path, include_art=False)
+            continue
+
+        audio_file = File(path)
+        if name == 'art_extract':
+            with stage.measure():
+                picture = reader.extract_album_art_data(audio_file)
+            if picture is None:
+                stage.skipped += 1
+            continue
+
+        picture = reader.extract_album_art_data(audio_file)
+        if picture is None:
+            stage.skipped += 1
+            continue
+        data, mime = picture
+        if name == 'art_resize':
+            with stage.measure():
+                reader.resize_album_art(data, mime)
+        else:
+            resized = reader.resize_album_art(data, mime)
+            with stage.measure():
+                base64.b64encode(resized).decode('utf-8')
+    return stage
+
+
+def run_stage(name, root, files, repeats=DEFAULT_WALK_REPEATS):
+    """Run one stage in the current process and return its summary."""
+    if name in LIBRARY_STAGES:
+        stage = _bench_library_stage(name, root, repeats)
+    else:
+        stage = _bench_file_stage(name, files)
+    return stage.summary()
+
+
+def run_benchmark(root, stages=STAGES, limit=None, isolate=True, repeats=DEFAULT_WALK_REPEATS):
+    """
+    Time the selected stages against a library folder.
+
+    Args:
+        root (str): Library folder
+        stages (tuple): Stage names to run, in order
+        limit (int): Only use the first N files for per-file stages
+        isolate (bool): Run every stage in its own process
+        repeats (int): Repetitions of whole-library stages
+
+    Returns:
+        dict: Stage name -> summary
+    """
+    files = _audio_files(root)
+    if limit:
+        files = files[:limit]
+    results = {}
+    for name in stages:
+        print(f"⏱️  {name}...", end='', flush=True)
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                summary = pool.submit(run_stage, name, str(root), files, repeats).result()
+        else:
+            summary = run_stage(name, str(root), files, repeats)
+        results[name] = summary
+        print(f" {summary['files_per_sec'] or 0:,.0f} files/s")
+    return results
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Benchmark the metadata pipeline stage by stage')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--size', type=parse_size, default=parse_size('1k'),
+                        help=f"Synthetic library size: {', '.join(LIBRARY_SIZES)} or a file count "
+                             "(generated on first use; default: 1k)")
+    source.add_argument('--library', help='Benchmark an existing music folder instead')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Synthetic library seed')
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"Comma-separated stages to run (default: all of {','.join(STAGES)})")
+    parser.add_argument('--limit', type=int, help='Use only the first N files for per-file stages')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_WALK_REPEATS,
+                        help='Repetitions of the walk/rescan/folder_list stages')
+    parser.add_argument('--in-process', action='store_true',
+                        help='Run all stages in this process (peak RSS becomes cumulative)')
+    parser.add_argument('-o', '--output', help='Result file (default: benchmarks/results/metadata-<time>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    if args.library:
+        root = Path(args.library)
+        if not root.is_dir():
+            print(f"❌ Library folder not found: {root}")
+            sys.exit(1)
+        library = {'path': str(root), 'synthetic': False}
+    else:
+        size_name, count = args.size
+        root = library_dir(size_name)
+        manifest = read_manifest(root)
+        if not manifest or manifest.get('count') != count or manifest.get('seed') != args.seed:
+            print(f"🎼 Generating synthetic library ({count} files) in {root}")
+        manifest = generate_library(root, count, args.seed)
+        library = dict(manifest, path=str(root), synthetic=True, size=size_name)
+
+    started = time.perf_counter()
+    stage_results = run_benchmark(root, stages, args.limit, not args.in_process, args.repeats)
+    results = {
+        'library': library,
+        'limit': args.limit,
+        'isolated': not args.in_process,
+        'duration': round(time.perf_counter() - started, 2),
+        'stages': stage_results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    print()
+    print_stages(stage_results)
+    path = save_results('metadata', results, args.output)
+    print(f"\n💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.compare}:")
+        compare_stages(baseline, results)
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Startup Benchmark
+Times how quickly a freshly started server becomes useful:
+
+    import          ``import server`` in a new interpreter
+    listen          process start until the app page (/) is served
+    library         process start until /api/music-folder lists every file
+    search          process start until /api/search answers (index built)
+
+The last three are measured for a cold start (no caches or library snapshot) and a
+warm start (caches and snapshot left by the previous run), e.g. ``listen_warm``.
+The server runs from a scratch copy of the app in .cache/bench/startup-site whose
+music folder links to the benchmark library, so the real caches are not touched.
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import signal
+import socket
+import argparse
+import subprocess
+import http.client
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
+
+from benchmarks.timing import Stage, save_results, print_stages, compare_stages, peak_rss_mb
+from benchmarks.synthetic_library import (LIBRARY_SIZES, DEFAULT_SEED, DEFAULT_LIBRARY_DIR,
+                                          generate_library, library_dir, parse_size, read_manifest)
+
+SITE_DIR = DEFAULT_LIBRARY_DIR / 'startup-site'
+SITE_FILES = ('*.py', 'index.html', 'styles.css', 'script.js')
+
+# Modules the server should not import before they are needed
+HEAVY_MODULES = ('mutagen', 'PIL', 'numpy')
+
+PHASES = ('listen', 'library', 'search')
+DEFAULT_REPEATS = 3
+# Background workers compete with startup for CPU; leave them out unless asked
+DEFAULT_SERVER_ARGS = '--no-prewarm --hash-jobs 0'
+START_TIMEOUT = 600.0
+POLL_INTERVAL = 0.005
+
+
+def prepare_site(library, site=SITE_DIR):
+    """Copy the app into ``site`` and point its music folder at ``library``."""
+    site = Path(site)
+    site.mkdir(parents=True, exist_ok=True)
+    for pattern in SITE_FILES:
+        for source in REPO_DIR.glob(pattern):
+            shutil.copy2(source, site / source.name)
+    music = site / 'music'
+    if music.is_symlink() or music.is_file():
+        music.unlink()
+    elif music.is_dir():
+        shutil.rmtree(music)
+    music.symlink_to(Path(library).resolve(), target_is_directory=True)
+    return site
+
+
+def measure_import(site):
+    """
+    Time ``import server`` in a new interpreter.
+
+    Returns:
+        tuple: (seconds, heavy modules that were imported)
+    """
+    code = ("import sys, time, json\n"
+            "started = time.perf_counter()\n"
+            "import server\n"
+            "elapsed = time.perf_counter() - started\n"
+            f"print(json.dumps([elapsed, [m for m in {HEAVY_MODULES!r} if m in sys.modules]]))\n")
+    result = subprocess.run([sys.executable, '-c', code], cwd=site, capture_output=True,
+                            text=True, check=True)
+    elapsed, loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, loaded
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _get(port, path):
+    """Return (status, body) of a GET request, or None if the server is not listening yet."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=START_TIMEOUT)
+    try:
+        conn.request('GET', path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    except OSError:
+        return None
+    finally:
+        conn.close()
+
+
+def _wait_for(port, path, ready, deadline):
+    while time.monotonic() < deadline:
+        result = _get(port, path)
+        if result is not None and ready(*result):
+            return
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"{path} not ready within {START_TIMEOUT:.0f}s")
+
+
+def measure_start(site, file_count, server_args):
+    """
+    Start the server once and time each phase from process start.
+
+    Returns:
+        dict: Phase name -> seconds
+    """
+    port = _free_port()
+    command = [sys.executable, 'server.py', '--no-browser', '--port', str(port), *server_args]
+    started = time.perf_counter()
+    deadline = time.monotonic() + START_TIMEOUT
+    process = subprocess.Popen(command, cwd=site, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        _wait_for(port, '/', lambda status, body: status == 200, deadline)
+        timings['listen'] = time.perf_counter() - started
+        _wait_for(port, '/api/music-folder',
+                  lambda status, body: status == 200 and len(json.loads(body)) >= file_count,
+                  deadline)
+        timings['library'] = time.perf_counter() - started
+        _wait_for(port, '/api/search?q=a&limit=1', lambda status, body: status == 200, deadline)
+        timings['search'] = time.perf_counter() - started
+    finally:
+        # SIGTERM shuts down cleanly, which saves the library snapshot
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return timings
+
+
+def run_benchmark(library, file_count, repeats=DEFAULT_REPEATS, server_args=()):
+    """
+    Measure import time and cold and warm starts against a library folder.
+
+    Args:
+        library (str): Library folder
+        file_count (int): Audio files the library listing must reach
+        repeats (int): Cold/warm start pairs to run
+        server_args (list): Extra command-line options for server.py
+
+    Returns:
+        tuple: (stage name -> summary, heavy modules imported by ``import server``)
+    """
+    site = prepare_site(library)
+    stages = {'import': Stage('import', unit='start')}
+    for kind in ('cold', 'warm'):
+        for phase in PHASES:
+            stages[f'{phase}_{kind}'] = Stage(f'{phase}_{kind}', unit='start')
+
+    loaded = []
+    for run in range(repeats):
+        print(f"⏱️  run {run + 1}/{repeats}...", end='', flush=True)
+        elapsed, loaded = measure_import(site)
+        stages['import'].add(elapsed)
+        for kind in ('cold', 'warm'):
+            if kind == 'cold':
+                shutil.rmtree(site / '.cache', ignore_errors=True)
+            for phase, seconds in measure_start(site, file_count, server_args).items():
+                stages[f'{phase}_{kind}'].add(seconds)
+        print(f" listening after {stages['listen_cold'].durations[-1] * 1000:,.0f} ms cold, "
+              f"{stages['listen_warm'].durations[-1] * 1000:,.0f} ms warm")
+    return {name: stage.summary() for name, stage in stages.items()}, loaded
+
+
+def _count_audio_files(root):
+    from metadata_reader import AUDIO_EXTENSIONS
+    return sum(1 for _, _, names in os.walk(root)
+               for name in names if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS)
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Benchmark server import time and time to first request')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--size', type=parse_size, default=parse_size('1k'),
+                        help=f"Synthetic library size: {', '.join(LIBRARY_SIZES)} or a file count "
+                             "(generated on first use; default: 1k)")
+    source.add_argument('--library', help='Benchmark an existing music folder instead')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Synthetic library seed')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS,
+                        help=f'Cold/warm start pairs (default: {DEFAULT_REPEATS})')
+    parser.add_argument('--server-args', default=DEFAULT_SERVER_ARGS,
+                        help=f'Extra server.py options (default: "{DEFAULT_SERVER_ARGS}")')
+    parser.add_argument('-o', '--output', help='Result file (default: benchmarks/results/startup-<time>.json)')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    args = parser.parse_args()
+
+    if args.library:
+        root = Path(args.library)
+        if not root.is_dir():
+            print(f"❌ Library folder not found: {root}")
+            sys.exit(1)
+        file_count = _count_audio_files(root)
+        library = {'path': str(root), 'synthetic': False, 'count': file_count}
+    else:
+        size_name, count = args.size
+        root = library_dir(size_name)
+        manifest = read_manifest(root)
+        if not manifest or manifest.get('count') != count or manifest.get('seed') != args.seed:
+            print(f"🎼 Generating synthetic library ({count} files) in {root}")
+        manifest = generate_library(root, count, args.seed)
+        file_count = manifest['count']
+        library = dict(manifest, path=str(root), synthetic=True, size=size_name)
+
+    server_args = shlex.split(args.server_args)
+    started = time.perf_counter()
+    stage_results, loaded = run_benchmark(root, file_count, args.repeats, server_args)
+    results = {
+        'library': library,
+        'server_args': server_args,
+        'duration': round(time.perf_counter() - started, 2),
+        'stages': stage_results,
+        'heavy_imports': loaded,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    print()
+    print_stages(stage_results)
+    if loaded:
+        print(f"\n⚠️  import server also imported: {', '.join(loaded)}")
+    path = save_results('startup', results, args.output)
+    print(f"\n💾 Results saved to {path}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n📊 Compared with {args.compare}:")
+        compare_stages(baseline, results)
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
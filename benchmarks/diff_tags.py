@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Fast Tag Reader Differential Check
+Reads every MP3, FLAC and M4A file of a library with both the fast tag reader
+(fast_tags.py) and mutagen, and compares what metadata_reader makes of each:
+
+    metadata    the extract_metadata dictionary without album art
+    picture     the embedded cover bytes and MIME type art extraction picks
+
+Files the fast reader hands back to mutagen (Unsupported) are counted per reason;
+they are correct by construction. Besides the synthetic library, a set of crafted
+edge cases (UTF-16 text, TYER dates, numeric genres, ID3v1 trailers, Xing/LAME
+headers, Vorbis comment quirks, MP4 cover and freeform atoms, ...) is written to
+.cache/bench/tag-edge-cases and checked too.
+
+Also times the tag read of both paths. Exits with status 1 on any mismatch.
+tests/test_fast_tags.py runs the same comparison on a small synthetic library
+and the edge cases as part of the test suite; this script checks large or real
+libraries.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import struct
+import shutil
+import argparse
+from pathlib import Path
+from collections import Counter
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
+
+from benchmarks.timing import Stage, save_results, print_stages
+from benchmarks.synthetic_library import (LIBRARY_SIZES, DEFAULT_SEED, DEFAULT_LIBRARY_DIR,
+                                          generate_library, library_dir, parse_size, read_manifest)
+
+EDGE_CASE_DIR = DEFAULT_LIBRARY_DIR / 'tag-edge-cases'
+
+# Mismatches printed in full before the summary
+SHOWN_MISMATCHES = 10
+
+_COVER = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 4
+_PNG_COVER = b'\x89PNG\r\n\x1a\n' + bytes(range(255, -1, -1)) * 3
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, joint stereo: 417-byte frames
+_MP3_HEADER = b'\xff\xfb\x90\x64'
+_MP3_FRAME = _MP3_HEADER + b'\x00' * 413
+
+
+def _xing_frame(frames, delay=576, padding=1152, lame=True):
+    """A first MPEG frame carrying a Xing header and, optionally, a LAME extension."""
+    body = b'\x00' * 32 + b'Xing' + struct.pack('>I', 0x0F)
+    body += struct.pack('>II', frames, frames * 417) + bytes(range(100)) + struct.pack('>I', 78)
+    if lame:
+        lame_header = bytearray(27)
+        lame_header[12:15] = bytes((delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8), padding & 0xFF))
+        body += b'LAME3.100' + b'\x00' * 11 + bytes(lame_header)
+    return _MP3_HEADER + body + b'\x00' * (413 - len(body))
+
+
+def _flac_stream(seconds=3, rate=44100):
+    samples = rate * seconds
+    packed = (rate << 44) | (1 << 41) | (15 << 36) | samples
+    return struct.pack('>HH', 4096, 4096) + b'\x00' * 6 + packed.to_bytes(8, 'big') + b'\x00' * 16
+
+
+def _flac_block(code, payload, last=False):
+    return bytes(((0x80 if last else 0) | code,)) + len(payload).to_bytes(3, 'big') + payload
+
+
+def _vorbis_comment(comments, vendor=b'diff_tags'):
+    data = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+    for comment in comments:
+        data += struct.pack('<I', len(comment)) + comment
+    return data
+
+
+def _flac_picture_block(data, mime=b'image/jpeg', desc=b'Cover'):
+    return (struct.pack('>2I', 3, len(mime)) + mime + struct.pack('>I', len(desc)) + desc
+            + struct.pack('>5I', 300, 300, 24, 0, len(data)) + data)
+
+
+def _atom(name, payload):
+    return struct.pack('>I4s', 8 + len(payload), name) + payload
+
+
+def _data_atom(payload, flags=1):
+    return _atom(b'data', struct.pack('>I', flags) + b'\x00' * 4 + payload)
+
+
+def _mp4_file(items, seconds=3, stsd=True, extra=b''):
+    """ftyp + moov (sound track, optional stsd, ilst built from ``items``) + mdat."""
+    timescale = 44100
+    mdhd = _atom(b'mdhd', struct.pack('>B3xIIIIHH', 0, 0, 0, timescale, timescale * seconds, 0x55c4, 0))
+    hdlr = _atom(b'hdlr', struct.pack('>B3xI4s12x', 0, 0, b'soun') + b'SoundHandler\x00')
+    minf = b''
+    if stsd:
+        esds = _atom(b'esds', b'\x00' * 4 + bytes.fromhex('03190000000411401500000000000000000000000005021210'
+                                                          '060102'))
+        entry = _atom(b'mp4a', b'\x00' * 6 + struct.pack('>H', 1) + b'\x00' * 8
+                      + struct.pack('>HHHHI', 2, 16, 0, 0, timescale << 16) + esds)
+        minf = _atom(b'minf', _atom(b'stbl', _atom(b'stsd', struct.pack('>II', 0, 1) + entry)))
+    trak = _atom(b'trak', _atom(b'mdia', mdhd + hdlr + minf))
+    moov = trak
+    if items is not None:
+        ilst = _atom(b'ilst', b''.join(_atom(name, payload) for name, payload in items))
+        meta = _atom(b'meta', b'\x00' * 4 + _atom(b'hdlr', b'\x00' * 8 + b'mdirappl' + b'\x00' * 9) + ilst)
+        moov += _atom(b'udta', meta)
+    return (_atom(b'ftyp', b'M4A \x00\x00\x02\x00M4A mp42isom') + _atom(b'moov', moov + extra)
+            + _atom(b'mdat', b'\x00' * 64))
+
+
+def _id3_text(frame, text, encoding=3, version=4):
+    if encoding == 0:
+        data = text.encode('latin1')
+    elif encoding == 1:
+        data = b'\x00\x00'.join(b'\xff\xfe' + value.encode('utf-16-le') for value in text.split('\x00'))
+    elif encoding == 2:
+        data = text.encode('utf-16-be')
+    else:
+        data = text.encode('utf-8')
+    return _id3_frame(frame, bytes((encoding,)) + data, version)
+
+
+def _id3_frame(name, payload, version=4, flags=0):
+    size = len(payload)
+    if version == 4:
+        size = sum(((size >> (7 * i)) & 0x7F) << (8 * i) for i in range(4))
+    return name.encode('ascii') + struct.pack('>IH', size, flags) + payload
+
+
+def _id3_tag(frames, version=4, padding=64):
+    body = b''.join(frames) + b'\x00' * padding
+    size = len(body)
+    synchsafe = sum(((size >> (7 * i)) & 0x7F) << (8 * i) for i in range(4))
+    return b'ID3' + bytes((version, 0, 0)) + struct.pack('>I', synchsafe) + body
+
+
+def _apic(desc, data, mime=b'image/jpeg', version=4):
+    return _id3_frame('APIC', b'\x03' + mime + b'\x00\x03' + desc.encode('utf-8') + b'\x00' + data, version)
+
+
+def edge_cases():
+    """Crafted files as {file name: bytes}."""
+    audio = _MP3_FRAME * 40
+    v3 = dict(version=3)
+    cases = {
+        'mp3-no-tags.mp3': audio,
+        'mp3-utf16.mp3': _id3_tag([_id3_text('TIT2', 'Ünïcode ☃ 𝄞', 1), _id3_text('TPE1', 'Björk\x00Other', 1),
+                                   _id3_text('TALB', 'Álbum', 2), _id3_text('TRCK', '7', 0)]) + audio,
+        'mp3-utf16-no-bom.mp3': _id3_tag([_id3_frame('TIT2', b'\x01' + 'No BOM'.encode('utf-16-le'))]) + audio,
+        'mp3-latin1.mp3': _id3_tag([_id3_text('TIT2', 'Café Señor', 0), _id3_text('TCON', 'Trip-Hop', 0)])
+                          + audio,
+        'mp3-v23-tyer.mp3': _id3_tag([_id3_text('TIT2', 'Year', **v3), _id3_text('TYER', '1999', **v3),
+                                      _id3_text('TCON', 'Rock', **v3)], version=3) + audio,
+        'mp3-v23-tyer-junk.mp3': _id3_tag([_id3_text('TIT2', 'Junk', **v3), _id3_text('TYER', '99', **v3)],
+                                          version=3) + audio,
+        'mp3-tdrc-and-tyer.mp3': _id3_tag([_id3_text('TDRC', '2001', **v3), _id3_text('TYER', '1990', **v3)],
+                                          version=3) + audio,
+        'mp3-tdrc-full.mp3': _id3_tag([_id3_text('TDRC', '2001-02-03'), _id3_text('TIT2', 'x')]) + audio,
+        'mp3-tdrc-time.mp3': _id3_tag([_id3_text('TDRC', '2001-02-03T04:05')]) + audio,
+        'mp3-numeric-genre.mp3': _id3_tag([_id3_text('TCON', '(17)Rock')]) + audio,
+        'mp3-genre-id.mp3': _id3_tag([_id3_text('TCON', '17')]) + audio,
+        'mp3-id3v1.mp3': _id3_tag([_id3_text('TIT2', 'v1')]) + audio
+                         + b'TAG' + b'Title'.ljust(30, b'\x00') + b'\x00' * 94 + b'\xff',
+        'mp3-apics.mp3': _id3_tag([_apic('back', _COVER[:100]), _apic('front cover', _COVER),
+                                   _id3_text('TIT2', 'Pics')]) + audio,
+        'mp3-apic-empty.mp3': _id3_tag([_apic('', b''), _apic('other', _PNG_COVER, b'image/png')]) + audio,
+        'mp3-apic-no-mime.mp3': _id3_tag([_apic('Cover', _COVER, b'')]) + audio,
+        'mp3-xing-lame.mp3': _id3_tag([_id3_text('TIT2', 'Xing')]) + _xing_frame(40) + audio,
+        'mp3-xing-no-lame.mp3': _xing_frame(40, lame=False) + audio,
+        'mp3-xing-short.mp3': _xing_frame(1, delay=2000, padding=2000) + _MP3_FRAME,
+        'mp3-junk-before-audio.mp3': _id3_tag([_id3_text('TIT2', 'Junk')]) + b'\x00\xff\x00' * 50 + audio,
+        'mp3-empty-frame.mp3': _id3_tag([_id3_frame('TIT2', b''), _id3_text('TPE1', '')]) + audio,
+        'mp3-multi-value.mp3': _id3_tag([_id3_text('TPE1', 'A\x00B\x00'), _id3_text('TRCK', '3/12')]) + audio,
+        'mp3-stacked-id3.mp3': _id3_tag([_id3_text('TIT2', 'First')]) + _id3_tag([_id3_text('TIT2', 'Two')])
+                               + audio,
+        'mp3-v22.mp3': b'ID3\x02\x00\x00\x00\x00\x00\x10' + b'TT2\x00\x00\x04\x00abc' + b'\x00' * 6 + audio,
+    }
+
+    stream = _flac_block(0, _flac_stream())
+    cases.update({
+        'flac-no-comment.flac': b'fLaC' + stream + _flac_block(1, b'\x00' * 16, last=True),
+        'flac-empty-comment.flac': b'fLaC' + stream + _flac_block(4, _vorbis_comment([]))
+                                   + _flac_block(6, _flac_picture_block(_COVER), last=True),
+        'flac-comment-picture.flac': b'fLaC' + stream + _flac_block(4, _vorbis_comment([
+            b'title=lower', b'ARTIST=One', b'artist=Two', b'no equals sign', b'=empty key',
+            b'METADATA_BLOCK_PICTURE=' + base64.b64encode(_flac_picture_block(_PNG_COVER, b'image/png')),
+        ]), last=True),
+        'flac-bad-utf8.flac': b'fLaC' + stream + _flac_block(4, _vorbis_comment([
+            b'TITLE=caf\xe9', b'D\xc9TE=2000', b'DATE=2001', b'GENRE=', b'TRACKNUMBER=4/9',
+        ]), last=True),
+        'flac-pictures.flac': b'fLaC' + stream + _flac_block(3, b'\x00' * 18)
+                              + _flac_block(6, _flac_picture_block(b'', b'image/png'))
+                              + _flac_block(4, _vorbis_comment([b'TITLE=Pictures']))
+                              + _flac_block(6, _flac_picture_block(_COVER))
+                              + _flac_block(2, b'APPL' + b'\x00' * 20)
+                              + _flac_block(1, b'\x00' * 100, last=True),
+        'flac-picture-no-mime.flac': b'fLaC' + stream + _flac_block(4, _vorbis_comment([b'TITLE=x']))
+                                     + _flac_block(6, _flac_picture_block(_COVER, b''), last=True),
+        'flac-wrong-comment-size.flac': b'fLaC' + stream
+                                        + _flac_block(4, _vorbis_comment([b'TITLE=Size']))[:1] + b'\x00\x00\x02'
+                                        + _vorbis_comment([b'TITLE=Size'])
+                                        + _flac_block(1, b'\x00' * 8, last=True),
+        'flac-comment-first.flac': b'fLaC' + _flac_block(4, _vorbis_comment([b'TITLE=First']))
+                                   + _flac_block(0, _flac_stream(), last=True),
+        'flac-cuesheet.flac': b'fLaC' + stream + _flac_block(5, b'\x00' * 396, last=True),
+        'flac-zero-length.flac': b'fLaC' + _flac_block(0, _flac_stream(seconds=0))
+                                 + _flac_block(4, _vorbis_comment([b'TITLE=Zero']), last=True),
+    })
+
+    text = {name: _data_atom(value.encode('utf-8')) for name, value in (
+        (b'\xa9nam', 'Title ☃'), (b'\xa9ART', 'Artist'), (b'\xa9alb', 'Album'),
+        (b'\xa9day', '2005-06-07'), (b'\xa9gen', 'Jazz'))}
+    cases.update({
+        'm4a-no-ilst.m4a': _mp4_file(None),
+        'm4a-no-stsd.m4a': _mp4_file([(b'\xa9nam', text[b'\xa9nam'])], stsd=False),
+        'm4a-full.m4a': _mp4_file(list(text.items()) + [
+            (b'trkn', _data_atom(struct.pack('>4H', 0, 5, 12, 0), flags=0)),
+            (b'disk', _data_atom(struct.pack('>3H', 0, 1, 2), flags=0)),
+            (b'covr', _data_atom(_PNG_COVER, flags=14) + _data_atom(_COVER, flags=13)),
+            (b'----', _atom(b'mean', b'\x00' * 4 + b'com.apple.iTunes') + _atom(b'name', b'\x00' * 4 + b'MOOD')
+             + _data_atom(b'calm')),
+            (b'cpil', _data_atom(b'\x01', flags=21)),
+        ]),
+        'm4a-implicit-text.m4a': _mp4_file([(b'\xa9nam', _data_atom(b'Implicit', flags=0)),
+                                            (b'\xa9ART', _data_atom(b'Binary', flags=2)),
+                                            (b'\xa9alb', _data_atom(b'\xff\xfe', flags=1))]),
+        'm4a-repeated.m4a': _mp4_file([(b'\xa9nam', _data_atom(b'One') + _data_atom(b'Two')),
+                                       (b'\xa9nam', _data_atom(b'Three')),
+                                       (b'covr', _atom(b'name', b'') + _data_atom(_COVER, flags=0))]),
+        'm4a-empty-covr.m4a': _mp4_file([(b'\xa9nam', _data_atom(b'Empty')), (b'covr', b'')]),
+        'm4a-gnre.m4a': _mp4_file([(b'gnre', _data_atom(struct.pack('>H', 8), flags=0))]),
+        'm4a-short-trkn.m4a': _mp4_file([(b'trkn', _data_atom(b'\x00\x01', flags=0))]),
+    })
+    return cases
+
+
+def write_edge_cases(folder=EDGE_CASE_DIR):
+    """Write the crafted files to ``folder`` (replacing earlier ones)."""
+    folder = Path(folder)
+    shutil.rmtree(folder, ignore_errors=True)
+    folder.mkdir(parents=True)
+    for name, data in edge_cases().items():
+        (folder / name).write_bytes(data)
+    return folder
+
+
+def _tag_files(root):
+    from fast_tags import FAST_EXTENSIONS
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in FAST_EXTENSIONS:
+                files.append(os.path.join(dirpath, name))
+    return files
+
+
+def compare_file(path, stages):
+    """
+    Read one file both ways.
+
+    Returns:
+        tuple: ('fast', None), ('fallback', reason) or ('mismatch', details)
+    """
+    import fast_tags
+    import metadata_reader as reader
+
+    reader.load_libraries()
+    with stages['mutagen'].measure():
+        try:
+            audio_file = reader.File(path)
+        except Exception as e:
+            audio_file = e
+    with stages['fast'].measure():
+        try:
+            parsed = fast_tags.read_file(path)
+        except fast_tags.Unsupported as e:
+            parsed = e
+    if isinstance(parsed, fast_tags.Unsupported):
+        return 'fallback', str(parsed)
+    if isinstance(audio_file, Exception) or audio_file is None:
+        return 'mismatch', {'mutagen': f"fails: {audio_file}"}
+
+    fast = reader._build_metadata(parsed.tags if parsed.tags else None, parsed.length,
+                                  lambda: None, 0, '', include_art=False)
+    slow = reader._metadata_from_audio_file(audio_file, 0, '', include_art=False)
+    slow_picture = reader.extract_album_art_data(audio_file)
+    if fast == slow and parsed.picture == slow_picture:
+        return 'fast', None
+
+    def describe(picture):
+        return None if picture is None else f"{picture[1]}, {len(picture[0])} bytes"
+    return 'mismatch', {'fast': fast, 'mutagen': slow,
+                        'fast_picture': describe(parsed.picture), 'mutagen_picture': describe(slow_picture)}
+
+
+def run_check(roots):
+    """
+    Compare both readers on every MP3, FLAC and M4A file under ``roots``.
+
+    Returns:
+        dict: Counts, fallback reasons, mismatches and timing summaries
+    """
+    stages = {'fast': Stage('fast'), 'mutagen': Stage('mutagen')}
+    counts = Counter()
+    reasons = Counter()
+    mismatches = []
+    for root in roots:
+        for path in _tag_files(root):
+            outcome, detail = compare_file(path, stages)
+            counts[outcome] += 1
+            if outcome == 'fallback':
+                reasons[detail] += 1
+            elif outcome == 'mismatch':
+                mismatches.append(dict(detail, path=path))
+                if len(mismatches) <= SHOWN_MISMATCHES:
+                    print(f"❌ {path}\n   {json.dumps(detail, ensure_ascii=False)}")
+    return {
+        'files': sum(counts.values()),
+        'fast': counts['fast'],
+        'fallback': counts['fallback'],
+        'mismatches': len(mismatches),
+        'fallback_reasons': dict(reasons.most_common()),
+        'mismatch_files': [m['path'] for m in mismatches],
+        'stages': {name: stage.summary() for name, stage in stages.items()},
+    }
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Compare the fast tag reader with mutagen file by file')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--size', type=parse_size, default=parse_size('1k'),
+                        help=f"Synthetic library size: {', '.join(LIBRARY_SIZES)} or a file count "
+                             "(generated on first use; default: 1k)")
+    source.add_argument('--library', help='Check an existing music folder instead')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Synthetic library seed')
+    parser.add_argument('--no-edge-cases', action='store_true', help='Skip the crafted edge-case files')
+    parser.add_argument('-o', '--output', help='Result file (default: benchmarks/results/diff_tags-<time>.json)')
+    args = parser.parse_args()
+
+    if args.library:
+        root = Path(args.library)
+        if not root.is_dir():
+            print(f"❌ Library folder not found: {root}")
+            sys.exit(1)
+        library = {'path': str(root), 'synthetic': False}
+    else:
+        size_name, count = args.size
+        root = library_dir(size_name)
+        manifest = read_manifest(root)
+        if not manifest or manifest.get('count') != count or manifest.get('seed') != args.seed:
+            print(f"🎼 Generating synthetic library ({count} files) in {root}")
+        manifest = generate_library(root, count, args.seed)
+        library = dict(manifest, path=str(root), synthetic=True, size=size_name)
+
+    roots = [root]
+    if not args.no_edge_cases:
+        roots.append(write_edge_cases())
+
+    started = time.perf_counter()
+    results = run_check(roots)
+    results.update(library=library, edge_cases=not args.no_edge_cases,
+                   duration=round(time.perf_counter() - started, 2))
+
+    print()
+    print_stages(results['stages'])
+    print(f"\n📊 {results['files']} files: {results['fast']} read by the fast path, "
+          f"{results['fallback']} left to mutagen, {results['mismatches']} mismatches")
+    for reason, count in results['fallback_reasons'].items():
+        print(f"   {count:6d}  {reason}")
+    path = save_results('diff_tags', results, args.output)
+    print(f"\n💾 Results saved to {path}")
+    if results['mismatches']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
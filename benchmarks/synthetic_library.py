@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Synthetic Tagged Library Generator
+Builds deterministic music libraries for benchmarking: Artist/Album/Track folders of
+MP3 (ID3v2), FLAC, MP4 and Ogg Vorbis files with varied tag sets and embedded covers
+of different sizes. The same seed and size always produce the same files.
+
+Audio payloads are a few silent frames (or none, for FLAC and MP4) so the files stay
+small; they are valid enough for mutagen to read stream info and tags, which is what
+the metadata pipeline exercises.
+"""
+
+import io
+import os
+import sys
+import json
+import struct
+import random
+import argparse
+import shutil
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from mutagen.id3 import ID3, TIT2, TPE1, TALB, TDRC, TYER, TCON, TRCK, APIC
+    from mutagen.flac import FLAC, Picture
+    from mutagen.mp4 import MP4, MP4Cover
+    from mutagen.oggvorbis import OggVorbis
+    from mutagen.ogg import OggPage
+    import base64
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+try:
+    from PIL import Image, ImageDraw
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_LIBRARY_DIR = REPO_DIR / '.cache' / 'bench'
+DEFAULT_SEED = 1337
+
+# Named library sizes accepted by --size
+LIBRARY_SIZES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+# Bump when the generated content changes so cached libraries are rebuilt
+GENERATOR_VERSION = 1
+MANIFEST_NAME = 'library.json'
+
+# (extension, weight) - roughly a typical collection
+FORMATS = (('.mp3', 45), ('.flac', 20), ('.m4a', 20), ('.ogg', 15))
+
+# (edge in pixels or None for no cover, MIME type, weight)
+COVER_SIZES = (
+    (None, None, 10),
+    (200, 'image/jpeg', 15),
+    (500, 'image/jpeg', 35),
+    (1000, 'image/jpeg', 25),
+    (1400, 'image/jpeg', 10),
+    (600, 'image/png', 5),
+)
+
+GENRES = ('Rock', 'Pop', 'Jazz', 'Electronic', 'Hip-Hop', 'Classical', 'Folk',
+          'Ambient', 'Metal', 'Soul', 'Drum & Bass', 'Synthwave')
+_SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'ven', 'tor', 'sil', 'qu', 'ne', 'dar', 'el', 'ym',
+              'os', 'ri', 'zu', 'fa', 'tha', 'mor', 'lin', 'gre')
+_WORDS = ('night', 'river', 'glass', 'echo', 'signal', 'paper', 'summer', 'ghost', 'neon',
+          'garden', 'static', 'velvet', 'ocean', 'machine', 'winter', 'golden', 'silent',
+          'fire', 'moon', 'city', 'dream', 'light', 'heart', 'storm')
+_ACCENTED = ('Café', 'Señor', 'Björk', 'Ørsted', 'Ça va', 'Mañana', 'Straße', 'Über',
+             '東京', 'Москва', 'Αθήνα')
+
+# One second of silent MPEG-1 Layer III, 128 kbps, 44.1 kHz joint stereo
+_MP3_FRAME = b'\xff\xfb\x90\x64' + b'\x00' * 413
+_MP3_FRAMES_PER_SECOND = 38
+
+
+# ---------------------------------------------------------------------- names and plans
+
+def _name(rng, words=2):
+    parts = []
+    for _ in range(words):
+        if rng.random() < 0.6:
+            parts.append(rng.choice(_WORDS).capitalize())
+        else:
+            parts.append(''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize())
+    if rng.random() < 0.05:
+        parts.append(rng.choice(_ACCENTED))
+    return ' '.join(parts)
+
+
+def _weighted(rng, choices):
+    return rng.choices(choices, weights=[c[-1] for c in choices])[0]
+
+
+def _safe(name):
+    return ''.join('_' if ch in '<>:"/\\|?*' else ch for ch in name).strip() or 'Untitled'
+
+
+def plan_library(count, seed=DEFAULT_SEED):
+    """
+    Lay out a library without touching the disk.
+
+    Returns:
+        list: One dict per album with 'artist', 'album', 'year', 'genre', 'format',
+        'cover' (size, mime or None) and 'tracks' (list of track dicts)
+    """
+    rng = random.Random(seed)
+    albums = []
+    produced = 0
+    artist = None
+    while produced < count:
+        if artist is None or rng.random() < 0.35:
+            artist = _name(rng, rng.randint(1, 3))
+        tracks = min(rng.randint(6, 16), count - produced)
+        size, mime, _ = _weighted(rng, COVER_SIZES)
+        album = {
+            'index': len(albums),
+            'artist': artist,
+            'album': _name(rng, rng.randint(1, 4)),
+            'year': str(rng.randint(1965, 2025)),
+            'genre': rng.choice(GENRES),
+            'format': _weighted(rng, FORMATS)[0],
+            'cover': (size, mime) if size else None,
+            'tracks': [],
+        }
+        for number in range(1, tracks + 1):
+            # Tag completeness varies: some tracks lack a year, genre or track number
+            track = {
+                'number': number,
+                'total': tracks,
+                'title': _name(rng, rng.randint(1, 5)),
+                'seconds': rng.randint(1, 6),
+                'has_year': rng.random() > 0.15,
+                'has_genre': rng.random() > 0.2,
+                'has_number': rng.random() > 0.1,
+                'featuring': _name(rng, 2) if rng.random() < 0.08 else None,
+            }
+            album['tracks'].append(track)
+        albums.append(album)
+        produced += tracks
+    return albums
+
+
+# ---------------------------------------------------------------------- content
+
+def make_cover(album, seed=DEFAULT_SEED):
+    """Render a deterministic cover image for an album, or None if it has no cover."""
+    if not album['cover'] or not PIL_AVAILABLE:
+        return None
+    size, mime = album['cover']
+    rng = random.Random(f"{seed}:cover:{album['index']}")
+    top = tuple(rng.randint(0, 255) for _ in range(3))
+    bottom = tuple(rng.randint(0, 255) for _ in range(3))
+    gradient = Image.linear_gradient('L').resize((size, size))
+    image = Image.composite(Image.new('RGB', (size, size), bottom),
+                            Image.new('RGB', (size, size), top), gradient)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 12)):
+        x0, y0 = rng.randrange(size), rng.randrange(size)
+        x1, y1 = x0 + rng.randrange(size // 2 + 1), y0 + rng.randrange(size // 2 + 1)
+        fill = tuple(rng.randint(0, 255) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=fill)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=fill)
+    output = io.BytesIO()
+    if mime == 'image/png':
+        image.save(output, format='PNG')
+    else:
+        image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def _atom(name, payload):
+    return struct.pack('>I4s', 8 + len(payload), name) + payload
+
+
+def _mp4_skeleton(seconds):
+    """Smallest MP4 container mutagen accepts: ftyp + moov/trak with a sound handler."""
+    timescale = 44100
+    mvhd = _atom(b'mvhd', struct.pack('>B3xIIII', 0, 0, 0, timescale, timescale * seconds)
+                 + b'\x00\x01\x00\x00\x01\x00' + b'\x00' * 10
+                 + struct.pack('>9I', 0x10000, 0, 0, 0, 0x10000, 0, 0, 0, 0x40000000)
+                 + b'\x00' * 24 + struct.pack('>I', 2))
+    mdhd = _atom(b'mdhd', struct.pack('>B3xIIIIHH', 0, 0, 0, timescale, timescale * seconds, 0x55c4, 0))
+    hdlr = _atom(b'hdlr', struct.pack('>B3xI4s12x', 0, 0, b'soun') + b'SoundHandler\x00')
+    trak = _atom(b'trak', _atom(b'mdia', mdhd + hdlr))
+    return (_atom(b'ftyp', b'M4A \x00\x00\x02\x00M4A mp42isom')
+            + _atom(b'moov', mvhd + trak)
+            + _atom(b'mdat', b''))
+
+
+def _flac_skeleton(seconds):
+    """fLaC marker plus a single STREAMINFO block (no audio frames)."""
+    sample_rate, channels, bits = 44100, 2, 16
+    samples = sample_rate * seconds
+    packed = (sample_rate << 44) | ((channels - 1) << 41) | ((bits - 1) << 36) | samples
+    streaminfo = struct.pack('>HH', 4096, 4096) + b'\x00' * 6 + packed.to_bytes(8, 'big') + b'\x00' * 16
+    return b'fLaC' + bytes([0x80]) + len(streaminfo).to_bytes(3, 'big') + streaminfo
+
+
+def _ogg_skeleton(seconds):
+    """Ogg Vorbis identification, comment and setup headers plus one empty audio page."""
+    ident = (b'\x01vorbis' + struct.pack('<IBIiii', 0, 2, 44100, 0, 128000, 0)
+             + bytes([0xb8, 0x01]))
+    comment = b'\x03vorbis' + struct.pack('<I', 0) + struct.pack('<I', 0) + b'\x01'
+    setup = b'\x05vorbis' + b'\x00' * 32
+    pages = []
+    first = OggPage()
+    first.packets = [ident]
+    first.first = True
+    first.serial = 0x4c4d
+    first.sequence = 0
+    first.position = 0
+    pages.append(first)
+    second = OggPage()
+    second.packets = [comment, setup]
+    second.serial = 0x4c4d
+    second.sequence = 1
+    second.position = 0
+    pages.append(second)
+    last = OggPage()
+    last.packets = [b'']
+    last.serial = 0x4c4d
+    last.sequence = 2
+    last.position = 44100 * seconds
+    last.last = True
+    pages.append(last)
+    return b''.join(page.write() for page in pages)
+
+
+def _audio_skeleton(ext, seconds):
+    if ext == '.mp3':
+        return _MP3_FRAME * (_MP3_FRAMES_PER_SECOND * seconds)
+    if ext == '.flac':
+        return _flac_skeleton(seconds)
+    if ext == '.m4a':
+        return _mp4_skeleton(seconds)
+    return _ogg_skeleton(seconds)
+
+
+def _track_tags(album, track):
+    artist = album['artist']
+    if track['featuring']:
+        artist = f"{artist} feat. {track['featuring']}"
+    tags = {'title': track['title'], 'artist': artist, 'album': album['album']}
+    if track['has_year']:
+        tags['year'] = album['year']
+    if track['has_genre']:
+        tags['genre'] = album['genre']
+    if track['has_number']:
+        tags['track'] = (track['number'], track['total'])
+    return tags
+
+
+def _flac_picture(cover, mime):
+    picture = Picture()
+    picture.type = 3
+    picture.mime = mime
+    picture.desc = 'Cover'
+    picture.data = cover
+    return picture
+
+
+def write_track(path, ext, album, track, cover):
+    """Write one tagged audio file."""
+    with open(path, 'wb') as f:
+        f.write(_audio_skeleton(ext, track['seconds']))
+    tags = _track_tags(album, track)
+    mime = album['cover'][1] if album['cover'] else None
+
+    if ext == '.mp3':
+        id3 = ID3()
+        id3.add(TIT2(encoding=3, text=tags['title']))
+        id3.add(TPE1(encoding=3, text=tags['artist']))
+        id3.add(TALB(encoding=3, text=tags['album']))
+        if 'year' in tags:
+            # Alternate v2.4 and v2.3 style dates
+            frame = TDRC if track['number'] % 2 else TYER
+            id3.add(frame(encoding=3, text=tags['year']))
+        if 'genre' in tags:
+            id3.add(TCON(encoding=3, text=tags['genre']))
+        if 'track' in tags:
+            id3.add(TRCK(encoding=3, text='%d/%d' % tags['track']))
+        if cover:
+            id3.add(APIC(encoding=3, mime=mime, type=3, desc='Cover', data=cover))
+        id3.save(str(path), v2_version=4 if track['number'] % 2 else 3)
+
+    elif ext == '.m4a':
+        audio = MP4(str(path))
+        audio.add_tags()
+        audio.tags['\xa9nam'] = tags['title']
+        audio.tags['\xa9ART'] = tags['artist']
+        audio.tags['\xa9alb'] = tags['album']
+        if 'year' in tags:
+            audio.tags['\xa9day'] = tags['year']
+        if 'genre' in tags:
+            audio.tags['\xa9gen'] = tags['genre']
+        if 'track' in tags:
+            audio.tags['trkn'] = [tags['track']]
+        if cover:
+            image_format = MP4Cover.FORMAT_PNG if mime == 'image/png' else MP4Cover.FORMAT_JPEG
+            audio.tags['covr'] = [MP4Cover(cover, imageformat=image_format)]
+        audio.save()
+
+    else:
+        audio = FLAC(str(path)) if ext == '.flac' else OggVorbis(str(path))
+        if audio.tags is None:
+            audio.add_tags()
+        audio.tags['TITLE'] = tags['title']
+        audio.tags['ARTIST'] = tags['artist']
+        audio.tags['ALBUM'] = tags['album']
+        if 'year' in tags:
+            audio.tags['DATE'] = tags['year']
+        if 'genre' in tags:
+            audio.tags['GENRE'] = tags['genre']
+        if 'track' in tags:
+            audio.tags['TRACKNUMBER'] = str(tags['track'][0])
+            audio.tags['TRACKTOTAL'] = str(tags['track'][1])
+        if cover:
+            picture = _flac_picture(cover, mime)
+            if ext == '.flac':
+                audio.add_picture(picture)
+            else:
+                audio.tags['METADATA_BLOCK_PICTURE'] = [
+                    base64.b64encode(picture.write()).decode('ascii')]
+        audio.save()
+
+
+def track_path(root, album, track):
+    """Relative location of a generated track."""
+    name = f"{track['number']:02d} - {_safe(track['title'])}{album['format']}"
+    folder = Path(_safe(album['artist'])) / f"{_safe(album['album'])} [{album['index']:05d}]"
+    return folder / name
+
+
+def _write_album(root, album, seed):
+    cover = make_cover(album, seed)
+    written = 0
+    for track in album['tracks']:
+        rel = track_path(root, album, track)
+        path = Path(root) / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_track(path, album['format'], album, track, cover)
+        written += 1
+    return written
+
+
+# ---------------------------------------------------------------------- library
+
+def library_dir(size_name, base=DEFAULT_LIBRARY_DIR):
+    """Default location of a generated library of a named size."""
+    return Path(base) / f'library-{size_name}'
+
+
+def read_manifest(root):
+    """Return the manifest of a generated library, or None."""
+    try:
+        with open(Path(root) / MANIFEST_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def generate_library(root, count, seed=DEFAULT_SEED, jobs=None, force=False, progress=None):
+    """
+    Create (or reuse) a synthetic library.
+
+    A library whose manifest matches the requested count, seed and generator
+    version is left alone unless ``force`` is set.
+
+    Args:
+        root (str): Destination folder (replaced if it holds a different library)
+        count (int): Number of audio files
+        seed (int): Random seed; the same seed gives byte-identical files
+        jobs (int): Worker processes (default: CPU count)
+        force (bool): Regenerate even if an up-to-date library exists
+        progress (callable): Optional ``progress(done, total)`` callback
+
+    Returns:
+        dict: The library manifest
+    """
+    if not MUTAGEN_AVAILABLE:
+        raise RuntimeError("mutagen is required to generate a library (pip install mutagen)")
+    root = Path(root)
+    wanted = {'generator_version': GENERATOR_VERSION, 'count': count, 'seed': seed}
+    manifest = read_manifest(root)
+    if not force and manifest and all(manifest.get(k) == v for k, v in wanted.items()):
+        return manifest
+
+    if root.exists():
+        shutil.rmtree(root)
+    root.mkdir(parents=True)
+
+    albums = plan_library(count, seed)
+    done = 0
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        futures = [pool.submit(_write_album, str(root), album, seed) for album in albums]
+        for future in futures:
+            done += future.result()
+            if progress:
+                progress(done, count)
+
+    formats = {}
+    covers = {}
+    for album in albums:
+        formats[album['format']] = formats.get(album['format'], 0) + len(album['tracks'])
+        key = f"{album['cover'][0]}px {album['cover'][1]}" if album['cover'] else 'none'
+        covers[key] = covers.get(key, 0) + len(album['tracks'])
+
+    manifest = dict(wanted, albums=len(albums), formats=formats, covers=covers,
+                    pil=PIL_AVAILABLE)
+    with open(root / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def parse_size(value):
+    """Accept a named size (1k, 10k, 100k) or a plain file count."""
+    if value in LIBRARY_SIZES:
+        return value, LIBRARY_SIZES[value]
+    try:
+        count = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(LIBRARY_SIZES)} or a number")
+    if count <= 0:
+        raise argparse.ArgumentTypeError("library size must be positive")
+    return str(count), count
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic music library')
+    parser.add_argument('--size', type=parse_size, default=parse_size('1k'),
+                        help='1k, 10k, 100k or a file count (default: 1k)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+    parser.add_argument('--output', help=f'Library folder (default: {DEFAULT_LIBRARY_DIR}/library-<size>)')
+    parser.add_argument('-j', '--jobs', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Regenerate even if the library is up to date')
+    args = parser.parse_args()
+
+    if not MUTAGEN_AVAILABLE:
+        print("❌ mutagen is required: pip install mutagen")
+        sys.exit(1)
+    if not PIL_AVAILABLE:
+        print("⚠️  Pillow not found; generating a library without cover art")
+
+    size_name, count = args.size
+    root = Path(args.output) if args.output else library_dir(size_name)
+
+    def report(done, total):
+        print(f"\r  {done}/{total} files", end='', flush=True)
+
+    print(f"🎼 Generating {count} files in {root} (seed {args.seed})")
+    manifest = generate_library(root, count, args.seed, args.jobs, args.force, progress=report)
+    print(f"\n✅ {manifest['count']} files in {manifest['albums']} albums: "
+          + ', '.join(f'{ext} {n}' for ext, n in sorted(manifest['formats'].items())))
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark Timing Helpers
+Per-item stage timers, percentile summaries, peak memory and the JSON result files
+shared by every benchmark in this package.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+from pathlib import Path
+
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:  # Windows
+    RESOURCE_AVAILABLE = False
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+def peak_rss_mb():
+    """
+    Return the process's peak resident set size in MiB, or None if unknown.
+
+    This is a high-water mark: it never goes down during a run.
+    """
+    if RESOURCE_AVAILABLE:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return round(peak / divisor, 1)
+    if PSUTIL_AVAILABLE:
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / (1024 * 1024), 1)
+    return None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values), max(1, math.ceil(pct / 100 * len(sorted_values)))) - 1
+    return sorted_values[rank]
+
+
+class Stage:
+    """
+    Collects per-item durations for one benchmark stage.
+
+    Use ``with stage.measure():`` around the work for a single item, or
+    ``stage.add(seconds)`` when the duration was taken elsewhere. Operations
+    that cover many files at once (a directory walk) pass ``items``.
+    """
+
+    def __init__(self, name, unit='file'):
+        self.name = name
+        self.unit = unit
+        self.durations = []
+        self.items = 0
+        self.skipped = 0
+
+    def measure(self, items=1):
+        return _Measure(self, items)
+
+    def add(self, seconds, items=1):
+        self.durations.append(seconds)
+        self.items += items
+
+    def summary(self):
+        """
+        Return files/sec, p50/p99 per operation (ms) and the peak RSS so far.
+
+        Throughput is computed from the time spent inside ``measure()``, so
+        untimed setup work between items does not count against a stage.
+        """
+        durations = sorted(self.durations)
+        wall = sum(durations)
+        return {
+            'unit': self.unit,
+            'operations': len(durations),
+            'files': self.items,
+            'skipped': self.skipped,
+            'seconds': round(wall, 4),
+            'files_per_sec': round(self.items / wall, 1) if wall else None,
+            'p50_ms': _ms(percentile(durations, 50)),
+            'p99_ms': _ms(percentile(durations, 99)),
+            'max_ms': _ms(durations[-1] if durations else None),
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+
+class _Measure:
+    __slots__ = ('stage', 'items', 'started')
+
+    def __init__(self, stage, items):
+        self.stage = stage
+        self.items = items
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stage.add(time.perf_counter() - self.started, self.items)
+        return False
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def environment():
+    """Describe the machine and library versions a result was produced on."""
+    info = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        import mutagen
+        info['mutagen'] = mutagen.version_string
+    except ImportError:
+        pass
+    try:
+        import PIL
+        info['pillow'] = PIL.__version__
+    except ImportError:
+        pass
+    return info
+
+
+def save_results(name, results, output=None):
+    """
+    Write a result document to ``benchmarks/results/<name>-<timestamp>.json``.
+
+    Returns:
+        Path: The file written
+    """
+    results = dict(results)
+    results.setdefault('benchmark', name)
+    results.setdefault('timestamp', time.strftime('%Y-%m-%dT%H:%M:%S'))
+    results.setdefault('environment', environment())
+    if output is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = RESULTS_DIR / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+        f.write('\n')
+    return output
+
+
+def print_stages(stages):
+    """Print a stage summary table."""
+    print(f"{'stage':<16}{'files':>9}{'files/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'peak MB':>10}")
+    for name, s in stages.items():
+        print(f"{name:<16}{s['files']:>9}{_fmt(s['files_per_sec']):>12}"
+              f"{_fmt(s['p50_ms']):>10}{_fmt(s['p99_ms']):>10}{_fmt(s['peak_rss_mb']):>10}")
+
+
+def compare_stages(baseline, current):
+    """Print files/sec and p99 changes between two result documents."""
+    print(f"{'stage':<16}{'files/s':>12}{'change':>10}{'p99 ms':>10}{'change':>10}")
+    for name, s in current.get('stages', {}).items():
+        old = baseline.get('stages', {}).get(name)
+        if not old:
+            print(f"{name:<16}{_fmt(s['files_per_sec']):>12}{'new':>10}")
+            continue
+        print(f"{name:<16}{_fmt(s['files_per_sec']):>12}{_pct(old['files_per_sec'], s['files_per_sec']):>10}"
+              f"{_fmt(s['p99_ms']):>10}{_pct(old['p99_ms'], s['p99_ms']):>10}")
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:,}'
+
+
+def _pct(old, new):
+    if not old or new is None:
+        return '-'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+# Version: v5.2.0
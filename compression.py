@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Response Compression
+Content-Encoding negotiation plus gzip and (when the optional brotli package is
+installed) Brotli encoders for JSON and text responses. Static assets are compressed
+once at the highest level and kept on disk, keyed by the source file's size and mtime.
+Audio and images are already compressed and are never passed through here.
+"""
+
+import os
+import re
+import gzip
+import zlib
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi as brotli
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_STATIC_CACHE_PATH = SCRIPT_DIR / '.cache' / 'static'
+
+# Bodies smaller than this are sent as-is; the headers would eat the savings
+MIN_COMPRESS_SIZE = 1024
+
+# Levels for responses built per request vs. assets compressed once and cached
+GZIP_DYNAMIC_LEVEL = 6
+GZIP_STATIC_LEVEL = 9
+BROTLI_DYNAMIC_QUALITY = 5
+BROTLI_STATIC_QUALITY = 11
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/javascript',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'image/svg+xml',
+}
+
+_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+_VERSION_RE = re.compile(r'^[0-9a-f]+-[0-9a-f]+\.(gz|br)$')
+
+
+def is_compressible(content_type):
+    """True for text-like MIME types worth compressing (never audio or raster images)."""
+    if not content_type:
+        return False
+    return content_type.split(';', 1)[0].strip().lower() in COMPRESSIBLE_TYPES
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick a Content-Encoding from an Accept-Encoding header.
+
+    Brotli is preferred when available, then gzip. Codings with ``q=0`` are
+    refused and ``*`` stands in for any coding not listed.
+
+    Returns:
+        str: 'br', 'gzip', or None for the identity encoding
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    wildcard = weights.get('*', 0.0)
+
+    offered = ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip']
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get('x-gzip') if coding == 'gzip' else None)
+        if q is None:
+            q = wildcard
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(data, encoding, static=False):
+    """Compress a complete body with the given coding."""
+    if encoding == 'br':
+        quality = BROTLI_STATIC_QUALITY if static else BROTLI_DYNAMIC_QUALITY
+        return brotli.compress(data, quality=quality)
+    if encoding == 'gzip':
+        level = GZIP_STATIC_LEVEL if static else GZIP_DYNAMIC_LEVEL
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    return data
+
+
+class StreamCompressor:
+    """
+    Incremental encoder for streamed responses such as NDJSON.
+
+    Every ``write`` flushes, so each record reaches the client as soon as it
+    is produced rather than waiting for the compressor's buffer to fill.
+    """
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=BROTLI_DYNAMIC_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_DYNAMIC_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def write(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class StaticCompressionCache:
+    """
+    On-disk cache of compressed static files.
+
+    Entries are named after the source path, size and mtime, so an edited
+    file gets a new entry and stale ones are removed when it is next served.
+    """
+
+    def __init__(self, root=DEFAULT_STATIC_CACHE_PATH):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+
+    def get(self, source, st, encoding):
+        """
+        Return the path of ``source`` compressed with ``encoding``, creating it if needed.
+
+        Args:
+            source (str): Static file path
+            st (os.stat_result): Current stat of the file
+            encoding (str): 'br' or 'gzip'
+
+        Returns:
+            Path: Compressed copy, or None if it could not be written
+        """
+        prefix = Path(source).resolve().as_posix().strip('/').replace('/', '__').replace(':', '')
+        target = self.root / f'{prefix}.{st.st_size:x}-{st.st_mtime_ns:x}{_SUFFIXES[encoding]}'
+        if target.exists():
+            return target
+        with self._lock:
+            if target.exists():
+                return target
+            temp_path = None
+            try:
+                with open(source, 'rb') as f:
+                    data = compress(f.read(), encoding, static=True)
+                self.root.mkdir(parents=True, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as out:
+                    out.write(data)
+                os.replace(temp_path, target)
+            except OSError:
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                return None
+            # Drop versions compressed from older copies of this file
+            for stale in self.root.iterdir():
+                if (stale != target and stale.name.startswith(prefix + '.')
+                        and stale.suffix == target.suffix
+                        and _VERSION_RE.match(stale.name[len(prefix) + 1:])):
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        pass
+        return target
+
+
+# Version: v5.2.0
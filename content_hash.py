@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Audio Content Fingerprints
+Hashes only the audio payload of a file, skipping tag blocks (ID3v2/ID3v1/APE, FLAC
+metadata blocks, MP4 atoms other than mdat, Ogg header pages, WAV chunks other than
+data), so retagging leaves the fingerprint unchanged. Files are memory-mapped and the
+payload is fed to BLAKE2b in large slices, which releases the GIL, so a thread pool
+hashes several files in parallel.
+
+Fingerprints are stored in the metadata cache. When a file disappears and another with
+the same fingerprint appears (a rename or move), its cached metadata, art reference and
+waveform peaks are carried over instead of being recomputed. Can be run directly to
+print fingerprints or list duplicate tracks.
+"""
+
+import os
+import sys
+import mmap
+import queue
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import stage
+
+DEFAULT_HASH_JOBS = 4
+HASH_SLICE = 8 * 1024 * 1024
+# Digest of nothing: stored by earlier versions for files without audio, never a match
+EMPTY_FINGERPRINT = hashlib.blake2b(digest_size=16).hexdigest()
+
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _skip_id3v2(mm, offset):
+    """Return the offset after any ID3v2 tags starting at ``offset``."""
+    while mm[offset:offset + 3] == b'ID3' and len(mm) >= offset + 10:
+        footer = 10 if mm[offset + 5] & 0x10 else 0
+        offset += 10 + _syncsafe(mm[offset + 6:offset + 10]) + footer
+    return min(offset, len(mm))
+
+
+def _trailing_tags_start(mm, start):
+    """Return where trailing ID3v1 and APEv2 tags begin (the end of the audio)."""
+    end = len(mm)
+    if end - start >= 128 and mm[end - 128:end - 125] == b'TAG':
+        end -= 128
+    if end - start >= 32 and mm[end - 32:end - 24] == b'APETAGEX':
+        size = int.from_bytes(mm[end - 20:end - 16], 'little')
+        has_header = mm[end - 9] & 0x80
+        end -= size + (32 if has_header else 0)
+    return max(start, end)
+
+
+def _flac_spans(mm, offset):
+    offset += 4  # 'fLaC'
+    while offset + 4 <= len(mm):
+        header = mm[offset]
+        offset += 4 + int.from_bytes(mm[offset + 1:offset + 4], 'big')
+        if header & 0x80:
+            break
+    return [(min(offset, len(mm)), _trailing_tags_start(mm, min(offset, len(mm))))]
+
+
+def _mp4_spans(mm):
+    spans, offset = [], 0
+    while offset + 8 <= len(mm):
+        size = int.from_bytes(mm[offset:offset + 4], 'big')
+        kind = mm[offset + 4:offset + 8]
+        header = 8
+        if size == 1:
+            size = int.from_bytes(mm[offset + 8:offset + 16], 'big')
+            header = 16
+        elif size == 0:
+            size = len(mm) - offset
+        if size < header:
+            break
+        if kind == b'mdat':
+            spans.append((offset + header, min(offset + size, len(mm))))
+        offset += size
+    return spans
+
+
+def _ogg_header_packets(payload):
+    """Number of header packets announced by the first packet of an Ogg stream."""
+    if payload.startswith(b'\x01vorbis'):
+        return 3  # identification, comments, setup
+    if payload.startswith((b'OpusHead', b'Speex   ')):
+        return 2  # (Speex extra headers are rare and hashed as audio)
+    if payload.startswith(b'\x7fFLAC') and len(payload) >= 9:
+        return 1 + int.from_bytes(payload[7:9], 'big')
+    return None
+
+
+def _ogg_spans(mm):
+    # Header packets (including the comment packet holding the tags) come first
+    # and end on a page of their own; only the payload of later pages is hashed,
+    # since page headers carry sequence numbers and CRCs that change when the
+    # comment packet grows or shrinks.
+    spans, offset = [], 0
+    headers, completed = None, 0
+    while offset + 27 <= len(mm) and mm[offset:offset + 4] == b'OggS':
+        granule = mm[offset + 6:offset + 14]
+        segments = mm[offset + 26]
+        table = mm[offset + 27:offset + 27 + segments]
+        start = offset + 27 + segments
+        offset = start + sum(table)
+        if headers is None:
+            headers = _ogg_header_packets(mm[start:offset])
+        if headers is None:
+            # Unknown codec: pages with granule position 0 only hold headers
+            if granule != b'\x00' * 8:
+                spans.append((start, min(offset, len(mm))))
+        elif completed < headers:
+            completed += sum(1 for lacing in table if lacing < 255)
+        else:
+            spans.append((start, min(offset, len(mm))))
+    return spans
+
+
+def _wav_spans(mm):
+    offset = 12
+    while offset + 8 <= len(mm):
+        size = int.from_bytes(mm[offset + 4:offset + 8], 'little')
+        if mm[offset:offset + 4] == b'data':
+            return [(offset + 8, min(offset + 8 + size, len(mm)))]
+        offset += 8 + size + (size & 1)
+    return []
+
+
+def audio_spans(mm):
+    """
+    Locate the audio payload of a file.
+
+    Args:
+        mm: Buffer with the whole file (usually an mmap)
+
+    Returns:
+        list: (start, end) byte ranges to hash, in file order
+    """
+    if mm[:4] == b'RIFF' and mm[8:12] == b'WAVE':
+        return _wav_spans(mm)
+    if mm[4:8] == b'ftyp':
+        return _mp4_spans(mm)
+    if mm[:4] == b'OggS':
+        return _ogg_spans(mm)
+    start = _skip_id3v2(mm, 0)
+    if mm[start:start + 4] == b'fLaC':
+        return _flac_spans(mm, start)
+    # MPEG audio, ADTS AAC and anything unrecognized
+    return [(start, _trailing_tags_start(mm, start))]
+
+
+def fingerprint(file_path):
+    """
+    Return the hex BLAKE2b-128 digest of a file's audio payload.
+
+    Returns:
+        str: The digest, or None if the file has no audio payload (empty,
+        tags only, or a WAV without a data chunk); such files would all
+        share one digest, so they cannot be told apart
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    hashed = 0
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with stage('content_hash'), mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for start, end in audio_spans(mm):
+                    for offset in range(start, end, HASH_SLICE):
+                        digest.update(view[offset:min(offset + HASH_SLICE, end)])
+                    hashed += max(0, end - start)
+            finally:
+                view.release()
+    return digest.hexdigest() if hashed else None
+
+
+class FingerprintIndex:
+    """
+    Keeps a fingerprint for every library file and relinks cached data on moves.
+
+    Args:
+        index (LibraryIndex): Library whose files are fingerprinted
+        cache (MetadataCache): Stores the fingerprints and the metadata that is carried over
+        jobs (int): Hashing threads
+        peaks_cache (PeaksCache): Optional; waveform peaks are carried over too
+    """
+
+    def __init__(self, index, cache, jobs=DEFAULT_HASH_JOBS, peaks_cache=None):
+        self.index = index
+        self.cache = cache
+        self.jobs = max(1, int(jobs))
+        self.peaks_cache = peaks_cache
+        self.moved = 0
+        self.hashed = 0
+        self._queue = queue.Queue()
+        self._executor = None
+        self._thread = None
+
+    def _path_for(self, rel_path):
+        return str(self.index.file_path(rel_path))
+
+    def _hash(self, rel_path):
+        """Fingerprint one library file and store it. Returns the fingerprint or None."""
+        file_path = self._path_for(rel_path)
+        try:
+            st = os.stat(file_path)
+            value = fingerprint(file_path)
+        except OSError:
+            return None
+        self.hashed += 1
+        if value is None:
+            return None
+        self.cache.put_fingerprint(file_path, value, st)
+        return value
+
+    def _hash_many(self, rel_paths):
+        """Fingerprint files in parallel. Returns {rel_path: fingerprint}."""
+        rel_paths = list(rel_paths)
+        if self._executor is None:
+            with ThreadPoolExecutor(self.jobs, thread_name_prefix='content-hash') as executor:
+                values = list(executor.map(self._hash, rel_paths))
+        else:
+            values = list(self._executor.map(self._hash, rel_paths))
+        return {path: value for path, value in zip(rel_paths, values) if value}
+
+    def relink(self, added, gone):
+        """
+        Carry cached data over from vanished files to new files with the same audio.
+
+        Args:
+            added (list): New library paths without cached metadata
+            gone (list): Cache keys whose files no longer exist
+
+        Returns:
+            int: Number of files recognized as moved
+        """
+        known = {}
+        for key in gone:
+            value = self.cache.get_fingerprint_key(key)
+            if value and value != EMPTY_FINGERPRINT:
+                known.setdefault(value, []).append(key)
+        if not known or not added:
+            return 0
+
+        moved = 0
+        for rel_path, value in self._hash_many(added).items():
+            candidates = known.get(value)
+            if not candidates:
+                continue
+            old_key = candidates.pop()
+            new_path = self._path_for(rel_path)
+            if self.cache.move(old_key, new_path):
+                moved += 1
+                if self.peaks_cache is not None:
+                    self.peaks_cache.move(str(self.cache.path_for_key(old_key)), new_path)
+        self.moved += moved
+        return moved
+
+    def relink_missing(self):
+        """
+        Match cache entries of files that vanished while the server was stopped
+        against library files that have no cached metadata yet.
+        """
+        gone = [key for key, _ in self.cache.fingerprint_items() if self.index.get(key) is None]
+        if not gone:
+            return 0
+        added = [entry.path for entry in self.index.entries()
+                 if not self.cache.contains(self._path_for(entry.path))]
+        return self.relink(added, gone)
+
+    def _on_library_change(self, index, changes):
+        # A rename shows up as one removal plus one addition in the same refresh;
+        # relink before the pre-warmer (a later listener) queues the new path
+        if changes['removed'] and changes['added']:
+            self.relink(changes['added'], changes['removed'])
+        for rel_path in changes['added'] + changes['modified']:
+            self._queue.put(rel_path)
+
+    def start(self):
+        """Fingerprint unhashed files in the background and follow library changes."""
+        if self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(self.jobs, thread_name_prefix='content-hash')
+        self.index.add_listener(self._on_library_change)
+        for entry in self.index.entries():
+            self._queue.put(entry.path)
+        self._thread = threading.Thread(target=self._run, name='content-hash', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._queue.put(None)
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while not self._queue.empty() and len(batch) < 256:
+                batch.append(self._queue.get())
+            if None in batch:
+                return
+            stale = [p for p in batch
+                     if self.cache.get_fingerprint(self._path_for(p)) is None]
+            if stale:
+                self._hash_many(stale)
+
+    def duplicates(self):
+        """Groups of library paths with identical audio, largest groups first."""
+        groups = {}
+        for key, value in self.cache.fingerprint_items():
+            if value != EMPTY_FINGERPRINT and self.index.get(key) is not None:
+                groups.setdefault(value, []).append(key)
+        duplicates = [sorted(paths) for paths in groups.values() if len(paths) > 1]
+        duplicates.sort(key=lambda paths: (-len(paths), paths[0]))
+        return duplicates
+
+    def status(self):
+        return {'hashed': self.hashed, 'moved': self.moved, 'queued': self._queue.qsize()}
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Fingerprint the audio payload of music files')
+    parser.add_argument('paths', nargs='+', help='Audio files or folders')
+    parser.add_argument('--duplicates', action='store_true',
+                        help='Only list groups of files with identical audio')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_HASH_JOBS,
+                        help=f'Hashing threads (default: {DEFAULT_HASH_JOBS})')
+    args = parser.parse_args()
+
+    from metadata_reader import AUDIO_EXTENSIONS
+    files = []
+    for path in map(Path, args.paths):
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob('*')
+                                if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS))
+        else:
+            files.append(path)
+
+    def safe_fingerprint(path):
+        try:
+            return fingerprint(path)
+        except OSError as e:
+            print(f"⚠️  {path}: {e}", file=sys.stderr)
+            return None
+
+    with ThreadPoolExecutor(max(1, args.jobs)) as executor:
+        values = list(executor.map(safe_fingerprint, files))
+
+    if not args.duplicates:
+        for path, value in zip(files, values):
+            if value:
+                print(f"{value}  {path}")
+        return
+
+    groups = {}
+    for path, value in zip(files, values):
+        if value:
+            groups.setdefault(value, []).append(path)
+    duplicates = [paths for paths in groups.values() if len(paths) > 1]
+    for paths in duplicates:
+        print(f"{len(paths)} copies:")
+        for path in paths:
+            print(f"  {path}")
+    print(f"{len(duplicates)} duplicate group(s) among {len(files)} files")
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Server Events
+Library changes and scan/ingest progress pushed to clients over Server-Sent
+Events (``GET /api/events``), so an open player updates its track list as
+files come and go instead of polling or re-listing the whole library.
+
+Events are numbered and the most recent ones are kept in a ring, so a client
+that reconnects with ``Last-Event-ID`` receives exactly what it missed. An id
+from before a restart, or one that has fallen out of the ring, gets a
+``reset`` event instead: the client should re-list the library once.
+
+Event types:
+    hello     Sent on connect: library generation and current progress
+    library   Tracks 'added' and 'modified' (file records) and 'removed' (paths),
+              batched per refresh and at most LIBRARY_BATCH paths per event
+    progress  Library scan, pre-warm and fingerprint progress, sent when it changes
+    reset     The requested Last-Event-ID cannot be resumed
+"""
+
+import json
+import time
+import threading
+from collections import deque
+
+# Events kept for Last-Event-ID resume
+DEFAULT_HISTORY = 1000
+# Tracks per 'library' event; bigger refreshes are split over several events
+LIBRARY_BATCH = 500
+# Progress is sampled this often and published only when it changed
+PROGRESS_INTERVAL = 1.0
+# A comment line is sent when nothing happened for this long, so proxies
+# keep the connection open and clients notice a dead server
+HEARTBEAT_INTERVAL = 15.0
+# Reconnection delay suggested to EventSource clients (milliseconds)
+RETRY_MS = 3000
+
+
+def format_event(event_type, data, event_id=None):
+    """
+    Encode one event in the text/event-stream format.
+
+    Args:
+        event_type (str): Event name
+        data: JSON-serializable payload (sent on a single data line)
+        event_id (str): Optional id clients send back as Last-Event-ID
+
+    Returns:
+        bytes: The encoded event, terminated by a blank line
+    """
+    lines = [f'event: {event_type}', f"data: {json.dumps(data, separators=(',', ':'))}"]
+    if event_id is not None:
+        lines.insert(0, f'id: {event_id}')
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+
+class EventBus:
+    """
+    Publish events to any number of streaming subscribers.
+
+    Event ids are ``<epoch>-<sequence>``; the epoch changes on every server
+    start, so ids from an earlier run are recognized as unresumable.
+
+    Args:
+        history (int): Number of recent events kept for resuming
+    """
+
+    def __init__(self, history=DEFAULT_HISTORY):
+        self.epoch = format(time.time_ns(), 'x')
+        self._events = deque(maxlen=history)   # (sequence, encoded event)
+        self._sequence = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.streams = 0
+        self.published = 0
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def publish(self, event_type, data):
+        """
+        Send an event to every subscriber.
+
+        Returns:
+            str: The event's id
+        """
+        with self._cond:
+            self._sequence += 1
+            event_id = f'{self.epoch}-{self._sequence}'
+            self._events.append((self._sequence, format_event(event_type, data, event_id)))
+            self.published += 1
+            self._cond.notify_all()
+        return event_id
+
+    def resume(self, last_event_id):
+        """
+        Find where a reconnecting client left off.
+
+        Args:
+            last_event_id (str): The client's Last-Event-ID, or None for a new client
+
+        Returns:
+            int: Sequence number to continue after, or None if the client
+            missed events that are no longer kept and must reset
+        """
+        with self._cond:
+            if not last_event_id:
+                return self._sequence
+            epoch, _, sequence = last_event_id.rpartition('-')
+            try:
+                sequence = int(sequence)
+            except ValueError:
+                return None
+            if epoch != self.epoch or sequence > self._sequence:
+                return None
+            oldest = self._events[0][0] if self._events else self._sequence + 1
+            if sequence < oldest - 1:
+                return None
+            return sequence
+
+    def wait(self, after, timeout):
+        """
+        Wait for events newer than a sequence number.
+
+        Args:
+            after (int): Last sequence number the subscriber has seen
+            timeout (float): Seconds to wait when there is nothing new
+
+        Returns:
+            list: (sequence, encoded event) pairs, empty on timeout or close,
+            or None if the subscriber fell so far behind that events were dropped
+        """
+        with self._cond:
+            if self._sequence <= after and not self._closed:
+                self._cond.wait(timeout)
+            if self._sequence <= after:
+                return []
+            if self._events[0][0] > after + 1:
+                return None
+            return [event for event in self._events if event[0] > after]
+
+    def open_stream(self, limit):
+        """Reserve a stream slot; False if ``limit`` streams are already open."""
+        with self._cond:
+            if self._closed or self.streams >= limit:
+                return False
+            self.streams += 1
+            return True
+
+    def close_stream(self):
+        with self._cond:
+            self.streams -= 1
+
+    def close(self):
+        """Wake every subscriber so open streams end (used on shutdown)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+def watch_library(bus, index):
+    """
+    Publish a 'library' event for every refresh that changed the index.
+
+    Added and modified tracks are sent as file records (path, name, size,
+    modified time), removed ones as paths. Large refreshes are split into
+    events of at most LIBRARY_BATCH tracks, all carrying the same generation.
+    """
+    def on_change(index, changes):
+        generation = index.generation
+        tracks = [(kind, path) for kind in ('added', 'modified', 'removed')
+                  for path in changes.get(kind, ())]
+        for start in range(0, len(tracks), LIBRARY_BATCH):
+            batch = {'generation': generation, 'added': [], 'modified': [], 'removed': []}
+            for kind, path in tracks[start:start + LIBRARY_BATCH]:
+                if kind == 'removed':
+                    batch['removed'].append(path)
+                    continue
+                entry = index.get(path)
+                if entry is not None:
+                    batch[kind].append(entry.as_dict())
+            bus.publish('library', batch)
+
+    index.add_listener(on_change)
+
+
+class ProgressReporter:
+    """
+    Background thread publishing 'progress' events.
+
+    Samples a status function every PROGRESS_INTERVAL seconds and publishes
+    the result only when it differs from the last one sent, so an idle
+    server publishes nothing.
+
+    Args:
+        bus (EventBus): Where to publish
+        status (callable): Returns the current progress as a JSON-ready dict
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, bus, status, interval=PROGRESS_INTERVAL):
+        self.bus = bus
+        self.status = status
+        self.interval = interval
+        self._last = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='event-progress', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                status = self.status()
+            except Exception as e:
+                print(f"⚠️  Progress status failed: {e}")
+                continue
+            if status != self._last:
+                self._last = status
+                self.bus.publish('progress', status)
+
+
+# Version: v5.2.0
@@ -0,0 +1,958 @@
+#!/usr/bin/env python3
+"""
+Fast Tag Reader
+Reads the tags, duration and cover image of the common library formats straight
+from their tag region, without importing mutagen:
+
+    MP3     the ID3v2.3/2.4 tag and the first MPEG frames (Xing/LAME or CBR)
+    FLAC    the metadata blocks (STREAMINFO, Vorbis comment, pictures)
+    M4A     box headers plus the sound track header and the ilst item list
+
+Only those regions are read, with bounded reads, so the audio data is never
+touched. Every value follows mutagen's own parsing rules (ID3v2.4 upgrade of
+TYER, v2.4 frame size detection, Vorbis key folding, MP4 data atoms), so
+metadata_reader builds the same dictionary from either reader. Anything this
+module does not reproduce exactly - ID3v2.2, unsynchronised or compressed
+frames, ID3v1 trailers, numeric genres, VBRI headers, chapters, embedded
+cue sheets - raises Unsupported, and the caller falls back to mutagen.
+
+Can be run directly to print what the fast reader sees in a file.
+"""
+
+import os
+import re
+import sys
+import json
+import base64
+import struct
+import argparse
+from collections import namedtuple
+
+# Extensions read_file() understands; other files go straight to mutagen
+FAST_EXTENSIONS = ('.mp3', '.flac', '.m4a')
+
+# Bytes after the ID3 tag searched for the first MPEG frames
+MPEG_SCAN_BYTES = 64 * 1024
+# mutagen gives up after this many candidate frame syncs
+MPEG_MAX_SYNCS = 1500
+
+ParsedFile = namedtuple('ParsedFile', 'tags length picture')
+ParsedFile.__doc__ = """Tags (TagMap), duration in seconds and cover as (bytes, mime) or None."""
+
+
+class Unsupported(ValueError):
+    """Raised for files the fast reader cannot read exactly like mutagen."""
+
+
+class TagMap:
+    """
+    Multi-valued tags keyed the way the matching mutagen container keys them.
+
+    ID3 frames and MP4 atoms are case-sensitive; Vorbis comment names are
+    compared case-insensitively, like mutagen's VCommentDict.
+    """
+
+    __slots__ = ('_values', '_fold_case')
+
+    def __init__(self, fold_case=False):
+        self._values = {}
+        self._fold_case = fold_case
+
+    def _key(self, key):
+        return key.lower() if self._fold_case else key
+
+    def add(self, key, values):
+        self._values.setdefault(self._key(key), []).extend(values)
+
+    def __contains__(self, key):
+        return self._key(key) in self._values
+
+    def __getitem__(self, key):
+        return self._values[self._key(key)]
+
+    def __len__(self):
+        return len(self._values)
+
+    def keys(self):
+        return self._values.keys()
+
+
+def read_file(file_path, pictures=True):
+    """
+    Read tags, duration and cover image of an MP3, FLAC or M4A file.
+
+    Args:
+        file_path (str): Path to the audio file
+        pictures (bool): Set to False to skip reading the cover image
+
+    Returns:
+        ParsedFile: Tags, length and picture
+
+    Raises:
+        Unsupported: If the file needs the full mutagen reader
+        OSError: If the file cannot be read
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in FAST_EXTENSIONS:
+        raise Unsupported(f"No fast reader for {ext or 'files without extension'}")
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if ext == '.mp3':
+            return _read_mp3(f, file_size, pictures)
+        if ext == '.flac':
+            return _read_flac(f, file_size, pictures)
+        return _read_mp4(f, file_size, pictures)
+
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    return f.read(size)
+
+
+def _synchsafe(value):
+    """Decode a 28-bit synchsafe integer the way mutagen's BitPaddedInt does."""
+    result = 0
+    shift = 0
+    while value:
+        result += (value & 0x7F) << shift
+        value >>= 8
+        shift += 7
+    return result
+
+
+# --- ID3v2 -----------------------------------------------------------------
+
+# Frame IDs mutagen knows; used exactly like mutagen to guess whether v2.4
+# frame sizes were written synchsafe or (as old iTunes did) as plain integers
+_ID3_FRAME_IDS = frozenset("""
+    AENC APIC ASPI CHAP COMM COMR CTOC ENCR EQU2 ETCO GEOB GRID GRP1 IPLS LINK
+    MCDI MLLT MVIN MVNM OWNE PCNT PCST POPM POSS PRIV RBUF RVA2 RVAD RVRB SEEK
+    SIGN SYLT SYTC TALB TBPM TCAT TCMP TCOM TCON TCOP TDAT TDEN TDES TDLY TDOR
+    TDRC TDRL TDTG TENC TEXT TFLT TGID TIME TIPL TIT1 TIT2 TIT3 TKEY TKWD TLAN
+    TLEN TMCL TMED TMOO TOAL TOFN TOLY TOPE TORY TOWN TPE1 TPE2 TPE3 TPE4 TPOS
+    TPRO TPUB TRCK TRDA TRSN TRSO TSIZ TSO2 TSOA TSOC TSOP TSOT TSRC TSSE TSST
+    TXXX TYER UFID USER USLT WCOM WCOP WFED WOAF WOAR WOAS WORS WPAY WPUB WXXX
+""".split())
+
+_ID3_TEXT_FRAMES = ('TIT2', 'TPE1', 'TALB', 'TRCK', 'TCON', 'TDRC', 'TYER')
+# Merged into TDRC by mutagen together with TYER; left to mutagen
+_ID3_DATE_PARTS = ('TDAT', 'TIME')
+_ID3_ENCODINGS = ('latin1', 'utf-16', 'utf_16_be', 'utf8')
+# APIC keys metadata_reader prefers, in order, before taking the first APIC
+_APIC_KEYS = ('APIC:', 'APIC:cover', 'APIC:front cover', 'APIC:other', 'APIC:back cover')
+
+# Timestamps mutagen's ID3TimeStamp keeps unchanged, and the TYER values it
+# turns into TDRC when upgrading a tag to v2.4
+_TDRC_RE = re.compile(r'[0-9]{4}(-[0-9]{2}(-[0-9]{2})?)?\Z')
+_TYER_RE = re.compile(r'([0-9]{4})(-[0-9]{2}-[0-9]{2})?\Z')
+
+
+def _uses_synchsafe_sizes(data):
+    """Port of mutagen's determine_bpi() for ID3v2.4 frame data."""
+    empty = b'\x00' * 10
+
+    def walk(decode):
+        offset = 0
+        found = 0
+        while offset < len(data) - 10:
+            part = data[offset:offset + 10]
+            if part == empty:
+                return found, -((len(data) - offset) % 10)
+            name, size, _ = struct.unpack('>4sLH', part)
+            offset += 10 + decode(size)
+            try:
+                name = name.decode('ascii')
+            except UnicodeDecodeError:
+                continue
+            if name in _ID3_FRAME_IDS:
+                found += 1
+        return found, offset - len(data)
+
+    as_bpi, bpi_offset = walk(_synchsafe)
+    as_int, int_offset = walk(int)
+    return not (as_int > as_bpi or (as_int == as_bpi and bpi_offset >= 1 and int_offset <= 1))
+
+
+def _decode_terminated(data, encoding):
+    """Split one NUL-terminated string off ``data``; returns (text, rest)."""
+    if encoding in (0, 3):
+        index = data.find(b'\x00')
+        codec = _ID3_ENCODINGS[encoding]
+        try:
+            if index == -1:
+                return data.decode(codec), b''
+            return data[:index].decode(codec), data[index + 1:]
+        except UnicodeDecodeError:
+            raise Unsupported("Undecodable ID3 text")
+    if encoding == 1 and data[:2] not in (b'\xff\xfe', b'\xfe\xff'):
+        # mutagen retries BOM-less UTF-16 with guessed byte orders
+        raise Unsupported("UTF-16 ID3 text without BOM")
+    index = 0
+    while True:
+        index = data.find(b'\x00\x00', index)
+        if index == -1 or index % 2 == 0:
+            break
+        index += 1
+    if index == -1:
+        if len(data) % 2:
+            raise Unsupported("Truncated UTF-16 ID3 text")
+        text, rest = data, b''
+    else:
+        text, rest = data[:index], data[index + 2:]
+    try:
+        return text.decode(_ID3_ENCODINGS[encoding]), rest
+    except UnicodeDecodeError:
+        raise Unsupported("Undecodable ID3 text")
+
+
+def _id3_text(frame, version):
+    """All values of a text frame, as mutagen's MultiSpec reads them."""
+    if not frame or frame[0] > 3:
+        raise Unsupported("Invalid ID3 text encoding")
+    encoding = frame[0]
+    data = frame[1:]
+    values = []
+    while data:
+        value, data = _decode_terminated(data, encoding)
+        if version < 4 and not data.strip(b'\x00'):
+            data = b''
+        values.append(value)
+    if not values:
+        raise Unsupported("Empty ID3 text frame")
+    return values
+
+
+def _id3_picture(frame, version):
+    """Parse an APIC frame into (desc, data, mime)."""
+    if not frame or frame[0] > 3:
+        raise Unsupported("Invalid APIC encoding")
+    encoding = frame[0]
+    mime, sep, data = frame[1:].partition(b'\x00')
+    mime = mime.decode('latin1')
+    if mime in ('PNG', 'JPG'):
+        raise Unsupported("APIC with ID3v2.2 image format")
+    if not data:
+        raise Unsupported("Truncated APIC frame")
+    desc, data = _decode_terminated(data[1:], encoding)
+    if version < 4 and not data.strip(b'\x00'):
+        data = b''
+    return desc, data, mime
+
+
+def _read_id3(f, header):
+    """
+    Read an ID3v2.3/2.4 tag at the start of ``f``.
+
+    Returns:
+        tuple: (TagMap, picture or None, tag size in bytes)
+    """
+    version, flags = header[3], header[5]
+    if version not in (3, 4):
+        raise Unsupported(f"ID3v2.{version} tag")
+    if flags:
+        raise Unsupported("ID3 tag with unsynchronisation, extended header or footer")
+    if any(byte & 0x80 for byte in header[6:10]):
+        raise Unsupported("ID3 tag size is not synchsafe")
+    size = _synchsafe(struct.unpack('>L', header[6:10])[0])
+    data = f.read(size)
+    if len(data) != size:
+        raise Unsupported("Truncated ID3 tag")
+
+    if version == 3:
+        decode_size = int
+    elif _uses_synchsafe_sizes(data):
+        decode_size = _synchsafe
+    else:
+        raise Unsupported("ID3v2.4 tag with non-synchsafe frame sizes")
+
+    text = {}
+    apics = {}
+    offset = 0
+    while offset < len(data):
+        frame_header = data[offset:offset + 10]
+        if len(frame_header) < 10:
+            break
+        name, frame_size, frame_flags = struct.unpack('>4sLH', frame_header)
+        if name.strip(b'\x00') == b'':
+            break
+        frame_size = decode_size(frame_size)
+        frame = data[offset + 10:offset + 10 + frame_size]
+        offset += 10 + frame_size
+        if frame_size == 0:
+            continue
+        try:
+            name = name.decode('ascii')
+        except UnicodeDecodeError:
+            continue
+        if name.endswith('\x00'):
+            raise Unsupported("ID3v2.2 frame names in a v2.3/2.4 tag")
+        if name not in _ID3_FRAME_IDS:
+            continue
+        if name in _ID3_DATE_PARTS:
+            raise Unsupported(f"ID3 {name} frame")
+        if name not in _ID3_TEXT_FRAMES and name != 'APIC':
+            continue
+        if frame_flags & 0xFF:
+            raise Unsupported(f"Compressed, encrypted or grouped {name} frame")
+        if name == 'APIC':
+            desc, picture_data, mime = _id3_picture(frame, version)
+            key = 'APIC:' + desc
+            if key in apics:
+                raise Unsupported("Duplicate APIC frames")
+            apics[key] = (picture_data, mime)
+        else:
+            if name in text:
+                raise Unsupported(f"Duplicate {name} frames")
+            text[name] = _id3_text(frame, version)
+
+    # mutagen upgrades every tag to ID3v2.4 on load
+    years = text.pop('TYER', None)
+    if 'TDRC' not in text and years:
+        stamps = []
+        for value in years:
+            match = _TYER_RE.match(value)
+            if match:
+                stamps.append(match.group(1) + (match.group(2) or ''))
+        if stamps:
+            text['TDRC'] = stamps
+    if 'TDRC' in text and not _TDRC_RE.match(text['TDRC'][0]):
+        raise Unsupported("ID3 timestamp mutagen would normalise")
+    if 'TCON' in text:
+        genre = text['TCON'][0]
+        if (not genre or genre.isdecimal() or genre in ('CR', 'RX')
+                or genre.startswith('(') or '\n' in genre):
+            raise Unsupported("ID3v1-style genre")
+
+    tags = TagMap()
+    for name, values in text.items():
+        tags.add(name, values)
+    for key in apics:
+        tags.add(key, [apics[key]])
+
+    picture = None
+    for key in _APIC_KEYS:
+        if key in apics:
+            picture = apics[key]
+            break
+    if apics and not (picture and picture[0]):
+        picture = next(iter(apics.values()))
+    if picture and not picture[0]:
+        picture = None
+    elif picture:
+        picture = (picture[0], picture[1] or 'image/jpeg')
+    return tags, picture, size + 10
+
+
+# --- MPEG audio ------------------------------------------------------------
+
+_MPEG_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MPEG_BITRATES[(2, 3)] = _MPEG_BITRATES[(2, 2)]
+_MPEG_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+_MPEG_VERSIONS = (2.5, None, 2, 1)
+_MPEG_MONO = 3
+
+
+class _MPEGFrame:
+    """One MPEG audio frame header, parsed like mutagen's MPEGFrame."""
+
+    __slots__ = ('offset', 'frame_length', 'bitrate', 'sample_rate', 'sketchy', 'length')
+
+    def __init__(self, offset, frame_length, bitrate, sample_rate):
+        self.offset = offset
+        self.frame_length = frame_length
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.sketchy = True
+        self.length = None
+
+
+def _lame_has_header(data):
+    """Port of mutagen's LAMEHeader.parse_version(): True if a LAME header follows."""
+    if len(data) != 20 or not data.startswith((b'LAME', b'L3.99')):
+        return False
+    data = data.lstrip(b'EMAL')
+    major, data = data[0:1], data[1:].lstrip(b'.')
+    minor = b''
+    for byte in data:
+        if not 0x30 <= byte <= 0x39:
+            break
+        minor += bytes((byte,))
+    data = data[len(minor):]
+    try:
+        version = (int(major.decode('ascii')), int(minor.decode('ascii')))
+    except ValueError:
+        return False
+    if version < (3, 90) or (version == (3, 90) and data[-11:-10] == b'('):
+        return False
+    return len(data) >= 11
+
+
+def _xing_length(f, offset, frame_size, sample_rate):
+    """
+    Read a Xing/Info header at ``offset``.
+
+    Returns:
+        tuple: (True, length or None) if the header is valid, else (False, None)
+    """
+    data = _read_at(f, offset, 8)
+    if len(data) != 8 or data[:4] not in (b'Xing', b'Info'):
+        return False, None
+    flags = struct.unpack('>I', data[4:8])[0]
+    position = offset + 8
+    frames = -1
+    for flag, size in ((0x1, 4), (0x2, 4), (0x4, 100), (0x8, 4)):
+        if flags & flag:
+            field = f.read(size)
+            if len(field) != size:
+                return False, None
+            if flag == 0x1:
+                frames = struct.unpack('>I', field)[0]
+            position += size
+    delay = padding = 0
+    if _lame_has_header(f.read(20)):
+        lame = _read_at(f, position + 9, 27)
+        if len(lame) == 27 and not lame[0] >> 4:
+            delay = (lame[12] << 4) | (lame[13] >> 4)
+            padding = ((lame[13] & 0x0F) << 8) | lame[14]
+    if frames == -1:
+        return True, None
+    samples = max(frame_size * frames - delay - padding, 0)
+    return True, float(samples) / sample_rate
+
+
+def _mpeg_frame(f, offset):
+    """Parse the frame header at ``offset``; None where mutagen finds no frame."""
+    data = _read_at(f, offset, 4)
+    if len(data) < 4:
+        return None
+    header = struct.unpack('>I', data)[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version = (header >> 19) & 3
+    layer = (header >> 17) & 3
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 3
+    padding = (header >> 9) & 1
+    mode = (header >> 6) & 3
+    if version == 1 or layer == 0 or rate_index == 3 or bitrate_index in (0, 0xF):
+        return None
+    version = _MPEG_VERSIONS[version]
+    layer = 4 - layer
+    bitrate = _MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_index]
+    if layer == 1:
+        frame_size, slot = 384, 4
+    elif version >= 2 and layer == 3:
+        frame_size, slot = 576, 1
+    else:
+        frame_size, slot = 1152, 1
+    frame_length = ((frame_size // 8 * bitrate) // sample_rate + padding) * slot
+    frame = _MPEGFrame(offset, frame_length, bitrate, sample_rate)
+    if layer == 3:
+        if version == 1:
+            xing_offset = 21 if mode == _MPEG_MONO else 36
+        else:
+            xing_offset = 13 if mode == _MPEG_MONO else 21
+        found, length = _xing_length(f, offset + xing_offset, frame_size, sample_rate)
+        if found:
+            frame.sketchy = False
+            frame.length = length
+        elif _read_at(f, offset + 36, 4) == b'VBRI':
+            raise Unsupported("VBRI header")
+    return frame
+
+
+def _skip_id3(f, offset):
+    """Skip stacked ID3v2 tags the way mutagen's skip_id3() does."""
+    while True:
+        data = _read_at(f, offset, 10)
+        if len(data) == 10 and data[:3] == b'ID3':
+            size = _synchsafe(struct.unpack('>L', data[6:10])[0])
+            if size > 0:
+                offset += 10 + size
+                continue
+        return offset
+
+
+def _mpeg_length(f, offset, file_size):
+    """Duration of the MPEG stream after ``offset``, as mutagen's MPEGInfo computes it."""
+    start = _skip_id3(f, offset)
+    window = _read_at(f, start, MPEG_SCAN_BYTES)
+    first = None
+    syncs = 0
+    index = window.find(b'\xff')
+    while first is None and 0 <= index < len(window) - 1:
+        if window[index + 1] & 0xE0 == 0xE0:
+            syncs += 1
+            if syncs >= MPEG_MAX_SYNCS:
+                break
+            frames = []
+            frame_offset = start + index
+            for _ in range(4):
+                frame = _mpeg_frame(f, frame_offset)
+                if frame is None:
+                    break
+                frames.append(frame)
+                if not frame.sketchy:
+                    break
+                frame_offset = frame.offset + frame.frame_length
+            # A frame with a Xing header wins; otherwise four frames in a row
+            if frames and not frames[-1].sketchy:
+                first = frames[-1]
+            elif len(frames) >= 4:
+                first = frames[0]
+        index = window.find(b'\xff', index + 1)
+    if first is None:
+        raise Unsupported("No MPEG frames near the start of the file")
+    if first.length is not None:
+        return first.length
+    return 8 * (file_size - first.offset) / float(first.bitrate)
+
+
+def _read_mp3(f, file_size, pictures):
+    header = f.read(10)
+    tags = TagMap()
+    picture = None
+    tag_size = None
+    if header[:3] == b'ID3':
+        if len(header) < 10:
+            raise Unsupported("Truncated ID3 header")
+        tags, picture, tag_size = _read_id3(f, header)
+    elif header[:2] not in (b'\xff\xf2', b'\xff\xf3', b'\xff\xfa', b'\xff\xfb'):
+        raise Unsupported("MP3 without an ID3 tag or frame sync at the start")
+    # mutagen merges ID3v1 fields into the tags; leave those files to it
+    if b'TAG' in _read_at(f, max(file_size - 131, 0), 131):
+        raise Unsupported("ID3v1 tag")
+    length = _mpeg_length(f, tag_size or 0, file_size)
+    return ParsedFile(tags, length, picture if pictures else None)
+
+
+# --- FLAC ------------------------------------------------------------------
+
+_FLAC_STREAMINFO = 0
+_FLAC_SEEKTABLE = 3
+_FLAC_VORBIS_COMMENT = 4
+_FLAC_CUESHEET = 5
+_FLAC_PICTURE = 6
+
+
+class _StrictReader:
+    """Sequential reads that fail on short data, like mutagen's StrictFileObject."""
+
+    __slots__ = ('_f', '_data', '_pos')
+
+    def __init__(self, f=None, data=None):
+        self._f = f
+        self._data = data
+        self._pos = 0
+
+    def read(self, size):
+        if self._data is not None:
+            chunk = self._data[self._pos:self._pos + size]
+            self._pos += len(chunk)
+        else:
+            chunk = self._f.read(size)
+        if len(chunk) != size:
+            raise Unsupported("Truncated FLAC metadata")
+        return chunk
+
+    def uint32(self, little=False):
+        return struct.unpack('<I' if little else '>I', self.read(4))[0]
+
+
+def _is_valid_vorbis_key(key):
+    return bool(key) and all(' ' <= c <= '}' and c != '=' for c in key)
+
+
+def _read_vorbis_comment(reader):
+    """Parse a Vorbis comment block into a case-insensitive TagMap."""
+    tags = TagMap(fold_case=True)
+    reader.read(reader.uint32(little=True))  # vendor string
+    for i in range(reader.uint32(little=True)):
+        comment = reader.read(reader.uint32(little=True)).decode('utf-8', 'replace')
+        if '=' in comment:
+            key, value = comment.split('=', 1)
+        else:
+            key, value = f'unknown{i}', comment
+        key = key.encode('ascii', 'replace').decode('ascii')
+        if _is_valid_vorbis_key(key):
+            tags.add(key, [value])
+    return tags
+
+
+def _read_flac_picture(reader, f=None, file_size=None):
+    """
+    Parse a FLAC picture block into (data, mime).
+
+    With ``f`` and ``file_size`` the image data is skipped rather than read.
+    """
+    _type, mime_length = struct.unpack('>2I', reader.read(8))
+    mime = reader.read(mime_length).decode('UTF-8', 'replace')
+    reader.read(reader.uint32())  # description
+    data_length = struct.unpack('>5I', reader.read(20))[4]
+    if f is None:
+        return reader.read(data_length), mime
+    end = f.tell() + data_length
+    if end > file_size:
+        raise Unsupported("Truncated FLAC picture")
+    f.seek(end)
+    return None, mime
+
+
+def _read_flac(f, file_size, pictures):
+    if f.read(4) != b'fLaC':
+        raise Unsupported("FLAC without fLaC marker at the start")
+    reader = _StrictReader(f)
+    tags = None
+    blocks = []
+    length = None
+    seektables = 0
+    first = True
+    while True:
+        header = reader.read(4)
+        code = header[0] & 0x7F
+        last = header[0] & 0x80
+        size = int.from_bytes(header[1:4], 'big')
+        if code == _FLAC_VORBIS_COMMENT:
+            # mutagen parses the comment itself rather than trusting the block size
+            comment = _read_vorbis_comment(reader)
+            if tags is None:
+                tags = comment
+        elif code == _FLAC_PICTURE:
+            if pictures:
+                blocks.append(_read_flac_picture(reader))
+            else:
+                blocks.append(_read_flac_picture(reader, f, file_size))
+        else:
+            data = reader.read(size)
+            if code == _FLAC_STREAMINFO:
+                if len(data) < 18:
+                    raise Unsupported("Short STREAMINFO block")
+                rate = int.from_bytes(data[10:13], 'big') >> 4
+                if not rate:
+                    raise Unsupported("STREAMINFO sample rate of 0")
+                if first:
+                    total = int.from_bytes(data[13:18], 'big') & 0xFFFFFFFFF
+                    length = total / float(rate)
+            elif code == _FLAC_CUESHEET:
+                raise Unsupported("FLAC cue sheet")
+            elif code == _FLAC_SEEKTABLE:
+                seektables += 1
+                if seektables > 1:
+                    raise Unsupported("More than one FLAC seek table")
+        if length is None:
+            # mutagen takes the stream info from the first block
+            raise Unsupported("FLAC without leading STREAMINFO")
+        first = False
+        if last:
+            break
+
+    if tags is None:
+        tags = TagMap(fold_case=True)
+    picture = None
+    if pictures and tags:
+        if blocks:
+            picture = blocks[0]
+        elif 'METADATA_BLOCK_PICTURE' in tags:
+            try:
+                encoded = base64.b64decode(tags['METADATA_BLOCK_PICTURE'][0])
+                picture = _read_flac_picture(_StrictReader(data=encoded))
+            except Exception:
+                picture = None
+        if picture and not picture[0]:
+            picture = None
+        elif picture:
+            picture = (picture[0], picture[1] or 'image/jpeg')
+    return ParsedFile(tags, length, picture)
+
+
+# --- MP4 -------------------------------------------------------------------
+
+_MP4_CONTAINERS = (b'moov', b'udta', b'trak', b'mdia', b'meta', b'ilst',
+                   b'stbl', b'minf', b'moof', b'traf')
+_MP4_SKIP = {b'meta': 4}
+_MP4_TEXT_ATOMS = (b'\xa9nam', b'\xa9ART', b'\xa9alb', b'\xa9day', b'\xa9gen')
+# Unknown atoms are read as text under their own name; these would shadow ID3
+# or Vorbis lookups in metadata_reader, and 'gnre' becomes a '\xa9gen' value
+_MP4_SHADOWING_ATOMS = (b'TIT2', b'TPE1', b'TALB', b'TDRC', b'TYER', b'TCON', b'TRCK',
+                        b'DATE', b'gnre')
+_MP4_PNG = 14
+_MP4_JPEG = 13
+
+
+class _Atom:
+    """An MP4 box header, walked exactly like mutagen's Atom."""
+
+    __slots__ = ('name', 'offset', 'length', 'data_offset', 'children')
+
+    def __init__(self, f, end, level=0):
+        self.offset = f.tell()
+        header = f.read(8)
+        if len(header) != 8:
+            raise Unsupported("Truncated MP4 box")
+        self.length, self.name = struct.unpack('>I4s', header)
+        self.data_offset = self.offset + 8
+        if self.length == 1:
+            large = f.read(8)
+            if len(large) != 8:
+                raise Unsupported("Truncated MP4 box")
+            self.length = struct.unpack('>Q', large)[0]
+            self.data_offset += 8
+            if self.length < 16:
+                raise Unsupported("Invalid 64-bit MP4 box length")
+        elif self.length == 0:
+            if level != 0:
+                raise Unsupported("Zero-length nested MP4 box")
+            self.length = end - self.offset
+        elif self.length < 8:
+            raise Unsupported("Invalid MP4 box length")
+        self.children = None
+        if self.name in _MP4_CONTAINERS:
+            self.children = []
+            f.seek(self.data_offset + _MP4_SKIP.get(self.name, 0))
+            while f.tell() < self.offset + self.length:
+                self.children.append(_Atom(f, end, level + 1))
+        else:
+            f.seek(self.offset + self.length)
+
+    def find(self, *names):
+        """First descendant along ``names``, or None."""
+        atom = self
+        for name in names:
+            if atom.children is None:
+                return None
+            for child in atom.children:
+                if child.name == name:
+                    atom = child
+                    break
+            else:
+                return None
+        return atom
+
+    def read(self, f):
+        size = self.length - (self.data_offset - self.offset)
+        data = _read_at(f, self.data_offset, size)
+        if len(data) != size:
+            raise Unsupported(f"Truncated MP4 {self.name!r} box")
+        return data
+
+
+class _AtomFailed(Exception):
+    """An ilst item mutagen skips (it keeps it aside as a failed atom)."""
+
+
+def _mp4_data(atom, data):
+    """Yield (version, flags, payload) of each data atom inside an ilst item."""
+    pos = 0
+    while pos < atom.length - 8:
+        head = data[pos:pos + 12]
+        if len(head) != 12:
+            raise _AtomFailed()
+        length, name = struct.unpack('>I4s', head[:8])
+        if length < 1 or name != b'data':
+            raise _AtomFailed()
+        chunk = data[pos + 16:pos + length]
+        if len(chunk) != length - 16:
+            raise _AtomFailed()
+        yield head[8], int.from_bytes(head[9:12], 'big'), chunk
+        pos += length
+
+
+def _mp4_text(atom, data):
+    values = []
+    for _version, flags, chunk in _mp4_data(atom, data):
+        if flags not in (0, 1):
+            raise _AtomFailed()
+        try:
+            values.append(chunk.decode('utf-8'))
+        except UnicodeDecodeError:
+            raise _AtomFailed()
+    return values
+
+
+def _mp4_pair(atom, data):
+    values = []
+    for _version, _flags, chunk in _mp4_data(atom, data):
+        if len(chunk) < 6:
+            raise Unsupported(f"Short {atom.name!r} atom")
+        values.append(struct.unpack('>2H', chunk[2:6]))
+    return values
+
+
+def _mp4_covers(atom, data):
+    values = []
+    pos = 0
+    while pos < atom.length - 8:
+        head = data[pos:pos + 12]
+        if len(head) != 12:
+            raise Unsupported("Truncated covr atom")
+        length, name, image_format = struct.unpack('>I4sI', head)
+        if name != b'data':
+            if name == b'name' and length:
+                pos += length
+                continue
+            raise _AtomFailed()
+        if length < 1:
+            raise _AtomFailed()
+        if image_format not in (_MP4_JPEG, _MP4_PNG):
+            image_format = _MP4_JPEG
+        values.append((data[pos + 16:pos + length], image_format))
+        pos += length
+    return values
+
+
+def _check_mp4_freeform(atom, data):
+    """Reject '----' items whose layout makes mutagen fail the whole file."""
+    try:
+        pos = struct.unpack('>I', data[:4])[0]
+        pos += struct.unpack('>I', data[pos:pos + 4])[0]
+        while pos < atom.length - 8:
+            length, name = struct.unpack('>I4s', data[pos:pos + 8])
+            if name != b'data' or length < 1:
+                return
+            if not data[pos + 8:pos + 9]:
+                raise TypeError
+            struct.unpack('>I', b'\x00' + data[pos + 9:pos + 12])
+            pos += length
+    except (struct.error, TypeError):
+        raise Unsupported("Malformed freeform MP4 atom")
+
+
+def _mp4_length(f, moov):
+    """Duration from the first sound track, as mutagen's MP4Info computes it."""
+    for trak in moov.children:
+        if trak.name != b'trak':
+            continue
+        hdlr = trak.find(b'mdia', b'hdlr')
+        if hdlr is None:
+            raise Unsupported("MP4 track without a handler")
+        if hdlr.read(f)[8:12] == b'soun':
+            break
+    else:
+        raise Unsupported("MP4 without a sound track")
+
+    mdhd = trak.find(b'mdia', b'mdhd')
+    if mdhd is None:
+        raise Unsupported("MP4 sound track without mdhd")
+    data = mdhd.read(f)
+    if len(data) < 4:
+        raise Unsupported("Short mdhd")
+    version = data[0]
+    if version == 0:
+        fields = data[12:20]
+        layout = '>2I'
+    elif version == 1:
+        fields = data[20:32]
+        layout = '>IQ'
+    else:
+        raise Unsupported("Unknown mdhd version")
+    if len(fields) != struct.calcsize(layout):
+        raise Unsupported("Short mdhd")
+    unit, duration = struct.unpack(layout, fields)
+    length = float(duration) / unit if unit else 0
+
+    stsd = trak.find(b'mdia', b'minf', b'stbl', b'stsd')
+    if stsd is not None:
+        # Check the sample entry framing mutagen walks; the codec-specific
+        # boxes inside it (esds, alac, dac3) are not decoded here
+        data = stsd.read(f)
+        if len(data) < 8 or data[0] != 0:
+            raise Unsupported("Unsupported stsd box")
+        if struct.unpack('>I', data[4:8])[0]:
+            entry = data[8:]
+            if len(entry) < 8:
+                raise Unsupported("Truncated sample entry")
+            entry_length = struct.unpack('>I', entry[:4])[0]
+            if entry_length < 8 or len(entry) < entry_length or entry_length - 8 < 28 + 8:
+                raise Unsupported("Unsupported sample entry")
+            extra_length = struct.unpack('>I', entry[36:40])[0]
+            if extra_length in (0, 1) or extra_length < 8:
+                raise Unsupported("Unsupported sample entry box")
+    return length
+
+
+def _read_mp4(f, file_size, pictures):
+    if f.read(8)[4:8] != b'ftyp':
+        raise Unsupported("MP4 without a leading ftyp box")
+    f.seek(0)
+    atoms = []
+    while f.tell() + 8 <= file_size:
+        atoms.append(_Atom(f, file_size))
+    moov = next((atom for atom in atoms if atom.name == b'moov'), None)
+    if moov is None:
+        raise Unsupported("MP4 without a moov box")
+    if moov.find(b'udta', b'chpl') is not None:
+        raise Unsupported("MP4 chapters")
+    length = _mp4_length(f, moov)
+
+    tags = TagMap()
+    ilst = moov.find(b'udta', b'meta', b'ilst')
+    if ilst is not None:
+        for atom in ilst.children:
+            data = atom.read(f)
+            name = atom.name
+            if name in _MP4_SHADOWING_ATOMS:
+                raise Unsupported(f"MP4 {name!r} atom")
+            try:
+                if name in _MP4_TEXT_ATOMS:
+                    values = _mp4_text(atom, data)
+                elif name == b'trkn':
+                    values = _mp4_pair(atom, data)
+                elif name == b'covr':
+                    values = _mp4_covers(atom, data)
+                else:
+                    if name == b'disk':
+                        _mp4_pair(atom, data)
+                    elif name == b'----':
+                        _check_mp4_freeform(atom, data)
+                    continue
+            except _AtomFailed:
+                continue
+            tags.add(name.decode('latin-1'), values)
+        for key in tags.keys():
+            if key != 'covr' and not tags[key]:
+                raise Unsupported(f"MP4 {key!r} atom without values")
+
+    picture = None
+    if pictures and 'covr' in tags and tags['covr']:
+        data, image_format = tags['covr'][0]
+        if data:
+            picture = (data, 'image/png' if image_format == _MP4_PNG else 'image/jpeg')
+    return ParsedFile(tags, length, picture)
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Read tags with the fast tag reader (no mutagen)')
+    parser.add_argument('files', nargs='+', help='MP3, FLAC or M4A files')
+    args = parser.parse_args()
+
+    status = 0
+    for file_path in args.files:
+        try:
+            parsed = read_file(file_path)
+        except (Unsupported, OSError) as e:
+            print(f"⚠️  {file_path}: {e}")
+            status = 1
+            continue
+        result = {
+            'file': file_path,
+            'length': parsed.length,
+            'tags': {key: [value if isinstance(value, str) else repr(value)[:60]
+                           for value in parsed.tags[key]] for key in parsed.tags.keys()},
+            'picture': f"{parsed.picture[1]}, {len(parsed.picture[0])} bytes" if parsed.picture else None,
+        }
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
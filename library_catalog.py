@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Library Catalog
+Track metadata held in memory with a sorted index per browse order (filename, artist,
+album, track number, year, duration) and running per-artist and per-album totals.
+Backs /api/tracks, which pages through the library with opaque cursors, and the
+/api/artists and /api/albums group listings.
+
+Like the search index, the catalog follows the library index and the metadata cache,
+so each sort index is updated in place instead of re-sorting the whole library.
+"""
+
+import re
+import json
+import base64
+import bisect
+import threading
+
+from metrics import stage
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Metadata kept for each track and returned by /api/tracks
+TRACK_FIELDS = ('title', 'artist', 'album', 'genre', 'year', 'track_number', 'duration',
+                'album_art_hash')
+
+_LEADING_NUMBER_RE = re.compile(r'\s*(\d+)')
+
+# Missing values sort after every real one
+_LAST_TEXT = '\U0010ffff'
+_LAST_NUMBER = float('inf')
+
+
+def _text(value):
+    """Sort key part for text, ignoring case."""
+    return str(value).casefold() if value else _LAST_TEXT
+
+
+def _number(value):
+    """Sort key part for numbers such as '3/12' or '2001-05-04': leading digits only."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _LEADING_NUMBER_RE.match(value) if isinstance(value, str) else None
+    return float(match.group(1)) if match else _LAST_NUMBER
+
+
+def sort_keys(path, track):
+    """Key for every supported order; the path is added as the final tie-breaker."""
+    artist, album, title = _text(track['artist']), _text(track['album']), _text(track['title'])
+    number = _number(track['track_number'])
+    return {
+        'name': (path.rsplit('/', 1)[-1].lower(),),
+        'artist': (artist, album, number, title),
+        'album': (album, number, title),
+        'track': (number, album, title),
+        'year': (_number(track['year']), artist, album, number),
+        'duration': (_number(track['duration']), title),
+    }
+
+
+SORT_ORDERS = ('name', 'artist', 'album', 'track', 'year', 'duration')
+DEFAULT_SORT = 'name'
+
+
+def _freeze(value):
+    """Turn JSON lists back into the tuples sort keys are made of."""
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def encode_cursor(sort, descending, position):
+    """Opaque cursor pointing just past ``position`` (a sort index entry)."""
+    raw = json.dumps([sort, descending, position], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort, descending):
+    """
+    Return the sort index entry a cursor points past.
+
+    Raises:
+        ValueError: If the cursor is malformed or was issued for another order
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_descending, position = json.loads(raw)
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError("Cursor belongs to a different sort order")
+    return _freeze(position)
+
+
+class _Group:
+    __slots__ = ('name', 'artist', 'paths', 'duration', 'albums', 'album_art_hash')
+
+    def __init__(self, name, artist=None):
+        self.name = name
+        self.artist = artist
+        self.paths = set()
+        self.duration = 0.0
+        self.albums = {}  # album key -> track count (artists only)
+        self.album_art_hash = None
+
+
+class TrackCatalog:
+    """
+    Browsable view of the library's metadata.
+
+    Args:
+        describe (callable): Optional ``describe(path, metadata)`` returning the
+            metadata to store; called with ``metadata=None`` for unread files
+    """
+
+    def __init__(self, describe=None):
+        self.describe = describe
+        self.version = 0
+        self._tracks = {}                          # path -> track fields
+        self._keys = {}                            # path -> {sort: key}
+        self._orders = {sort: [] for sort in SORT_ORDERS}  # sort -> sorted [(key, path)]
+        self._unsorted = set()                     # orders appended to but not sorted yet
+        self._artists = {}                         # artist key -> _Group
+        self._albums = {}                          # (album key, artist key) -> _Group
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._tracks)
+
+    # ------------------------------------------------------------------ updates
+
+    def _group_keys(self, track):
+        artist_key = _text(track['artist'])
+        return artist_key, (_text(track['album']), artist_key)
+
+    def _count(self, path, track, sign):
+        """Add (sign=1) or remove (sign=-1) a track from the artist and album totals."""
+        artist_key, album_key = self._group_keys(track)
+        duration = sign * (track['duration'] or 0.0)
+
+        artist = self._artists.get(artist_key)
+        if artist is None:
+            artist = self._artists[artist_key] = _Group(track['artist'])
+        if sign > 0:
+            artist.paths.add(path)
+        else:
+            artist.paths.discard(path)
+        artist.duration += duration
+        artist.albums[album_key] = artist.albums.get(album_key, 0) + sign
+        if not artist.albums[album_key]:
+            del artist.albums[album_key]
+        if not artist.paths:
+            del self._artists[artist_key]
+
+        album = self._albums.get(album_key)
+        if album is None:
+            album = self._albums[album_key] = _Group(track['album'], track['artist'])
+        if sign > 0:
+            album.paths.add(path)
+        else:
+            album.paths.discard(path)
+        album.duration += duration
+        if sign > 0 and track['album_art_hash']:
+            album.album_art_hash = track['album_art_hash']
+        if not album.paths:
+            del self._albums[album_key]
+
+    def _unlink(self, path):
+        track = self._tracks.pop(path, None)
+        if track is None:
+            return
+        for sort, key in self._keys.pop(path).items():
+            order = self._orders[sort]
+            if sort in self._unsorted:
+                order.remove((key, path))
+            else:
+                del order[bisect.bisect_left(order, (key, path))]
+        self._count(path, track, -1)
+
+    def _entry(self, path, metadata):
+        """Return the stored fields and the key for every sort order of a track."""
+        if self.describe is not None:
+            metadata = self.describe(path, metadata)
+        metadata = metadata or {}
+        if 'error' in metadata:
+            metadata = {}
+        track = {field: metadata.get(field) for field in TRACK_FIELDS}
+        return track, sort_keys(path, track)
+
+    def update(self, path, metadata=None):
+        """Add or refresh one track."""
+        track, keys = self._entry(path, metadata)
+
+        with self._lock:
+            self._unlink(path)
+            self._tracks[path] = track
+            self._keys[path] = keys
+            for sort, key in keys.items():
+                if sort in self._unsorted:
+                    self._orders[sort].append((key, path))
+                else:
+                    bisect.insort(self._orders[sort], (key, path))
+            self._count(path, track, 1)
+            self.version += 1
+
+    def remove(self, path):
+        """Drop a track."""
+        with self._lock:
+            if path in self._tracks:
+                self._unlink(path)
+                self.version += 1
+
+    def build(self, library_index, cache=None):
+        """
+        Load every file in the library, using cached metadata where available.
+
+        Returns:
+            int: Number of tracks loaded
+        """
+        with stage('catalog_build'), self._lock:
+            paths = {entry.path for entry in library_index.entries()}
+            for path in set(self._tracks) - paths:
+                self.remove(path)
+            # Append to every order; each is sorted once, when first requested
+            self._unsorted.update(SORT_ORDERS)
+            pending = {}
+            if cache is not None:
+                for key, metadata in cache.items():
+                    if key in paths and key not in self._tracks:
+                        pending[key] = metadata
+            for path in paths - set(self._tracks) - set(pending):
+                pending[path] = None
+            for path, metadata in pending.items():
+                track, keys = self._entry(path, metadata)
+                self._tracks[path] = track
+                self._keys[path] = keys
+                for sort, key in keys.items():
+                    self._orders[sort].append((key, path))
+                self._count(path, track, 1)
+            self.version += 1
+        return len(self)
+
+    def attach(self, library_index, cache=None):
+        """Keep the catalog current as files change and metadata is extracted."""
+        def on_library_change(index, changes):
+            for path in changes['removed']:
+                self.remove(path)
+            # Modified files keep their old entry until the new metadata is cached
+            for path in changes['added']:
+                with self._lock:
+                    known = path in self._tracks
+                if not known:
+                    self.update(path)
+
+        def on_metadata(key, metadata):
+            if library_index.get(key) is not None:
+                self.update(key, metadata)
+
+        library_index.add_listener(on_library_change)
+        if cache is not None:
+            cache.add_listener(on_metadata)
+
+    # ------------------------------------------------------------------ queries
+
+    def page(self, sort=DEFAULT_SORT, descending=False, cursor=None, limit=DEFAULT_PAGE_SIZE,
+             artist=None, album=None):
+        """
+        Return one page of tracks in the given order.
+
+        Args:
+            sort (str): One of SORT_ORDERS
+            descending (bool): Reverse the order
+            cursor (str): ``next`` value of the previous page, or None for the first page
+            limit (int): Page size
+            artist (str): Only tracks by this artist (case-insensitive)
+            album (str): Only tracks on this album (case-insensitive)
+
+        Returns:
+            dict: 'tracks' (each with its 'path'), 'total' matching tracks and
+            'next', the cursor for the following page or None at the end
+
+        Raises:
+            ValueError: For an unknown sort order or an invalid cursor
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order: {sort}")
+        position = decode_cursor(cursor, sort, descending) if cursor else None
+
+        with stage('catalog_page'), self._lock:
+            order = self._orders[sort]
+            if sort in self._unsorted:
+                order.sort()
+                self._unsorted.discard(sort)
+            if artist is not None or album is not None:
+                # Narrow to the group first; groups are small enough to sort per request
+                order = sorted((self._keys[path][sort], path)
+                               for path in self._group_paths(artist, album))
+
+            if descending:
+                end = bisect.bisect_left(order, position) if position else len(order)
+                entries = order[max(0, end - limit):end][::-1]
+                more = end - limit > 0
+            else:
+                start = bisect.bisect_right(order, position) if position else 0
+                entries = order[start:start + limit]
+                more = start + limit < len(order)
+
+            tracks = [{'path': path, **self._tracks[path]} for _, path in entries]
+            total = len(order)
+
+        next_cursor = encode_cursor(sort, descending, entries[-1]) if more and entries else None
+        return {'tracks': tracks, 'total': total, 'next': next_cursor}
+
+    def _group_paths(self, artist, album):
+        artist_key = _text(artist) if artist is not None else None
+        album_key = _text(album) if album is not None else None
+        if album_key is None:
+            group = self._artists.get(artist_key)
+            return group.paths if group is not None else ()
+        paths = set()
+        for (group_album, group_artist), group in self._albums.items():
+            if group_album == album_key and artist_key in (None, group_artist):
+                paths.update(group.paths)
+        return paths
+
+    def artists(self):
+        """Every artist with its track count, album count and total duration, by name."""
+        with self._lock:
+            groups = sorted(self._artists.items())
+            return [{
+                'artist': group.name,
+                'tracks': len(group.paths),
+                'albums': len(group.albums),
+                'duration': round(group.duration, 2),
+            } for _, group in groups]
+
+    def albums(self, artist=None):
+        """Every album (optionally of one artist) with its track count and total duration."""
+        artist_key = _text(artist) if artist is not None else None
+        with self._lock:
+            groups = sorted(self._albums.items())
+            return [{
+                'album': group.name,
+                'artist': group.artist,
+                'tracks': len(group.paths),
+                'duration': round(group.duration, 2),
+                'album_art_hash': group.album_art_hash,
+            } for (_, group_artist), group in groups
+                if artist_key is None or group_artist == artist_key]
+
+
+# Version: v5.2.0
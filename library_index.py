@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Library Index
+In-memory index of the audio files under the music folder, maintained incrementally.
+Directories whose mtime has not changed are not re-listed on rescan, and every change
+is stamped with a generation number so clients can ask for only what changed since
+their last sync. Refreshed by a background poller, and by filesystem events when the
+optional watchdog package is installed.
+
+The index can be saved to a snapshot file and restored on the next start, so the
+library is served immediately while a quick rescan catches up in the background.
+
+Directories are listed by ``scan_jobs`` threads at once, which hides the per-call
+latency of SSDs and network mounts; spinning disks scan fastest with one.
+"""
+
+import os
+import json
+import time
+import tempfile
+import threading
+from functools import partial
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import stage
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+DEFAULT_SCAN_INTERVAL = 10.0       # seconds between quick (directory-mtime) rescans
+DEFAULT_FULL_SCAN_INTERVAL = 300.0  # seconds between rescans that stat every file
+MAX_TOMBSTONES = 50000             # removed paths remembered for delta queries
+SNAPSHOT_INTERVAL = 60.0           # minimum seconds between snapshot writes
+SNAPSHOT_VERSION = 1
+DEFAULT_SCAN_JOBS = 1              # directories listed at once during a refresh
+
+
+class LibraryEntry:
+    """One audio file in the index."""
+
+    __slots__ = ('path', 'name', 'size', 'mtime', 'mtime_ns', 'added_generation', 'generation')
+
+    def __init__(self, path, st, generation):
+        self.path = path
+        self.name = path.rsplit('/', 1)[-1]
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.mtime_ns = st.st_mtime_ns
+        self.added_generation = generation
+        self.generation = generation
+
+    @classmethod
+    def restore(cls, path, size, mtime, mtime_ns, added_generation, generation):
+        """Recreate an entry from a snapshot record."""
+        entry = cls.__new__(cls)
+        entry.path = path
+        entry.name = path.rsplit('/', 1)[-1]
+        entry.size = size
+        entry.mtime = mtime
+        entry.mtime_ns = mtime_ns
+        entry.added_generation = added_generation
+        entry.generation = generation
+        return entry
+
+    def as_dict(self):
+        """Return the JSON shape used by /api/music-folder."""
+        return {
+            'name': self.name,
+            'path': self.path,
+            'size': self.size,
+            'modified': self.mtime,
+        }
+
+
+class _DirState:
+    __slots__ = ('mtime_ns', 'files', 'subdirs')
+
+    def __init__(self, mtime_ns):
+        self.mtime_ns = mtime_ns
+        self.files = set()
+        self.subdirs = set()
+
+
+class LibraryIndex:
+    """
+    Incrementally maintained index of audio files below ``root``.
+
+    Paths are POSIX-style and relative to the root, matching the paths used
+    in the server's URLs. With a ``namespace`` they are prefixed by it
+    (``nas/Artist/01 Track.flac``), so several indexes can share one URL
+    space (see library_roots.py). All public methods are thread-safe.
+
+    Args:
+        root (str): Folder to index
+        extensions (set): Lowercase file extensions (with dot) to include
+        snapshot (str): Optional file the index is saved to while running and
+            on stop(), and restored from by load_snapshot()
+        namespace (str): Prefix of every path in the index ('' for none)
+        scan_jobs (int): Directories listed concurrently during a refresh
+    """
+
+    def __init__(self, root, extensions, snapshot=None, namespace='', scan_jobs=DEFAULT_SCAN_JOBS):
+        self.root = Path(root)
+        self.extensions = {ext.lower() for ext in extensions}
+        self.namespace = namespace
+        self.scan_jobs = max(1, int(scan_jobs))
+        self.generation = 0
+        # Distinguishes this instance's generations from those of an earlier run
+        self.epoch = format(time.time_ns(), 'x')
+        self.last_refresh = None
+        self.scan_progress = None   # (directories listed, files seen) while a refresh runs
+        self._files = {}
+        self._dirs = {}
+        self._removed = {}          # path -> generation in which it disappeared
+        self._tombstone_floor = 0   # deltas older than this generation need a reset
+        self._dirty_dirs = set()
+        self._listeners = []
+        self._sorted_cache = None
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self.snapshot = Path(snapshot) if snapshot else None
+        self._saved_generation = None
+        self._last_save = 0.0
+
+    # ------------------------------------------------------------------ scanning
+
+    def _abs(self, rel_dir):
+        if self.namespace:
+            rel_dir = rel_dir[len(self.namespace) + 1:]
+        return self.root / rel_dir if rel_dir else self.root
+
+    def file_path(self, path):
+        """
+        Return the filesystem path of an index path, or None if it lies outside this index.
+
+        The path need not be indexed (yet); it is only mapped onto the root.
+        """
+        if self.namespace:
+            if not path.startswith(self.namespace + '/'):
+                return None
+            path = path[len(self.namespace) + 1:]
+        return self.root / path
+
+    @property
+    def location(self):
+        """The resolved root (and namespace), identifying what snapshots were built from."""
+        root = str(self.root.resolve())
+        return f'{self.namespace}={root}' if self.namespace else root
+
+    def indexes(self):
+        """The per-root indexes behind this one: just itself (see LibraryRoots)."""
+        return [self]
+
+    def refresh(self, full=False):
+        """
+        Bring the index up to date with the filesystem.
+
+        A quick refresh re-lists only directories whose mtime changed (new,
+        renamed or deleted entries) plus any directories flagged by
+        filesystem events. A full refresh re-lists and stats everything,
+        which also catches files rewritten in place.
+
+        Args:
+            full (bool): Stat every file instead of trusting directory mtimes
+
+        Returns:
+            dict: Paths 'added', 'modified' and 'removed' by this refresh
+        """
+        with stage('folder_walk' if full else 'folder_rescan'):
+            return self._refresh(full)
+
+    def _list_dir(self, rel_dir, old_dirs, dirty, full):
+        """
+        Visit one directory during a refresh.
+
+        Returns:
+            tuple: (_DirState, {path: stat result, or None if unchanged}, subdirectories
+            to visit), or None if the directory is gone
+        """
+        try:
+            dir_mtime_ns = os.stat(self._abs(rel_dir)).st_mtime_ns
+        except OSError:
+            return None
+
+        previous = old_dirs.get(rel_dir)
+        if (not full and previous is not None and rel_dir not in dirty
+                and previous.mtime_ns == dir_mtime_ns):
+            # Unchanged directory: keep its files, still visit subdirectories
+            return previous, dict.fromkeys(previous.files), previous.subdirs
+
+        state = _DirState(dir_mtime_ns)
+        files = {}
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        try:
+            with os.scandir(self._abs(rel_dir)) as entries:
+                for entry in entries:
+                    try:
+                        # Directory symlinks are not followed (like rglob), so a
+                        # link back up the tree cannot make the scan loop
+                        if entry.is_dir(follow_symlinks=False):
+                            state.subdirs.add(prefix + entry.name)
+                        elif (entry.is_file()
+                              and os.path.splitext(entry.name)[1].lower() in self.extensions):
+                            rel_path = prefix + entry.name
+                            state.files.add(rel_path)
+                            files[rel_path] = entry.stat()
+                    except OSError:
+                        continue
+        except OSError:
+            return state, files, ()
+        return state, files, state.subdirs
+
+    def _refresh(self, full):
+        with self._refresh_lock:
+            with self._lock:
+                dirty, self._dirty_dirs = self._dirty_dirs, set()
+                old_dirs = self._dirs
+
+            changes = {'added': [], 'modified': [], 'removed': []}
+            new_dirs = {}
+            seen_files = {}
+            visit = partial(self._list_dir, old_dirs=old_dirs, dirty=dirty, full=full)
+            # One level of the tree at a time, listed by up to scan_jobs threads
+            pool = (ThreadPoolExecutor(self.scan_jobs, thread_name_prefix='library-scan')
+                    if self.scan_jobs > 1 else None)
+            self.scan_progress = (0, 0)
+            try:
+                level = [self.namespace]
+                while level:
+                    results = pool.map(visit, level) if pool is not None else map(visit, level)
+                    next_level = []
+                    for rel_dir, result in zip(level, results):
+                        if result is None:
+                            continue
+                        state, files, subdirs = result
+                        new_dirs[rel_dir] = state
+                        seen_files.update(files)
+                        next_level.extend(subdirs)
+                    self.scan_progress = (len(new_dirs), len(seen_files))
+                    level = next_level
+            finally:
+                self.scan_progress = None
+                if pool is not None:
+                    pool.shutdown()
+
+            with self._lock:
+                generation = self.generation + 1
+                for rel_path, st in seen_files.items():
+                    existing = self._files.get(rel_path)
+                    if st is None:
+                        continue
+                    if existing is None:
+                        self._files[rel_path] = LibraryEntry(rel_path, st, generation)
+                        self._removed.pop(rel_path, None)
+                        changes['added'].append(rel_path)
+                    elif existing.size != st.st_size or existing.mtime_ns != st.st_mtime_ns:
+                        entry = LibraryEntry(rel_path, st, generation)
+                        entry.added_generation = existing.added_generation
+                        self._files[rel_path] = entry
+                        changes['modified'].append(rel_path)
+
+                for rel_path in [p for p in self._files if p not in seen_files]:
+                    del self._files[rel_path]
+                    self._removed[rel_path] = generation
+                    changes['removed'].append(rel_path)
+
+                self._dirs = new_dirs
+                self.last_refresh = time.time()
+                if any(changes.values()):
+                    self.generation = generation
+                    self._sorted_cache = None
+                    self._trim_tombstones()
+                listeners = list(self._listeners)
+
+            if any(changes.values()):
+                for listener in listeners:
+                    try:
+                        listener(self, changes)
+                    except Exception as e:
+                        print(f"⚠️  Library listener failed: {e}")
+            return changes
+
+    def _trim_tombstones(self):
+        overflow = len(self._removed) - MAX_TOMBSTONES
+        if overflow > 0:
+            oldest = sorted(self._removed.items(), key=lambda item: item[1])[:overflow]
+            for rel_path, generation in oldest:
+                del self._removed[rel_path]
+                self._tombstone_floor = max(self._tombstone_floor, generation)
+
+    def mark_dirty(self, rel_dir):
+        """Force a directory to be re-listed on the next refresh and wake the poller."""
+        with self._lock:
+            self._dirty_dirs.add(rel_dir)
+        self._wake.set()
+
+    # ------------------------------------------------------------------ queries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._files)
+
+    def get(self, rel_path):
+        """Return the LibraryEntry for a path, or None."""
+        with self._lock:
+            return self._files.get(rel_path)
+
+    def entries(self):
+        """Return every entry sorted by lowercase filename (the legacy listing order)."""
+        with self._lock:
+            if self._sorted_cache is None:
+                self._sorted_cache = sorted(self._files.values(), key=lambda e: e.name.lower())
+            return self._sorted_cache
+
+    def listing(self):
+        """Return the full listing as JSON-ready dicts."""
+        return [entry.as_dict() for entry in self.entries()]
+
+    def changes_since(self, generation, epoch=None):
+        """
+        Describe what changed after a given generation.
+
+        Args:
+            generation (int): Generation the client last synced to
+            epoch (str): Epoch that generation was handed out in; generations
+                restart when the index is rebuilt, so another epoch forces a reset
+
+        Returns:
+            dict: Current 'epoch' and 'generation', a 'reset' flag, and 'added',
+            'modified' (file dicts) and 'removed' (paths). When the requested
+            generation is unknown or too old, 'reset' is True and 'added' holds
+            everything.
+        """
+        with self._lock:
+            if ((epoch is not None and epoch != self.epoch)
+                    or generation < self._tombstone_floor or generation > self.generation):
+                return {
+                    'epoch': self.epoch,
+                    'generation': self.generation,
+                    'reset': True,
+                    'added': self.listing(),
+                    'modified': [],
+                    'removed': [],
+                }
+
+            added, modified = [], []
+            for entry in self._files.values():
+                if entry.added_generation > generation:
+                    added.append(entry.as_dict())
+                elif entry.generation > generation:
+                    modified.append(entry.as_dict())
+            removed = [path for path, gen in self._removed.items() if gen > generation]
+            return {
+                'epoch': self.epoch,
+                'generation': self.generation,
+                'reset': False,
+                'added': added,
+                'modified': modified,
+                'removed': removed,
+            }
+
+    def add_listener(self, callback):
+        """Call ``callback(index, changes)`` after every refresh that changed something."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    # ------------------------------------------------------------------ snapshots
+
+    def save_snapshot(self, path=None):
+        """
+        Write the index (files and directory mtimes) to a JSON snapshot.
+
+        The file is replaced atomically, so a crash mid-write keeps the old one.
+
+        Returns:
+            bool: True if the snapshot was written
+        """
+        path = Path(path or self.snapshot)
+        with self._lock:
+            generation = self.generation
+            data = {
+                'version': SNAPSHOT_VERSION,
+                'root': str(self.root.resolve()),
+                'namespace': self.namespace,
+                'extensions': sorted(self.extensions),
+                'epoch': self.epoch,
+                'generation': generation,
+                'files': [[e.path, e.size, e.mtime, e.mtime_ns, e.added_generation, e.generation]
+                          for e in self._files.values()],
+                'dirs': {rel_dir: [state.mtime_ns, sorted(state.subdirs)]
+                         for rel_dir, state in self._dirs.items()},
+            }
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.snapshot-')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        except OSError as e:
+            print(f"⚠️  Could not save library snapshot: {e}")
+            return False
+        self._saved_generation = generation
+        self._last_save = time.monotonic()
+        return True
+
+    def load_snapshot(self, path=None):
+        """
+        Restore the index from a snapshot written by save_snapshot().
+
+        Generations and the epoch carry over, so clients can keep syncing with
+        ``changes_since`` across a restart. Call refresh() afterwards to pick up
+        changes made while the snapshot was on disk; directories whose mtime is
+        unchanged are not re-listed.
+
+        Returns:
+            bool: True if a snapshot for this folder was loaded
+        """
+        path = Path(path or self.snapshot)
+        with stage('snapshot_load'):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return False
+            if (not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION
+                    or data.get('root') != str(self.root.resolve())
+                    or data.get('namespace', '') != self.namespace
+                    or data.get('extensions') != sorted(self.extensions)):
+                return False
+
+            files = {}
+            dirs = {rel_dir: _DirState(mtime_ns) for rel_dir, (mtime_ns, _) in data['dirs'].items()}
+            for rel_dir, (_, subdirs) in data['dirs'].items():
+                dirs[rel_dir].subdirs = set(subdirs)
+            for record in data['files']:
+                entry = LibraryEntry.restore(*record)
+                files[entry.path] = entry
+                state = dirs.get(entry.path.rpartition('/')[0])
+                if state is not None:
+                    state.files.add(entry.path)
+
+            with self._lock:
+                self._files = files
+                self._dirs = dirs
+                self._removed = {}
+                self.epoch = data['epoch']
+                self.generation = data['generation']
+                # Deletions from before the snapshot are unknown: older deltas reset
+                self._tombstone_floor = self.generation
+                self._sorted_cache = None
+                self._saved_generation = self.generation
+        return True
+
+    def _save_if_changed(self, force=False):
+        if self.snapshot is None or self.generation == self._saved_generation:
+            return
+        if force or time.monotonic() - self._last_save >= SNAPSHOT_INTERVAL:
+            self.save_snapshot()
+
+    # ------------------------------------------------------------------ background refresh
+
+    def start(self, interval=DEFAULT_SCAN_INTERVAL, full_interval=DEFAULT_FULL_SCAN_INTERVAL):
+        """
+        Start keeping the index fresh in a background thread.
+
+        Uses filesystem events when watchdog is installed (changed directories
+        are re-listed immediately) and polls every ``interval`` seconds either
+        way, since network mounts often deliver no events. Every
+        ``full_interval`` seconds a full rescan catches in-place rewrites.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if WATCHDOG_AVAILABLE:
+            self._start_observer()
+        self._thread = threading.Thread(target=self._run, args=(interval, full_interval),
+                                        name=f'library-index-{self.namespace or self.root.name}',
+                                        daemon=True)
+        self._thread.start()
+
+    def _run(self, interval, full_interval):
+        last_full = time.monotonic()
+        while not self._stop.is_set():
+            woke = self._wake.wait(interval)
+            if self._stop.is_set():
+                break
+            if woke:
+                # Let a burst of events settle before rescanning
+                time.sleep(0.2)
+                self._wake.clear()
+            full = time.monotonic() - last_full >= full_interval
+            try:
+                self.refresh(full=full)
+                self._save_if_changed()
+            except Exception as e:
+                print(f"⚠️  Library refresh failed: {e}")
+            if full:
+                last_full = time.monotonic()
+
+    def _start_observer(self):
+        index = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                for attr in ('src_path', 'dest_path'):
+                    path = getattr(event, attr, None)
+                    if not path:
+                        continue
+                    try:
+                        rel = Path(os.fsdecode(path)).resolve().relative_to(index.root.resolve())
+                    except (ValueError, OSError):
+                        continue
+                    rel_dir = rel.as_posix() if event.is_directory else rel.parent.as_posix()
+                    rel_dir = '' if rel_dir == '.' else rel_dir
+                    if index.namespace:
+                        rel_dir = f'{index.namespace}/{rel_dir}' if rel_dir else index.namespace
+                    index.mark_dirty(rel_dir)
+
+        try:
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), str(self.root), recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        except Exception as e:
+            print(f"⚠️  Filesystem events unavailable for {self.root}, polling only: {e}")
+            self._observer = None
+
+    def stop(self):
+        """Stop the background refresh thread and filesystem observer, saving the snapshot."""
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._save_if_changed(force=True)
+
+
+# Version: v5.2.0
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Library Roots
+Serves several music folders (local disks, NAS shares, NFS mounts) as one library.
+
+Every root gets its own LibraryIndex with its own background scanner thread, snapshot
+and scan concurrency, so a slow network mount never holds up a local disk: a few scan
+threads hide the latency of SSDs and network shares, one suits a spinning disk.
+Paths are namespaced by root name (``nas/Artist/Album/01 Track.flac``), and the merged
+index offers the same interface as a single LibraryIndex, so the search index,
+catalog, pre-warmer and snapshots work across roots unchanged.
+
+Roots are given as ``NAME=PATH`` on the server command line; ``--root-jobs NAME=N``
+sets how many directories of a root are listed at once.
+"""
+
+import os
+import re
+import heapq
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict, namedtuple
+
+from library_index import LibraryIndex, DEFAULT_SCAN_JOBS
+
+# Combined generations remembered for ?since= queries
+MAX_HISTORY = 10000
+
+ROOT_NAME_RE = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]*')
+
+LibraryRoot = namedtuple('LibraryRoot', 'name path scan_jobs')
+
+
+def parse_roots(specs, job_specs=(), default_jobs=DEFAULT_SCAN_JOBS):
+    """
+    Parse ``NAME=PATH`` root options and ``NAME=N`` scan concurrency options.
+
+    A bare ``PATH`` is named after its last component. Paths are made absolute,
+    so they stay valid when the server changes directory.
+
+    Args:
+        specs (list): Root options
+        job_specs (list): Per-root scan concurrency options
+        default_jobs (int): Scan concurrency of roots without one
+
+    Returns:
+        list: LibraryRoot tuples in the order given
+
+    Raises:
+        ValueError: If a name is invalid or repeated, or a job count names no root
+    """
+    roots = OrderedDict()
+    for spec in specs:
+        name, sep, path = spec.partition('=')
+        if not sep:
+            path = spec
+        path = Path(os.path.abspath(os.path.expanduser(path)))
+        if not sep:
+            name = path.name
+        if not ROOT_NAME_RE.fullmatch(name):
+            raise ValueError(f"Invalid library root name {name!r} (use letters, digits, '_', '-' and '.')")
+        if name in roots:
+            raise ValueError(f"Library root {name!r} given twice")
+        roots[name] = path
+
+    jobs = {}
+    for spec in job_specs:
+        name, sep, count = spec.partition('=')
+        if name not in roots:
+            raise ValueError(f"--root-jobs names unknown library root {name!r}")
+        try:
+            jobs[name] = int(count)
+        except ValueError:
+            raise ValueError(f"Invalid scan job count for {name!r}: {count!r}")
+        if jobs[name] < 1:
+            raise ValueError(f"Scan job count for {name!r} must be at least 1")
+    return [LibraryRoot(name, path, jobs.get(name, default_jobs)) for name, path in roots.items()]
+
+
+class LibraryRoots:
+    """
+    One library made of several independently scanned roots.
+
+    Offers the LibraryIndex interface used by the server (entries, get,
+    listing, changes_since, listeners, snapshots, background refresh) over
+    namespaced paths. The combined generation is the sum of the roots'
+    generations, so it grows whenever any root changes; the roots'
+    generations behind each value handed out are remembered, so
+    ``changes_since`` can ask every root for just its own changes.
+
+    Args:
+        roots (list): LibraryRoot tuples
+        extensions (set): Lowercase file extensions (with dot) to include
+        snapshot (str): Optional snapshot file; each root saves to a sibling
+            named after it (``library-index-nas.json``)
+    """
+
+    def __init__(self, roots, extensions, snapshot=None):
+        self.roots = list(roots)
+        self.snapshot = Path(snapshot) if snapshot else None
+        self._indexes = OrderedDict()
+        for root in self.roots:
+            root_snapshot = None
+            if self.snapshot is not None:
+                root_snapshot = self.snapshot.with_name(
+                    f'{self.snapshot.stem}-{root.name}{self.snapshot.suffix}')
+            self._indexes[root.name] = LibraryIndex(root.path, extensions, snapshot=root_snapshot,
+                                                    namespace=root.name, scan_jobs=root.scan_jobs)
+        self._lock = threading.RLock()
+        self._history = OrderedDict()   # combined generation -> {root name: generation}
+        self._listeners = []
+        self._sorted_cache = None
+        for index in self._indexes.values():
+            index.add_listener(self._on_change)
+        self._record()
+
+    def indexes(self):
+        """The per-root LibraryIndex instances, in the configured order."""
+        return list(self._indexes.values())
+
+    def index_for(self, path):
+        """Return the root index a namespaced path belongs to, or None."""
+        return self._indexes.get(path.split('/', 1)[0])
+
+    # ------------------------------------------------------------------ generations
+
+    def _record(self):
+        """Remember the roots' current generations; returns the combined generation."""
+        with self._lock:
+            generations = {name: index.generation for name, index in self._indexes.items()}
+            generation = sum(generations.values())
+            if generation not in self._history:
+                self._history[generation] = generations
+                while len(self._history) > MAX_HISTORY:
+                    self._history.popitem(last=False)
+            return generation
+
+    @property
+    def generation(self):
+        return self._record()
+
+    @property
+    def epoch(self):
+        epochs = '|'.join(f'{name}:{index.epoch}' for name, index in self._indexes.items())
+        return hashlib.sha1(epochs.encode('utf-8')).hexdigest()[:12]
+
+    @property
+    def location(self):
+        """Every root's location, identifying what snapshots were built from."""
+        return ';'.join(index.location for index in self._indexes.values())
+
+    @property
+    def last_refresh(self):
+        """Time of the oldest root's last refresh (None until every root was scanned)."""
+        times = [index.last_refresh for index in self._indexes.values()]
+        return None if None in times else min(times)
+
+    def _on_change(self, index, changes):
+        with self._lock:
+            self._sorted_cache = None
+            self._record()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(self, changes)
+            except Exception as e:
+                print(f"⚠️  Library listener failed: {e}")
+
+    def add_listener(self, callback):
+        """Call ``callback(roots, changes)`` after any root's refresh changed something."""
+        with self._lock:
+            self._listeners.append(callback)
+
+    # ------------------------------------------------------------------ queries
+
+    def __len__(self):
+        return sum(len(index) for index in self._indexes.values())
+
+    def get(self, path):
+        """Return the LibraryEntry for a namespaced path, or None."""
+        index = self.index_for(path)
+        return index.get(path) if index is not None else None
+
+    def file_path(self, path):
+        """Return the filesystem path of a namespaced path, or None if it names no root."""
+        index = self.index_for(path)
+        return index.file_path(path) if index is not None else None
+
+    def entries(self):
+        """Return every root's entries merged by lowercase filename."""
+        with self._lock:
+            if self._sorted_cache is None:
+                self._sorted_cache = list(heapq.merge(
+                    *(index.entries() for index in self._indexes.values()),
+                    key=lambda e: e.name.lower()))
+            return self._sorted_cache
+
+    def listing(self):
+        """Return the full listing as JSON-ready dicts."""
+        return [entry.as_dict() for entry in self.entries()]
+
+    def changes_since(self, generation, epoch=None):
+        """
+        Describe what changed in any root after a combined generation.
+
+        Returns:
+            dict: Same shape as LibraryIndex.changes_since(); 'reset' is set when
+            the epoch or generation is unknown or any root can no longer answer a delta
+        """
+        current_epoch = self.epoch
+        with self._lock:
+            current = self._record()
+            base = self._history.get(generation)
+        if epoch is not None and epoch != current_epoch:
+            base = None
+        result = {'epoch': current_epoch, 'generation': current, 'reset': False,
+                  'added': [], 'modified': [], 'removed': []}
+        if base is not None:
+            for name, index in self._indexes.items():
+                delta = index.changes_since(base.get(name, 0))
+                if delta['reset']:
+                    break
+                for key in ('added', 'modified', 'removed'):
+                    result[key].extend(delta[key])
+            else:
+                return result
+        return {'epoch': current_epoch, 'generation': current, 'reset': True,
+                'added': self.listing(), 'modified': [], 'removed': []}
+
+    # ------------------------------------------------------------------ scanning
+
+    def _each(self, method, *args, **kwargs):
+        """Run a method on every root at once; returns {root name: result}."""
+        results = {}
+
+        def run(name, index):
+            try:
+                results[name] = getattr(index, method)(*args, **kwargs)
+            except Exception as e:
+                print(f"⚠️  Library root {name}: {method} failed: {e}")
+                results[name] = None
+
+        threads = [threading.Thread(target=run, args=item, name=f'library-{method}-{item[0]}',
+                                    daemon=True)
+                   for item in self._indexes.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def refresh(self, full=False):
+        """
+        Refresh every root in parallel.
+
+        Returns:
+            dict: Paths 'added', 'modified' and 'removed' across all roots
+        """
+        merged = {'added': [], 'modified': [], 'removed': []}
+        for changes in self._each('refresh', full=full).values():
+            for key, paths in (changes or {}).items():
+                merged[key].extend(paths)
+        return merged
+
+    def save_snapshot(self):
+        """Save every root's snapshot; True if all were written."""
+        return all(index.save_snapshot() for index in self._indexes.values())
+
+    def load_snapshot(self):
+        """
+        Restore every root from its snapshot.
+
+        Returns:
+            bool: True if every root was restored
+        """
+        restored = all([index.load_snapshot() for index in self._indexes.values()])
+        with self._lock:
+            self._sorted_cache = None
+            self._history.clear()
+        self._record()
+        return restored
+
+    def start(self, **kwargs):
+        """Start every root's background scanner (see LibraryIndex.start)."""
+        for index in self._indexes.values():
+            index.start(**kwargs)
+
+    def stop(self):
+        """Stop every root's scanner and save the snapshots."""
+        self._each('stop')
+
+    def status(self):
+        """Per-root file counts and scan state."""
+        return [{
+            'name': root.name,
+            'path': str(root.path),
+            'files': len(index),
+            'generation': index.generation,
+            'scan_jobs': index.scan_jobs,
+            'last_refresh': index.last_refresh,
+        } for root, index in zip(self.roots, self._indexes.values())]
+
+
+# Version: v5.2.0
@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+"""
+Library Snapshot
+Compact, memory-mapped file holding the metadata of the whole library (.lms).
+
+Every track is one row of fixed-width columns: ids into interned artist, album,
+genre and album-art tables, duration, year, track number, size and mtime, and
+offsets of its path and title in a shared UTF-8 string heap. Rows are sorted by
+path, so a track (or a folder) is found by binary search, and readers only touch
+the pages they query instead of decoding the library into Python dicts.
+
+The server writes .cache/library.lms next to its other caches and builds the
+search index and catalog from it on the next start. Run directly to build,
+inspect or query a snapshot.
+"""
+
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import struct
+import argparse
+import tempfile
+import threading
+from array import array
+from pathlib import Path
+from collections import Counter
+
+from metrics import stage
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_SNAPSHOT_PATH = SCRIPT_DIR / '.cache' / 'library.lms'
+
+MAGIC = b'LMSNAP\r\n'
+FORMAT_VERSION = 1
+DEFAULT_WRITE_INTERVAL = 60.0  # minimum seconds between background writes
+
+# Sections in file order: name and array typecode. Per-track columns have one row per
+# track; offset columns (path, title, *_names) have one more, so row i spans [i, i + 1)
+SECTIONS = (
+    ('path', 'I'),
+    ('title', 'I'),
+    ('artist', 'I'),
+    ('album', 'I'),
+    ('genre', 'I'),
+    ('art', 'I'),
+    ('duration', 'f'),
+    ('year', 'H'),
+    ('track_number', 'H'),
+    ('flags', 'B'),
+    ('size', 'Q'),
+    ('mtime_ns', 'q'),
+    ('artist_names', 'I'),
+    ('album_names', 'I'),
+    ('genre_names', 'I'),
+    ('art_names', 'I'),
+    ('heap', 'B'),
+)
+# Interned columns: track column -> metadata field
+INTERNED = {'artist': 'artist', 'album': 'album', 'genre': 'genre', 'art': 'album_art_hash'}
+
+# magic, version, track count, section count, created; then (offset, items) per section
+# and the heap span of the music folder path (ROOT_SPAN)
+HEADER = struct.Struct('<8sIIId')
+SECTION_ENTRY = struct.Struct('<QQ')
+ROOT_SPAN = struct.Struct('<II')
+ALIGNMENT = 8
+
+NO_ID = 0xFFFFFFFF      # interned column value for a missing field
+FLAG_READ = 1           # metadata was extracted (unset: only path, size and mtime are known)
+MAX_SMALL_NUMBER = 0xFFFF
+
+
+class SnapshotError(ValueError):
+    """Raised when a file is not a readable library snapshot."""
+
+
+def _leading_number(value):
+    """Year or track number as stored: leading digits of '2001-05-04' or '3/12', 0 if none."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        number = int(value)
+    else:
+        digits = ''
+        for char in str(value or '').strip():
+            if not char.isdigit():
+                break
+            digits += char
+        number = int(digits) if digits else 0
+    return number if 0 <= number <= MAX_SMALL_NUMBER else 0
+
+
+def _sort_key(name):
+    return (name.casefold(), name)
+
+
+# ---------------------------------------------------------------------- writing
+
+def write_snapshot(path, records, root=None):
+    """
+    Write a library snapshot.
+
+    The file is replaced atomically, so readers that already mapped the old
+    one keep a consistent view.
+
+    Args:
+        path (str): Snapshot file to write
+        records (iterable): ``(rel_path, size, mtime_ns, metadata)`` per track; metadata
+            is an extract_metadata result, or None (or an error) if the file was not read
+        root (str): Music folder the paths are relative to, stored for validation
+
+    Returns:
+        int: Number of tracks written
+    """
+    with stage('library_snapshot_write'):
+        rows = sorted(((rel_path.encode('utf-8'), size, mtime_ns, metadata)
+                       for rel_path, size, mtime_ns, metadata in records),
+                      key=lambda row: row[0])
+
+        # Interned tables are sorted by name, so ids also give the listing order
+        tables = {}
+        for column, field in INTERNED.items():
+            names = {metadata[field] for _, _, _, metadata in rows
+                     if metadata and 'error' not in metadata and metadata.get(field)}
+            tables[column] = sorted((str(name) for name in names), key=_sort_key)
+
+        heap = bytearray()
+
+        def heap_string(text, offsets):
+            heap.extend(text)
+            offsets.append(len(heap))
+
+        columns = {name: array(code) for name, code in SECTIONS if name != 'heap'}
+        root_bytes = str(root or '').encode('utf-8')
+        heap.extend(root_bytes)
+        for column, names in tables.items():
+            offsets = columns[f'{column}_names']
+            offsets.append(len(heap))
+            for name in names:
+                heap_string(name.encode('utf-8'), offsets)
+        ids = {column: {name: i for i, name in enumerate(names)} for column, names in tables.items()}
+
+        columns['path'].append(len(heap))
+        for rel_path, _, _, _ in rows:
+            heap_string(rel_path, columns['path'])
+        columns['title'].append(len(heap))
+        for rel_path, size, mtime_ns, metadata in rows:
+            read = bool(metadata) and 'error' not in metadata
+            metadata = metadata if read else {}
+            heap_string(str(metadata.get('title') or '').encode('utf-8'), columns['title'])
+            for column, field in INTERNED.items():
+                value = metadata.get(field)
+                columns[column].append(ids[column][str(value)] if value else NO_ID)
+            duration = metadata.get('duration')
+            columns['duration'].append(float(duration) if isinstance(duration, (int, float))
+                                       else math.nan)
+            columns['year'].append(_leading_number(metadata.get('year')))
+            columns['track_number'].append(_leading_number(metadata.get('track_number')))
+            columns['flags'].append(FLAG_READ if read else 0)
+            columns['size'].append(size)
+            columns['mtime_ns'].append(mtime_ns)
+        if len(heap) > 0xFFFFFFFF:
+            raise SnapshotError('library too large for a snapshot (string heap over 4 GiB)')
+
+        blobs = [columns[name].tobytes() if name != 'heap' else bytes(heap)
+                 for name, _ in SECTIONS]
+        items = [len(columns[name]) if name != 'heap' else len(heap) for name, _ in SECTIONS]
+        offset = HEADER.size + SECTION_ENTRY.size * len(SECTIONS) + ROOT_SPAN.size
+        entries = []
+        for blob in blobs:
+            offset += -offset % ALIGNMENT
+            entries.append(offset)
+            offset += len(blob)
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.snapshot-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(rows), len(SECTIONS), time.time()))
+                for start, count in zip(entries, items):
+                    f.write(SECTION_ENTRY.pack(start, count))
+                f.write(ROOT_SPAN.pack(0, len(root_bytes)))
+                for start, blob in zip(entries, blobs):
+                    f.write(b'\0' * (start - f.tell()))
+                    f.write(blob)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return len(rows)
+
+
+# ---------------------------------------------------------------------- reading
+
+class LibrarySnapshot:
+    """
+    Read-only view of a snapshot file through ``mmap``.
+
+    Columns are memoryviews over the mapping, so opening a snapshot costs a
+    few page faults regardless of library size, and only rows that are
+    queried are decoded. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.file_path = Path(path)
+        with open(self.file_path, 'rb') as f:
+            try:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise SnapshotError(f'{self.file_path} is empty') from None
+        try:
+            self._map_sections()
+        except BaseException:
+            self.close()
+            raise
+
+    def _map_sections(self):
+        mm = self._mmap
+        if len(mm) < HEADER.size:
+            raise SnapshotError(f'{self.file_path} is not a library snapshot')
+        magic, version, count, sections, created = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f'{self.file_path} is not a library snapshot')
+        if version != FORMAT_VERSION or sections != len(SECTIONS):
+            raise SnapshotError(f'{self.file_path} has unsupported format version {version}')
+        self.created = created
+        self._count = count
+        self._views = []
+        view = memoryview(mm)
+        self._views.append(view)
+        for i, (name, code) in enumerate(SECTIONS):
+            start, items = SECTION_ENTRY.unpack_from(mm, HEADER.size + i * SECTION_ENTRY.size)
+            end = start + items * array(code).itemsize
+            if end > len(mm):
+                raise SnapshotError(f'{self.file_path} is truncated')
+            column = view[start:end].cast(code)
+            self._views.append(column)
+            setattr(self, f'_{name}', column)
+        if len(self._path) != count + 1 or len(self._size) != count:
+            raise SnapshotError(f'{self.file_path} is corrupt')
+        self._heap_start = SECTION_ENTRY.unpack_from(
+            mm, HEADER.size + (len(SECTIONS) - 1) * SECTION_ENTRY.size)[0]
+        root_start, root_length = ROOT_SPAN.unpack_from(
+            mm, HEADER.size + len(SECTIONS) * SECTION_ENTRY.size)
+        self.root = self._string(root_start, root_start + root_length)
+
+    def close(self):
+        """Unmap the file; the snapshot cannot be used afterwards."""
+        for view in reversed(getattr(self, '_views', [])):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def _string(self, start, end):
+        base = self._heap_start
+        return self._mmap[base + start:base + end].decode('utf-8')
+
+    def _path_bytes(self, row):
+        base = self._heap_start
+        return self._mmap[base + self._path[row]:base + self._path[row + 1]]
+
+    def _name(self, column, value):
+        if value == NO_ID:
+            return None
+        offsets = getattr(self, f'_{column}_names')
+        return self._string(offsets[value], offsets[value + 1])
+
+    # ------------------------------------------------------------------ rows
+
+    def path(self, row):
+        """Relative path of a row."""
+        return self._string(self._path[row], self._path[row + 1])
+
+    def find(self, rel_path):
+        """Return the row of a path, or -1."""
+        target = rel_path.encode('utf-8')
+        row = self._lower_bound(target)
+        if row < self._count and self._path_bytes(row) == target:
+            return row
+        return -1
+
+    def _lower_bound(self, target):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._path_bytes(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def stat(self, row):
+        """Return ``(size, mtime_ns)`` recorded for a row."""
+        return self._size[row], self._mtime_ns[row]
+
+    def metadata(self, row):
+        """
+        Metadata of a row in the shape extract_metadata returns.
+
+        Year and track number come back as strings of the stored numbers.
+
+        Returns:
+            dict: Metadata, or None if the file had not been read when the snapshot was written
+        """
+        if not self._flags[row] & FLAG_READ:
+            return None
+        name = self.path(row).rsplit('/', 1)[-1]
+        metadata = {
+            'title': self._string(self._title[row], self._title[row + 1]) or None,
+            'artist': self._name('artist', self._artist[row]),
+            'album': self._name('album', self._album[row]),
+            'year': str(self._year[row]) if self._year[row] else None,
+            'genre': self._name('genre', self._genre[row]),
+            'track_number': str(self._track_number[row]) if self._track_number[row] else None,
+            'duration': None if math.isnan(self._duration[row]) else round(self._duration[row], 2),
+            'file_size': self._size[row],
+            'file_name': name,
+            'album_art_hash': self._name('art', self._art[row]),
+        }
+        return {key: value for key, value in metadata.items() if value is not None}
+
+    def track(self, row):
+        """Everything stored for a row, as one dict (for output)."""
+        size, mtime_ns = self.stat(row)
+        path = self.path(row)
+        metadata = self.metadata(row) or {'file_size': size, 'file_name': path.rsplit('/', 1)[-1]}
+        return {'path': path, **metadata, 'mtime_ns': mtime_ns}
+
+    def get(self, rel_path):
+        """Return track() for a path, or None."""
+        row = self.find(rel_path)
+        return self.track(row) if row >= 0 else None
+
+    def __iter__(self):
+        return iter(range(self._count))
+
+    def scan(self):
+        """
+        Yield ``(path, size, mtime_ns, metadata)`` for every row, in path order.
+
+        Faster than calling metadata() per row: interned names are decoded once
+        and columns are walked together. Metadata is None for unread files.
+        """
+        names = {column: self.names(column) for column in INTERNED}
+        heap = self._mmap[self._heap_start:self._heap_start + len(self._heap)]
+        paths, titles = self._path, self._title
+        columns = zip(self._artist, self._album, self._genre, self._art, self._duration,
+                      self._year, self._track_number, self._flags, self._size, self._mtime_ns)
+        for row, (artist, album, genre, art, duration, year, number, flags, size,
+                  mtime_ns) in enumerate(columns):
+            path = heap[paths[row]:paths[row + 1]].decode('utf-8')
+            if not flags & FLAG_READ:
+                yield path, size, mtime_ns, None
+                continue
+            metadata = {'file_size': size, 'file_name': path.rsplit('/', 1)[-1]}
+            title = heap[titles[row]:titles[row + 1]]
+            if title:
+                metadata['title'] = title.decode('utf-8')
+            if artist != NO_ID:
+                metadata['artist'] = names['artist'][artist]
+            if album != NO_ID:
+                metadata['album'] = names['album'][album]
+            if genre != NO_ID:
+                metadata['genre'] = names['genre'][genre]
+            if year:
+                metadata['year'] = str(year)
+            if number:
+                metadata['track_number'] = str(number)
+            if duration == duration:  # not NaN
+                metadata['duration'] = round(duration, 2)
+            if art != NO_ID:
+                metadata['album_art_hash'] = names['art'][art]
+            yield path, size, mtime_ns, metadata
+
+    # ------------------------------------------------------------------ queries
+
+    def names(self, column):
+        """Interned names of ``column`` ('artist', 'album', 'genre' or 'art'), sorted."""
+        offsets = getattr(self, f'_{column}_names')
+        return [self._string(offsets[i], offsets[i + 1]) for i in range(len(offsets) - 1)]
+
+    def _ids(self, column, name):
+        """Ids of the names in ``column`` equal to ``name``, ignoring case."""
+        offsets = getattr(self, f'_{column}_names')
+        target = name.casefold()
+        low, high = 0, len(offsets) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._string(offsets[middle], offsets[middle + 1]).casefold() < target:
+                low = middle + 1
+            else:
+                high = middle
+        ids = set()
+        while low < len(offsets) - 1 and self._string(offsets[low], offsets[low + 1]).casefold() == target:
+            ids.add(low)
+            low += 1
+        return ids
+
+    def select(self, artist=None, album=None, genre=None, year=None, folder=None):
+        """
+        Rows matching every given filter.
+
+        Names match ignoring case; ``folder`` is a path prefix such as 'Artist/Album'.
+
+        Returns:
+            list: Matching rows, in path order
+        """
+        if folder:
+            prefix = folder.strip('/').encode('utf-8') + b'/'
+            start = self._lower_bound(prefix)
+            end = self._lower_bound(prefix[:-1] + b'0')  # '0' sorts right after '/'
+            rows = range(start, end)
+        else:
+            rows = range(self._count)
+        for column, name in (('artist', artist), ('album', album), ('genre', genre)):
+            if name is None:
+                continue
+            ids = self._ids(column, name)
+            values = getattr(self, f'_{column}')
+            rows = [row for row in rows if values[row] in ids]
+        if year is not None:
+            year = _leading_number(year)
+            rows = [row for row in rows if self._year[row] == year]
+        return list(rows)
+
+    def counts(self, column):
+        """
+        Tracks per name of an interned column.
+
+        Returns:
+            list: ``(name, tracks)`` sorted by name
+        """
+        counter = Counter(getattr(self, f'_{column}'))
+        counter.pop(NO_ID, None)
+        return [(self._name(column, value), counter[value]) for value in sorted(counter)]
+
+    def stats(self):
+        """Row, table and file sizes."""
+        return {
+            'tracks': self._count,
+            'read': sum(1 for flags in self._flags if flags & FLAG_READ),
+            'artists': len(self._artist_names) - 1,
+            'albums': len(self._album_names) - 1,
+            'genres': len(self._genre_names) - 1,
+            'heap_bytes': len(self._heap),
+            'file_bytes': len(self._mmap),
+            'created': self.created,
+            'root': self.root,
+        }
+
+
+def open_snapshot(path, root=None):
+    """
+    Open a snapshot, or return None if it is missing, unreadable or for another folder.
+
+    Args:
+        path (str): Snapshot file
+        root (str): Expected music folder (resolved), or None to accept any
+    """
+    try:
+        snapshot = LibrarySnapshot(path)
+    except (OSError, SnapshotError):
+        return None
+    if root is not None and snapshot.root != str(root):
+        snapshot.close()
+        return None
+    return snapshot
+
+
+# ---------------------------------------------------------------------- server integration
+
+class SnapshotMetadata:
+    """
+    Metadata source for SearchIndex.build() and TrackCatalog.build().
+
+    Yields ``(key, metadata)`` like MetadataCache.items(), taking rows from the
+    snapshot while their size and mtime still match the library index, and
+    only the rest from the cache, so a warm start decodes no JSON for
+    unchanged files.
+    """
+
+    def __init__(self, snapshot, library_index, cache=None):
+        self.snapshot = snapshot
+        self.library_index = library_index
+        self.cache = cache
+        self.from_snapshot = 0
+        self.from_cache = 0
+
+    def items(self):
+        snapshot, index = self.snapshot, self.library_index
+        self.from_snapshot = self.from_cache = 0
+        current = {entry.path: (entry.size, entry.mtime_ns) for entry in index.entries()}
+        found = set()
+        for path, size, mtime_ns, metadata in snapshot.scan():
+            if current.get(path) != (size, mtime_ns):
+                continue
+            # Files not yet read when the snapshot was written may be cached by now
+            if metadata is not None:
+                found.add(path)
+                self.from_snapshot += 1
+                yield path, metadata
+        if self.cache is not None:
+            rest = [path for path in current if path not in found]
+            for key, metadata in self.cache.items(rest):
+                self.from_cache += 1
+                yield key, metadata
+
+
+def library_records(library_index, cache):
+    """``(rel_path, size, mtime_ns, metadata)`` for every indexed file, metadata from the cache."""
+    stored = {}
+    if cache is not None:
+        for key, size, mtime_ns, metadata in cache.rows():
+            stored[key] = (size, mtime_ns, metadata)
+    for entry in library_index.entries():
+        size, mtime_ns, metadata = stored.get(entry.path, (None, None, None))
+        fresh = (size, mtime_ns) == (entry.size, entry.mtime_ns)
+        yield entry.path, entry.size, entry.mtime_ns, metadata if fresh else None
+
+
+class SnapshotWriter:
+    """
+    Rewrites the snapshot in the background after the library or its metadata changed.
+
+    Writes at most once per ``interval`` seconds, and once more on stop().
+    """
+
+    def __init__(self, path, library_index, cache=None, interval=DEFAULT_WRITE_INTERVAL):
+        self.path = Path(path)
+        self.library_index = library_index
+        self.cache = cache
+        self.interval = interval
+        self.written = 0
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        library_index.add_listener(lambda index, changes: self._dirty.set())
+        if cache is not None:
+            cache.add_listener(lambda key, metadata: self._dirty.set())
+
+    def mark_dirty(self):
+        """Request a write on the next interval."""
+        self._dirty.set()
+
+    def write(self):
+        """Write the snapshot now."""
+        self._dirty.clear()
+        try:
+            count = write_snapshot(self.path, library_records(self.library_index, self.cache),
+                                   root=self.library_index.location)
+        except (OSError, SnapshotError) as e:
+            print(f"⚠️  Could not write library snapshot: {e}")
+            return False
+        self.written += 1
+        return count
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='library-snapshot', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self._dirty.is_set():
+                self.write()
+
+    def stop(self):
+        """Stop the background thread, writing pending changes first."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._dirty.is_set():
+            self.write()
+
+
+# ---------------------------------------------------------------------- command line
+
+def _print_tracks(snapshot, rows, as_json):
+    for row in rows:
+        track = snapshot.track(row)
+        if as_json:
+            print(json.dumps(track, separators=(',', ':')))
+        else:
+            label = ' - '.join(str(track[key]) for key in ('artist', 'title') if key in track)
+            print(f"{track['path']}  {label}" if label else track['path'])
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Build, inspect and query library snapshots')
+    parser.add_argument('command', choices=['build', 'stats', 'query', 'list'],
+                        help='build: write a snapshot of the music folder from the metadata cache; '
+                             'stats: show sizes; query: print matching tracks; '
+                             'list: print artists, albums or genres with track counts')
+    parser.add_argument('--snapshot', default=str(DEFAULT_SNAPSHOT_PATH), help='Snapshot file')
+    parser.add_argument('--root', default=str(SCRIPT_DIR / 'music'), help='Music folder (build)')
+    parser.add_argument('--cache', help='Metadata cache database (build)')
+    parser.add_argument('--artist', help='Only tracks by this artist (query)')
+    parser.add_argument('--album', help='Only tracks from this album (query)')
+    parser.add_argument('--genre', help='Only tracks of this genre (query)')
+    parser.add_argument('--year', help='Only tracks from this year (query)')
+    parser.add_argument('--folder', help='Only tracks under this folder (query)')
+    parser.add_argument('--field', choices=['artist', 'album', 'genre'], default='artist',
+                        help='Column to list (default: artist)')
+    parser.add_argument('--json', action='store_true', help='Output NDJSON')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from library_index import LibraryIndex
+        from metadata_cache import MetadataCache, DEFAULT_CACHE_PATH
+        from metadata_reader import AUDIO_EXTENSIONS
+        root = Path(args.root)
+        if not root.is_dir():
+            print(f"Error: music folder not found: {root}")
+            sys.exit(1)
+        index = LibraryIndex(root, AUDIO_EXTENSIONS)
+        index.refresh()
+        cache = MetadataCache(args.cache or DEFAULT_CACHE_PATH, root=root)
+        count = write_snapshot(args.snapshot, library_records(index, cache), root=root.resolve())
+        size = os.path.getsize(args.snapshot)
+        print(f"Wrote {count} tracks to {args.snapshot} ({size / 1024:.1f} KB)")
+        return
+
+    try:
+        snapshot = LibrarySnapshot(args.snapshot)
+    except (OSError, SnapshotError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    with snapshot:
+        if args.command == 'stats':
+            stats = snapshot.stats()
+            print(f"Tracks:   {stats['tracks']} ({stats['read']} with metadata)")
+            print(f"Artists:  {stats['artists']}")
+            print(f"Albums:   {stats['albums']}")
+            print(f"Genres:   {stats['genres']}")
+            print(f"Size:     {stats['file_bytes'] / 1024:.1f} KB "
+                  f"({stats['heap_bytes'] / 1024:.1f} KB of strings)")
+            print(f"Written:  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['created']))}")
+            print(f"Folder:   {stats['root']}")
+        elif args.command == 'list':
+            for name, count in snapshot.counts(args.field):
+                if args.json:
+                    print(json.dumps({args.field: name, 'tracks': count}))
+                else:
+                    print(f"{count:6}  {name}")
+        else:
+            rows = snapshot.select(artist=args.artist, album=args.album, genre=args.genre,
+                                   year=args.year, folder=args.folder)
+            _print_tracks(snapshot, rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
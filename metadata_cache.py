@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Persistent Metadata Cache
+Stores extract_metadata results in SQLite so unchanged files are never parsed twice.
+Entries are keyed by path (relative to the music folder when possible, prefixed by the
+root name when the library has several roots) and validated against the file's size and
+modification time, so edited files are re-read automatically.
+Can be run directly to inspect, prune, vacuum or rebuild the cache.
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+from metrics import stage
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_CACHE_PATH = SCRIPT_DIR / '.cache' / 'metadata.sqlite3'
+DEFAULT_MUSIC_ROOT = SCRIPT_DIR / 'music'
+
+# Bump when the shape of cached metadata changes; older caches are discarded
+# v2: album art is stored by content hash (album_art_hash) instead of inline base64
+SCHEMA_VERSION = 2
+
+# Keys per query when looking up many entries (SQLite limits bound parameters)
+KEY_BATCH = 500
+
+
+class MetadataCache:
+    """
+    SQLite-backed metadata store keyed by (path, st_size, st_mtime_ns).
+
+    A lookup costs one ``stat`` plus one indexed query. Each thread gets its
+    own connection, so a single instance can be shared by the server's
+    worker pool.
+
+    Args:
+        db_path (str): SQLite database file
+        root (str): Music folder that keys are relative to
+        roots (dict): Root name -> folder for a library with several roots
+            (see library_roots.py); replaces ``root``
+    """
+
+    def __init__(self, db_path=DEFAULT_CACHE_PATH, root=DEFAULT_MUSIC_ROOT, roots=None):
+        self.db_path = Path(db_path)
+        if roots is None:
+            roots = {'': root} if root else {}
+        # (key prefix, folder) pairs, deepest folder first so nested roots win
+        self.roots = sorted(((f'{name}/' if name else '', Path(folder).resolve())
+                             for name, folder in roots.items()),
+                            key=lambda item: len(item[1].parts), reverse=True)
+        self.root = self.roots[0][1] if len(self.roots) == 1 and not self.roots[0][0] else None
+        self._local = threading.local()
+        self._hits = 0
+        self._misses = 0
+        self._stats_lock = threading.Lock()
+        self._listeners = []
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_info (key TEXT PRIMARY KEY, value TEXT)')
+            row = conn.execute("SELECT value FROM cache_info WHERE key = 'schema_version'").fetchone()
+            if row is None or int(row[0]) != SCHEMA_VERSION:
+                conn.execute('DROP TABLE IF EXISTS metadata')
+                conn.execute("INSERT OR REPLACE INTO cache_info VALUES ('schema_version', ?)",
+                             (str(SCHEMA_VERSION),))
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    metadata TEXT NOT NULL,
+                    updated REAL NOT NULL
+                )
+            ''')
+            # Audio-payload fingerprints (see content_hash.py), validated like metadata
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS fingerprints_by_value ON fingerprints (fingerprint)')
+
+    def key_for(self, file_path):
+        """
+        Return the cache key for a file.
+
+        Files under a music root are keyed by their POSIX-style relative path
+        (the same path the server uses in URLs); anything else by absolute path.
+        """
+        resolved = Path(file_path).resolve()
+        for prefix, folder in self.roots:
+            try:
+                return prefix + resolved.relative_to(folder).as_posix()
+            except ValueError:
+                continue
+        return resolved.as_posix()
+
+    def get(self, file_path, stat_result=None):
+        """
+        Look up cached metadata for a file.
+
+        Args:
+            file_path (str): Path to the audio file
+            stat_result (os.stat_result): Optional pre-computed stat of the file
+
+        Returns:
+            dict: Cached metadata, or None if missing or stale
+        """
+        with stage('cache_lookup'):
+            try:
+                st = stat_result or os.stat(file_path)
+            except OSError:
+                return None
+
+            row = self._connect().execute(
+                'SELECT size, mtime_ns, metadata FROM metadata WHERE path = ?',
+                (self.key_for(file_path),)
+            ).fetchone()
+
+            hit = row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns
+            with self._stats_lock:
+                if hit:
+                    self._hits += 1
+                else:
+                    self._misses += 1
+            return json.loads(row[2]) if hit else None
+
+    def contains(self, file_path, stat_result=None):
+        """
+        True if an up-to-date entry exists for the file.
+
+        Unlike ``get`` this does not decode the entry or count towards the hit rate.
+        """
+        try:
+            st = stat_result or os.stat(file_path)
+        except OSError:
+            return False
+        row = self._connect().execute(
+            'SELECT 1 FROM metadata WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (self.key_for(file_path), st.st_size, st.st_mtime_ns)
+        ).fetchone()
+        return row is not None
+
+    def put(self, file_path, metadata, stat_result=None):
+        """Store metadata for a file, tagged with its current size and mtime."""
+        try:
+            st = stat_result or os.stat(file_path)
+        except OSError:
+            return
+        key = self.key_for(file_path)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO metadata (path, size, mtime_ns, metadata, updated) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, st.st_size, st.st_mtime_ns,
+                 json.dumps(metadata, separators=(',', ':')), time.time())
+            )
+        for listener in self._listeners:
+            try:
+                listener(key, metadata)
+            except Exception as e:
+                print(f"⚠️  Metadata cache listener failed: {e}")
+
+    def add_listener(self, callback):
+        """Call ``callback(key, metadata)`` after every ``put``."""
+        self._listeners.append(callback)
+
+    def items(self, keys=None):
+        """Yield ``(key, metadata)`` for every entry (or only ``keys``), without checking freshness."""
+        conn = self._connect()
+        if keys is None:
+            for key, raw in conn.execute('SELECT path, metadata FROM metadata'):
+                yield key, json.loads(raw)
+            return
+        keys = list(keys)
+        for start in range(0, len(keys), KEY_BATCH):
+            batch = keys[start:start + KEY_BATCH]
+            cursor = conn.execute('SELECT path, metadata FROM metadata WHERE path IN (%s)'
+                                  % ','.join('?' * len(batch)), batch)
+            for key, raw in cursor.fetchall():
+                yield key, json.loads(raw)
+
+    def rows(self):
+        """Yield ``(key, size, mtime_ns, metadata)`` for every entry."""
+        cursor = self._connect().execute('SELECT path, size, mtime_ns, metadata FROM metadata')
+        for key, size, mtime_ns, raw in cursor:
+            yield key, size, mtime_ns, json.loads(raw)
+
+    def get_fingerprint(self, file_path, stat_result=None):
+        """Return the stored audio fingerprint of a file, or None if missing or stale."""
+        try:
+            st = stat_result or os.stat(file_path)
+        except OSError:
+            return None
+        row = self._connect().execute(
+            'SELECT fingerprint FROM fingerprints WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (self.key_for(file_path), st.st_size, st.st_mtime_ns)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_fingerprint_key(self, key):
+        """Return the last fingerprint stored under a cache key, even if the file is gone."""
+        row = self._connect().execute('SELECT fingerprint FROM fingerprints WHERE path = ?',
+                                      (key,)).fetchone()
+        return row[0] if row else None
+
+    def put_fingerprint(self, file_path, fingerprint, stat_result=None):
+        """Store the audio fingerprint of a file, tagged with its current size and mtime."""
+        try:
+            st = stat_result or os.stat(file_path)
+        except OSError:
+            return
+        conn = self._connect()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?)',
+                         (self.key_for(file_path), st.st_size, st.st_mtime_ns, fingerprint))
+
+    def fingerprint_items(self):
+        """Return ``(key, fingerprint)`` for every stored fingerprint."""
+        return self._connect().execute('SELECT path, fingerprint FROM fingerprints').fetchall()
+
+    def move(self, old_key, new_path, stat_result=None):
+        """
+        Re-key the metadata and fingerprint of a file that was renamed or moved.
+
+        The entry is revalidated against the new file's size and mtime, and
+        listeners are told about the metadata under its new key.
+
+        Returns:
+            bool: True if there was metadata to carry over
+        """
+        try:
+            st = stat_result or os.stat(new_path)
+        except OSError:
+            return False
+        new_key = self.key_for(new_path)
+        conn = self._connect()
+        with conn:
+            row = conn.execute('SELECT metadata FROM metadata WHERE path = ?', (old_key,)).fetchone()
+            if row is None:
+                return False
+            metadata = json.loads(row[0])
+            if 'file_name' in metadata:
+                metadata['file_name'] = Path(new_path).name
+            conn.execute(
+                'INSERT OR REPLACE INTO metadata (path, size, mtime_ns, metadata, updated) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (new_key, st.st_size, st.st_mtime_ns,
+                 json.dumps(metadata, separators=(',', ':')), time.time())
+            )
+            conn.execute('DELETE FROM metadata WHERE path = ?', (old_key,))
+            conn.execute('UPDATE OR REPLACE fingerprints SET path = ?, size = ?, mtime_ns = ? '
+                         'WHERE path = ?', (new_key, st.st_size, st.st_mtime_ns, old_key))
+        for listener in self._listeners:
+            try:
+                listener(new_key, metadata)
+            except Exception as e:
+                print(f"⚠️  Metadata cache listener failed: {e}")
+        return True
+
+    def get_or_extract(self, file_path, extractor):
+        """
+        Return cached metadata, calling ``extractor(file_path)`` on a miss.
+
+        Returns:
+            tuple: (metadata dict, True if served from cache)
+        """
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return extractor(file_path), False
+
+        metadata = self.get(file_path, st)
+        if metadata is not None:
+            return metadata, True
+
+        metadata = extractor(file_path)
+        self.put(file_path, metadata, st)
+        return metadata, False
+
+    def invalidate(self, file_path):
+        """Drop the cached entry for a file."""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM metadata WHERE path = ?', (self.key_for(file_path),))
+
+    def path_for_key(self, key):
+        """Return the filesystem path a cache key refers to (the inverse of key_for)."""
+        path = Path(key)
+        if not path.is_absolute():
+            for prefix, folder in self.roots:
+                if key.startswith(prefix):
+                    return folder / key[len(prefix):]
+        return path
+
+    def prune(self):
+        """Remove entries for files that no longer exist. Returns the number removed."""
+        conn = self._connect()
+        keys = [row[0] for row in conn.execute('SELECT path FROM metadata')]
+        missing = [(key,) for key in keys if not self.path_for_key(key).is_file()]
+        fingerprint_keys = [row[0] for row in conn.execute('SELECT path FROM fingerprints')]
+        orphans = [(key,) for key in fingerprint_keys if not self.path_for_key(key).is_file()]
+        with conn:
+            conn.executemany('DELETE FROM metadata WHERE path = ?', missing)
+            conn.executemany('DELETE FROM fingerprints WHERE path = ?', orphans)
+        return len(missing)
+
+    def clear(self):
+        """Remove every cached entry."""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM metadata')
+            conn.execute('DELETE FROM fingerprints')
+
+    def vacuum(self):
+        """Compact the database file."""
+        self._connect().execute('VACUUM')
+
+    def rebuild(self, extractor, file_paths, progress=None):
+        """
+        Clear the cache and re-extract metadata for the given files.
+
+        Args:
+            extractor (callable): Function taking a path and returning metadata
+            file_paths (list): Files to index
+            progress (callable): Optional callback ``progress(done, total)``
+
+        Returns:
+            int: Number of files indexed
+        """
+        self.clear()
+        total = len(file_paths)
+        for index, file_path in enumerate(file_paths, 1):
+            self.put(file_path, extractor(str(file_path)))
+            if progress:
+                progress(index, total)
+        return total
+
+    def hit_counts(self):
+        """Return (hits, misses) since this instance was created."""
+        with self._stats_lock:
+            return self._hits, self._misses
+
+    def stats(self):
+        """Return entry count, database size and hit/miss counters."""
+        count = self._connect().execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+        try:
+            db_size = self.db_path.stat().st_size
+        except OSError:
+            db_size = 0
+        with self._stats_lock:
+            hits, misses = self._hits, self._misses
+        return {
+            'entries': count,
+            'db_size': db_size,
+            'hits': hits,
+            'misses': misses,
+        }
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Manage the persistent metadata cache')
+    parser.add_argument('command', choices=['stats', 'prune', 'vacuum', 'rebuild', 'clear'],
+                        help='stats: show cache size; prune: drop entries for deleted files; '
+                             'vacuum: prune and compact; rebuild: re-extract the whole music folder; '
+                             'clear: delete every entry')
+    parser.add_argument('--cache', default=str(DEFAULT_CACHE_PATH), help='Cache database path')
+    parser.add_argument('--root', default=str(DEFAULT_MUSIC_ROOT), help='Music folder')
+    parser.add_argument('--library-root', action='append', default=[], metavar='NAME=PATH',
+                        help='Library root the server was started with (repeatable; replaces --root)')
+    args = parser.parse_args()
+
+    roots = None
+    if args.library_root:
+        from library_roots import parse_roots
+        try:
+            roots = {root.name: root.path for root in parse_roots(args.library_root)}
+        except ValueError as e:
+            parser.error(str(e))
+    cache = MetadataCache(args.cache, root=args.root, roots=roots)
+
+    if args.command == 'stats':
+        stats = cache.stats()
+        print(f"Entries:  {stats['entries']}")
+        print(f"DB size:  {stats['db_size'] / 1024:.1f} KB")
+    elif args.command == 'prune':
+        print(f"Removed {cache.prune()} stale entries")
+    elif args.command == 'vacuum':
+        removed = cache.prune()
+        cache.vacuum()
+        print(f"Removed {removed} stale entries and compacted {cache.db_path}")
+    elif args.command == 'clear':
+        cache.clear()
+        cache.vacuum()
+        print("Cache cleared")
+    elif args.command == 'rebuild':
+        from functools import partial
+        from metadata_reader import extract_metadata, AUDIO_EXTENSIONS
+        from art_store import ArtStore
+        folders = [Path(folder) for folder in roots.values()] if roots else [Path(args.root)]
+        for root in folders:
+            if not root.is_dir():
+                print(f"Error: music folder not found: {root}")
+                sys.exit(1)
+        files = sorted(p for root in folders for p in root.rglob('*')
+                       if p.is_file() and p.suffix.lower() in AUDIO_EXTENSIONS)
+
+        def report(done, total):
+            if done % 100 == 0 or done == total:
+                print(f"\r  {done}/{total} files", end='', flush=True)
+
+        extractor = partial(extract_metadata, art_store=ArtStore())
+        count = cache.rebuild(extractor, files, progress=report)
+        cache.vacuum()
+        print(f"\nRebuilt cache with {count} files")
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0
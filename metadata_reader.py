@@ -11,182 +11,412 @@ import json
 import argparse
 import base64
 import io
+import time
+import queue
+import threading
+import importlib.util
+from functools import partial
 from pathlib import Path
 
+# mutagen (with its format modules) and Pillow make up most of this module's
+# import time, so they are imported by load_libraries() on first use. Servers
+# that only need the constants and filename parsing start without them.
+MUTAGEN_AVAILABLE = importlib.util.find_spec('mutagen') is not None
+PIL_AVAILABLE = importlib.util.find_spec('PIL') is not None
+if not MUTAGEN_AVAILABLE:
+    print("Warning: mutagen library not found. Metadata extraction will be disabled.")
+    print("Install it with: pip install mutagen")
+elif not PIL_AVAILABLE:
+    print("Warning: PIL/Pillow not found. Album art resizing will be disabled.")
+    print("Install it with: pip install Pillow")
+
+File = ID3NoHeaderError = APIC = MP3 = FLAC = Picture = MP4 = OggVorbis = ASF = Image = None
+_libraries_loaded = False
+_libraries_lock = threading.Lock()
+
+
+def load_libraries():
+    """Import mutagen and Pillow if they have not been imported yet (thread-safe)."""
+    global File, ID3NoHeaderError, APIC, MP3, FLAC, Picture, MP4, OggVorbis, ASF, Image
+    global _libraries_loaded
+    if _libraries_loaded:
+        return
+    with _libraries_lock:
+        if _libraries_loaded:
+            return
+        if MUTAGEN_AVAILABLE:
+            from mutagen import File
+            from mutagen.id3 import ID3NoHeaderError, APIC
+            from mutagen.mp3 import MP3
+            from mutagen.flac import FLAC, Picture
+            from mutagen.mp4 import MP4
+            from mutagen.oggvorbis import OggVorbis
+            from mutagen.asf import ASF
+        if PIL_AVAILABLE:
+            from PIL import Image
+        _libraries_loaded = True
+
 try:
-    from mutagen import File
-    from mutagen.id3 import ID3NoHeaderError, APIC
-    from mutagen.mp3 import MP3
-    from mutagen.flac import FLAC, Picture
-    from mutagen.mp4 import MP4
-    from mutagen.oggvorbis import OggVorbis
-    from mutagen.asf import ASF
-    from PIL import Image
-    PIL_AVAILABLE = True
-    MUTAGEN_AVAILABLE = True
-except ImportError as e:
-    if "PIL" in str(e):
-        PIL_AVAILABLE = False
-        print("Warning: PIL/Pillow not found. Album art resizing will be disabled.")
-        print("Install it with: pip install Pillow")
-    else:
-        print("Warning: mutagen library not found. Metadata extraction will be disabled.")
-        print("Install it with: pip install mutagen")
-        # Set all mutagen imports to None to prevent errors
-        File = None
-        ID3NoHeaderError = None
-        APIC = None
-        MP3 = None
-        FLAC = None
-        Picture = None
-        MP4 = None
-        OggVorbis = None
-        ASF = None
-        MUTAGEN_AVAILABLE = False
-
-
-def extract_metadata(file_path):
+    from metrics import stage
+except ImportError:
+    # Running outside the project: stage timing becomes a no-op
+    from contextlib import nullcontext as stage
+
+try:
+    import fast_tags
+except ImportError:
+    # Running outside the project: every file is read with mutagen
+    fast_tags = None
+
+try:
+    import path_metadata
+except ImportError:
+    # Running outside the project: untagged files are titled after their filename
+    path_metadata = None
+
+# Audio file extensions recognised by the music folder scanner
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma'}
+
+# Seconds a single file may take in a batch before it is reported as failed
+DEFAULT_FILE_TIMEOUT = 20.0
+
+
+def extract_metadata(file_path, art_store=None, include_art=True, fast=True):
     """
     Extract metadata from an audio file using mutagen.
     
+    MP3, FLAC and M4A files are first read with the fast tag reader, which
+    gives the same result without loading mutagen; files it does not handle
+    fall back to mutagen.
+    
     Args:
         file_path (str): Path to the audio file
+        art_store (ArtStore): If given, album art is saved there and only its
+            content hash is returned as ``album_art_hash``; otherwise the art is
+            embedded as base64 in ``album_art``
+        include_art (bool): Set to False to skip album art entirely
+        fast (bool): Set to False to always use mutagen
         
     Returns:
         dict: Extracted metadata or None if extraction fails
     """
+    if (fast and fast_tags is not None
+            and os.path.splitext(file_path)[1].lower() in fast_tags.FAST_EXTENSIONS):
+        try:
+            with stage('fast_tags'):
+                parsed = fast_tags.read_file(file_path, pictures=include_art)
+        except (fast_tags.Unsupported, OSError):
+            parsed = None  # read it with mutagen below
+        if parsed is not None:
+            try:
+                return _build_metadata(parsed.tags if parsed.tags else None, parsed.length,
+                                       lambda: parsed.picture, os.path.getsize(file_path),
+                                       os.path.basename(file_path), art_store, include_art)
+            except Exception as e:
+                return {"error": f"Error reading metadata: {str(e)}"}
+    
     # Check if mutagen is available
     if not MUTAGEN_AVAILABLE:
         return {"error": "mutagen library not available. Install with: pip install mutagen"}
+    load_libraries()
     
     try:
         if not os.path.exists(file_path):
             return {"error": f"File not found: {file_path}"}
         
         # Load the audio file
-        audio_file = File(file_path)
+        with stage('mutagen_load'):
+            audio_file = File(file_path)
         
         if audio_file is None:
             return {"error": f"Unsupported file format: {file_path}"}
         
-        # Initialize metadata dictionary
-        metadata = {
-            "title": None,
-            "artist": None,
-            "album": None,
-            "year": None,
-            "genre": None,
-            "track_number": None,
-            "duration": None,
-            "file_size": os.path.getsize(file_path),
-            "file_name": os.path.basename(file_path),
-            "album_art": None,
-            "album_art_mime": None
-        }
-        
-        # Extract common metadata fields
-        if hasattr(audio_file, 'tags') and audio_file.tags:
-            tags = audio_file.tags
-            
-            # Title
-            if 'TIT2' in tags:  # ID3v2
-                metadata["title"] = str(tags['TIT2'][0])
-            elif 'TITLE' in tags:  # Vorbis, FLAC
-                metadata["title"] = str(tags['TITLE'][0])
-            elif '\xa9nam' in tags:  # MP4
-                metadata["title"] = str(tags['\xa9nam'][0])
-            elif 'Title' in tags:  # ASF
-                metadata["title"] = str(tags['Title'][0])
-            
-            # Artist
-            if 'TPE1' in tags:  # ID3v2
-                metadata["artist"] = str(tags['TPE1'][0])
-            elif 'ARTIST' in tags:  # Vorbis, FLAC
-                metadata["artist"] = str(tags['ARTIST'][0])
-            elif '\xa9ART' in tags:  # MP4
-                metadata["artist"] = str(tags['\xa9ART'][0])
-            elif 'Author' in tags:  # ASF
-                metadata["artist"] = str(tags['Author'][0])
-            
-            # Album
-            if 'TALB' in tags:  # ID3v2
-                metadata["album"] = str(tags['TALB'][0])
-            elif 'ALBUM' in tags:  # Vorbis, FLAC
-                metadata["album"] = str(tags['ALBUM'][0])
-            elif '\xa9alb' in tags:  # MP4
-                metadata["album"] = str(tags['\xa9alb'][0])
-            elif 'WM/AlbumTitle' in tags:  # ASF
-                metadata["album"] = str(tags['WM/AlbumTitle'][0])
-            
-            # Year
-            if 'TDRC' in tags:  # ID3v2.4
-                metadata["year"] = str(tags['TDRC'][0])
-            elif 'TYER' in tags:  # ID3v2.3
-                metadata["year"] = str(tags['TYER'][0])
-            elif 'DATE' in tags:  # Vorbis, FLAC
-                metadata["year"] = str(tags['DATE'][0])
-            elif '\xa9day' in tags:  # MP4
-                metadata["year"] = str(tags['\xa9day'][0])
-            elif 'WM/Year' in tags:  # ASF
-                metadata["year"] = str(tags['WM/Year'][0])
-            
-            # Genre
-            if 'TCON' in tags:  # ID3v2
-                genre = str(tags['TCON'][0])
-                # Remove ID3v1 genre numbers if present
-                if genre.startswith('(') and ')' in genre:
-                    genre = genre.split(')', 1)[1]
-                metadata["genre"] = genre
-            elif 'GENRE' in tags:  # Vorbis, FLAC
-                metadata["genre"] = str(tags['GENRE'][0])
-            elif '\xa9gen' in tags:  # MP4
-                metadata["genre"] = str(tags['\xa9gen'][0])
-            elif 'WM/Genre' in tags:  # ASF
-                metadata["genre"] = str(tags['WM/Genre'][0])
-            
-            # Track number
-            if 'TRCK' in tags:  # ID3v2
-                track = str(tags['TRCK'][0])
-                if '/' in track:
-                    track = track.split('/')[0]
-                metadata["track_number"] = track
-            elif 'TRACKNUMBER' in tags:  # Vorbis, FLAC
-                track = str(tags['TRACKNUMBER'][0])
-                if '/' in track:
-                    track = track.split('/')[0]
-                metadata["track_number"] = track
-            elif 'trkn' in tags:  # MP4
-                metadata["track_number"] = str(tags['trkn'][0][0])
-        
-        # Extract album art
-        album_art_data = extract_album_art(audio_file)
-        if album_art_data:
-            metadata["album_art"] = album_art_data["data"]
-            metadata["album_art_mime"] = album_art_data["mime"]
+        return _metadata_from_audio_file(audio_file, os.path.getsize(file_path),
+                                         os.path.basename(file_path), art_store, include_art)
         
-        # Get duration
-        if hasattr(audio_file, 'info') and audio_file.info:
-            metadata["duration"] = round(audio_file.info.length, 2)
+    except Exception as e:
+        return {"error": f"Error reading metadata: {str(e)}"}
+
+
+class _LeadingBytesFile:
+    """
+    Read-only file object over the leading bytes of a larger file.
+    
+    It reports ``size`` as its length, so mutagen's size-based estimates
+    (such as the duration of a CBR MP3 without a Xing header) match the full
+    file. Reads past the bytes actually received return nothing.
+    """
+
+    def __init__(self, data, size, name):
+        self._data = data
+        self._size = max(size, len(data))
+        self._pos = 0
+        self.name = name
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = self._size - self._pos
+        chunk = self._data[self._pos:self._pos + n]
+        self._pos += n
+        return bytes(chunk)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._size
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+class _NamedFile:
+    """Wraps a file object with a ``name``; mutagen uses it to help identify the format."""
+
+    def __init__(self, fileobj, name):
+        self._fileobj = fileobj
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._fileobj, attr)
+
+
+def extract_metadata_from_fileobj(fileobj, filename, file_size=None, art_store=None):
+    """
+    Extract metadata from an open, seekable file object (e.g. an upload buffer).
+    
+    Args:
+        fileobj: Binary file object positioned anywhere
+        filename (str): Original filename, used for format detection and fallback
+        file_size (int): Size to report; defaults to the size of the file object
+        art_store (ArtStore): See extract_metadata
         
-        # Clean up None values
-        metadata = {k: v for k, v in metadata.items() if v is not None}
+    Returns:
+        dict: Extracted metadata, or a dict with an 'error' key
+    """
+    if not MUTAGEN_AVAILABLE:
+        return {"error": "mutagen library not available. Install with: pip install mutagen"}
+    load_libraries()
+    
+    try:
+        fileobj.seek(0, 2)
+        if file_size is None:
+            file_size = fileobj.tell()
+        fileobj.seek(0)
+        
+        with stage('mutagen_load'):
+            audio_file = File(_NamedFile(fileobj, os.path.basename(filename)))
+        if audio_file is None:
+            return {"error": f"Unsupported file format: {filename}"}
         
-        return metadata
+        return _metadata_from_audio_file(audio_file, file_size, os.path.basename(filename), art_store)
         
     except Exception as e:
         return {"error": f"Error reading metadata: {str(e)}"}
 
 
-def extract_album_art(audio_file):
+def extract_metadata_from_header(data, filename, file_size, art_store=None):
+    """
+    Extract metadata from only the leading bytes of a file, entirely in memory.
+    
+    ``data`` must contain the whole tag region: the ID3v2 tag plus the first
+    MPEG frames, all FLAC metadata blocks, or an MP4 file up to the end of
+    its ``moov`` box.
+    
+    Args:
+        data (bytes): Leading bytes of the file
+        filename (str): Original filename
+        file_size (int): Size of the complete file
+        art_store (ArtStore): See extract_metadata
+        
+    Returns:
+        dict: Extracted metadata, or a dict with an 'error' key
+    """
+    # MP3 durations may be estimated from the file size; other formats must
+    # not look past the data we have (MP4 walks every top-level box).
+    reported_size = file_size if filename.lower().endswith('.mp3') else len(data)
+    fileobj = _LeadingBytesFile(data, reported_size, os.path.basename(filename))
+    return extract_metadata_from_fileobj(fileobj, filename, file_size=file_size, art_store=art_store)
+
+
+class _TagLookup:
+    """
+    Membership tests over any mutagen tag container.
+    
+    Vorbis comment dicts raise ValueError for keys that are not valid
+    comment names (such as the MP4 '\\xa9alb' atoms), which would otherwise
+    abort extraction for FLAC and Ogg files missing a field.
+    """
+    
+    def __init__(self, tags):
+        self._tags = tags
+    
+    def __contains__(self, key):
+        try:
+            return key in self._tags
+        except ValueError:
+            return False
+    
+    def __getitem__(self, key):
+        return self._tags[key]
+
+
+def _metadata_from_audio_file(audio_file, file_size, file_name, art_store=None, include_art=True):
+    """Build the metadata dictionary from a loaded mutagen file."""
+    tags = None
+    if hasattr(audio_file, 'tags') and audio_file.tags:
+        tags = _TagLookup(audio_file.tags)
+    length = None
+    if hasattr(audio_file, 'info') and audio_file.info:
+        length = audio_file.info.length
+    return _build_metadata(tags, length, partial(extract_album_art_data, audio_file),
+                           file_size, file_name, art_store, include_art)
+
+
+def _build_metadata(tags, length, read_picture, file_size, file_name, art_store=None,
+                    include_art=True):
     """
-    Extract album art from an audio file.
+    Build the metadata dictionary from tags, shared by mutagen and the fast tag reader.
+    
+    Args:
+        tags: Tag mapping (None if the file has no tags)
+        length (float): Duration in seconds, or None
+        read_picture (callable): Returns the cover as (bytes, mime) or None
+        file_size (int): Size to report
+        file_name (str): Name to report
+        art_store (ArtStore): See extract_metadata
+        include_art (bool): See extract_metadata
+        
+    Returns:
+        dict: Extracted metadata
+    """
+    # Initialize metadata dictionary
+    metadata = {
+        "title": None,
+        "artist": None,
+        "album": None,
+        "year": None,
+        "genre": None,
+        "track_number": None,
+        "duration": None,
+        "file_size": file_size,
+        "file_name": file_name,
+        "album_art": None,
+        "album_art_mime": None,
+        "album_art_hash": None
+    }
+    
+    # Extract common metadata fields
+    if tags is not None:
+        # Title
+        if 'TIT2' in tags:  # ID3v2
+            metadata["title"] = str(tags['TIT2'][0])
+        elif 'TITLE' in tags:  # Vorbis, FLAC
+            metadata["title"] = str(tags['TITLE'][0])
+        elif '\xa9nam' in tags:  # MP4
+            metadata["title"] = str(tags['\xa9nam'][0])
+        elif 'Title' in tags:  # ASF
+            metadata["title"] = str(tags['Title'][0])
+        
+        # Artist
+        if 'TPE1' in tags:  # ID3v2
+            metadata["artist"] = str(tags['TPE1'][0])
+        elif 'ARTIST' in tags:  # Vorbis, FLAC
+            metadata["artist"] = str(tags['ARTIST'][0])
+        elif '\xa9ART' in tags:  # MP4
+            metadata["artist"] = str(tags['\xa9ART'][0])
+        elif 'Author' in tags:  # ASF
+            metadata["artist"] = str(tags['Author'][0])
+        
+        # Album
+        if 'TALB' in tags:  # ID3v2
+            metadata["album"] = str(tags['TALB'][0])
+        elif 'ALBUM' in tags:  # Vorbis, FLAC
+            metadata["album"] = str(tags['ALBUM'][0])
+        elif '\xa9alb' in tags:  # MP4
+            metadata["album"] = str(tags['\xa9alb'][0])
+        elif 'WM/AlbumTitle' in tags:  # ASF
+            metadata["album"] = str(tags['WM/AlbumTitle'][0])
+        
+        # Year
+        if 'TDRC' in tags:  # ID3v2.4
+            metadata["year"] = str(tags['TDRC'][0])
+        elif 'TYER' in tags:  # ID3v2.3
+            metadata["year"] = str(tags['TYER'][0])
+        elif 'DATE' in tags:  # Vorbis, FLAC
+            metadata["year"] = str(tags['DATE'][0])
+        elif '\xa9day' in tags:  # MP4
+            metadata["year"] = str(tags['\xa9day'][0])
+        elif 'WM/Year' in tags:  # ASF
+            metadata["year"] = str(tags['WM/Year'][0])
+        
+        # Genre
+        if 'TCON' in tags:  # ID3v2
+            genre = str(tags['TCON'][0])
+            # Remove ID3v1 genre numbers if present
+            if genre.startswith('(') and ')' in genre:
+                genre = genre.split(')', 1)[1]
+            metadata["genre"] = genre
+        elif 'GENRE' in tags:  # Vorbis, FLAC
+            metadata["genre"] = str(tags['GENRE'][0])
+        elif '\xa9gen' in tags:  # MP4
+            metadata["genre"] = str(tags['\xa9gen'][0])
+        elif 'WM/Genre' in tags:  # ASF
+            metadata["genre"] = str(tags['WM/Genre'][0])
+        
+        # Track number
+        if 'TRCK' in tags:  # ID3v2
+            track = str(tags['TRCK'][0])
+            if '/' in track:
+                track = track.split('/')[0]
+            metadata["track_number"] = track
+        elif 'TRACKNUMBER' in tags:  # Vorbis, FLAC
+            track = str(tags['TRACKNUMBER'][0])
+            if '/' in track:
+                track = track.split('/')[0]
+            metadata["track_number"] = track
+        elif 'trkn' in tags:  # MP4
+            metadata["track_number"] = str(tags['trkn'][0][0])
+    
+    # Extract album art
+    if not include_art:
+        pass
+    else:
+        with stage('art_extract'):
+            picture = read_picture()
+        if not picture:
+            pass
+        elif art_store is not None:
+            with stage('art_store'):
+                metadata["album_art_hash"] = art_store.put(picture[0], picture[1])
+        else:
+            album_art_data = _encode_album_art(picture)
+            metadata["album_art"] = album_art_data["data"]
+            metadata["album_art_mime"] = album_art_data["mime"]
+    
+    # Get duration
+    if length is not None:
+        metadata["duration"] = round(length, 2)
+    
+    # Clean up None values
+    metadata = {k: v for k, v in metadata.items() if v is not None}
+    
+    return metadata
+
+
+def extract_album_art_data(audio_file):
+    """
+    Extract the raw embedded cover image from an audio file.
     
     Args:
         audio_file: Mutagen audio file object
         
     Returns:
-        dict: Album art data with 'data' (base64) and 'mime' fields, or None
+        tuple: (image bytes, mime type) as stored in the tags, or None
     """
+    load_libraries()
     try:
         if not hasattr(audio_file, 'tags') or not audio_file.tags:
             return None
@@ -216,8 +446,12 @@ def extract_album_art(audio_file):
                         break
         
         elif isinstance(audio_file, FLAC):
-            # FLAC with Vorbis comments
-            if 'METADATA_BLOCK_PICTURE' in tags:
+            # FLAC picture blocks, or a picture stored in the Vorbis comments
+            if audio_file.pictures:
+                picture = audio_file.pictures[0]
+                album_art_data = picture.data
+                mime_type = picture.mime
+            elif 'METADATA_BLOCK_PICTURE' in tags:
                 # FLAC can have multiple pictures, get the first one
                 picture_data = tags['METADATA_BLOCK_PICTURE'][0]
                 picture = Picture(base64.b64decode(picture_data))
@@ -229,8 +463,9 @@ def extract_album_art(audio_file):
             if 'covr' in tags:
                 # MP4 can have multiple covers, get the first one
                 cover_data = tags['covr'][0]
-                album_art_data = cover_data
-                mime_type = 'image/jpeg'  # MP4 covers are usually JPEG
+                album_art_data = bytes(cover_data)
+                # MP4 covers are usually JPEG
+                mime_type = 'image/png' if cover_data.imageformat == cover_data.FORMAT_PNG else 'image/jpeg'
         
         elif isinstance(audio_file, OggVorbis):
             # OGG Vorbis files
@@ -247,35 +482,7 @@ def extract_album_art(audio_file):
                 pass
         
         if album_art_data:
-            # Resize image if PIL is available
-            if PIL_AVAILABLE:
-                try:
-                    # Convert bytes to PIL Image
-                    image = Image.open(io.BytesIO(album_art_data))
-                    
-                    # Resize to reasonable size (300x300 max)
-                    max_size = 300
-                    if image.width > max_size or image.height > max_size:
-                        image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-                    
-                    # Convert back to bytes
-                    output = io.BytesIO()
-                    if mime_type == 'image/png':
-                        image.save(output, format='PNG')
-                    else:
-                        image.save(output, format='JPEG', quality=85)
-                    
-                    album_art_data = output.getvalue()
-                except Exception as e:
-                    pass  # Use original image data if resize fails
-            
-            # Convert to base64 for web transmission
-            base64_data = base64.b64encode(album_art_data).decode('utf-8')
-            
-            return {
-                "data": base64_data,
-                "mime": mime_type or "image/jpeg"
-            }
+            return album_art_data, mime_type or "image/jpeg"
         
         return None
         
@@ -283,83 +490,518 @@ def extract_album_art(audio_file):
         return None
 
 
+def resize_album_art(album_art_data, mime_type, max_size=300):
+    """
+    Shrink cover image bytes to fit within ``max_size`` x ``max_size``.
+    
+    Args:
+        album_art_data (bytes): Source image
+        mime_type (str): MIME type of the source (PNG stays PNG, all else JPEG)
+        max_size (int): Longest edge in pixels
+        
+    Returns:
+        bytes: Re-encoded image, or the original bytes if PIL is unavailable
+        or cannot decode it
+    """
+    if not PIL_AVAILABLE:
+        return album_art_data
+    load_libraries()
+    try:
+        # Convert bytes to PIL Image
+        image = Image.open(io.BytesIO(album_art_data))
+        
+        if image.width > max_size or image.height > max_size:
+            image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+        
+        # Convert back to bytes
+        output = io.BytesIO()
+        if mime_type == 'image/png':
+            image.save(output, format='PNG')
+        else:
+            image.save(output, format='JPEG', quality=85)
+        
+        return output.getvalue()
+    except Exception:
+        return album_art_data  # Use original image data if resize fails
+
+
+def extract_album_art(audio_file):
+    """
+    Extract album art from an audio file, resized for web display.
+    
+    Args:
+        audio_file: Mutagen audio file object
+        
+    Returns:
+        dict: Album art data with 'data' (base64) and 'mime' fields, or None
+    """
+    with stage('art_extract'):
+        picture = extract_album_art_data(audio_file)
+    if not picture:
+        return None
+    return _encode_album_art(picture)
+
+
+def _encode_album_art(picture):
+    """Resize an (image bytes, mime type) pair and encode it as base64."""
+    album_art_data, mime_type = picture
+    with stage('art_resize'):
+        album_art_data = resize_album_art(album_art_data, mime_type)
+    
+    # Convert to base64 for web transmission
+    with stage('base64'):
+        base64_data = base64.b64encode(album_art_data).decode('utf-8')
+    
+    return {
+        "data": base64_data,
+        "mime": mime_type
+    }
+
+
+def _extract_for_pool(file_path, extract_kwargs):
+    """Process-pool entry point; must stay at module level so it can be pickled."""
+    return extract_metadata(file_path, **extract_kwargs)
+
+
+def iter_metadata_parallel(file_paths, jobs=None, timeout=DEFAULT_FILE_TIMEOUT, extract_kwargs=None):
+    """
+    Extract metadata for many files on a process pool, yielding results as they complete.
+
+    Only ``jobs`` files are handed to the pool at a time, so every submitted
+    file starts almost immediately and its timeout measures its own parse
+    time. A file that exceeds the timeout is reported as an error and the
+    pool is restarted, since a stuck worker cannot be cancelled on its own;
+    the other in-flight files are resubmitted.
+
+    Args:
+        file_paths (list): Paths of the audio files to read
+        jobs (int): Number of worker processes (default: CPU count)
+        timeout (float): Per-file time limit in seconds
+        extract_kwargs (dict): Extra keyword arguments for extract_metadata
+
+    Yields:
+        tuple: (file_path, metadata) in completion order
+    """
+    import multiprocessing
+
+    pending = list(reversed(file_paths))
+    if not pending:
+        return
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(pending)))
+    extract_kwargs = extract_kwargs or {}
+    # spawn rather than fork: the server calling us is multi-threaded
+    context = multiprocessing.get_context('spawn')
+    results = queue.Queue()
+    in_flight = {}  # file_path -> deadline
+    generation = 0
+    pool = context.Pool(jobs)
+
+    def submit(file_path):
+        gen = generation
+        in_flight[file_path] = time.monotonic() + timeout
+        pool.apply_async(
+            _extract_for_pool, (file_path, extract_kwargs),
+            callback=lambda metadata: results.put((gen, file_path, metadata)),
+            error_callback=lambda exc: results.put(
+                (gen, file_path, {"error": f"Error reading metadata: {exc}", "transient": True}))
+        )
+
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < jobs:
+                submit(pending.pop())
+
+            wait = max(0.0, min(in_flight.values()) - time.monotonic())
+            try:
+                gen, file_path, metadata = results.get(timeout=wait)
+                if gen == generation and file_path in in_flight:
+                    del in_flight[file_path]
+                    yield file_path, metadata
+                continue
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            expired = [path for path, deadline in in_flight.items() if deadline <= now]
+            for file_path in expired:
+                del in_flight[file_path]
+                yield file_path, {"error": f"Timed out after {timeout:g}s reading metadata",
+                                  "transient": True}
+
+            if expired:
+                pool.terminate()
+                pool = context.Pool(jobs)
+                generation += 1
+                pending.extend(in_flight)
+                in_flight.clear()
+    finally:
+        pool.terminate()
+
+
 def parse_filename_metadata(filename):
     """
     Fallback method to extract metadata from filename.
     
+    Also accepts a path below the music folder, whose folders then supply
+    artist, album and year (see path_metadata.py).
+    
     Args:
-        filename (str): The filename to parse
+        filename (str): The filename (or ``/``-separated relative path) to parse
         
     Returns:
-        dict: Parsed metadata from filename
+        dict: Parsed metadata, with a 'confidence' score between 0 and 1
     """
-    # Remove file extension
-    name_without_ext = os.path.splitext(filename)[0]
-    
-    # Common patterns
-    patterns = [
-        # "Artist - Song Title"
-        r'^(.+?)\s*-\s*(.+)$',
-        # "Artist - Album - Song Title"
-        r'^(.+?)\s*-\s*(.+?)\s*-\s*(.+)$',
-        # "Artist - Song Title (Year)"
-        r'^(.+?)\s*-\s*(.+?)\s*\((\d{4})\)$',
-        # "Artist - Album - Song Title (Year)"
-        r'^(.+?)\s*-\s*(.+?)\s*-\s*(.+?)\s*\((\d{4})\)$',
-        # "Artist - Song Title [Year]"
-        r'^(.+?)\s*-\s*(.+?)\s*\[(\d{4})\]$',
-        # "Artist_Song_Title"
-        r'^(.+?)_(.+)$',
-    ]
-    
-    import re
+    if path_metadata is None:
+        return {"title": os.path.splitext(os.path.basename(filename))[0]}
+    return path_metadata.infer_path_metadata(filename)
+
+
+# Columns written by the CLI's CSV output (album art is only available as NDJSON)
+CSV_FIELDS = ['path', 'title', 'artist', 'album', 'year', 'genre', 'track_number',
+              'duration', 'file_size', 'album_art_mime', 'error']
+
+
+def find_audio_files(patterns):
+    """
+    Expand files, directories and glob patterns into a sorted list of audio files.
     
+    Directories are searched recursively; glob patterns support ``**``.
+    
+    Args:
+        patterns (list): Paths or glob patterns
+        
+    Returns:
+        list: Unique audio file paths, sorted
+    """
+    import glob
+    
+    found = set()
     for pattern in patterns:
-        match = re.match(pattern, name_without_ext)
-        if match:
-            groups = match.groups()
-            metadata = {}
-            
-            if len(groups) == 2:
-                metadata["artist"] = groups[0].strip()
-                metadata["title"] = groups[1].strip()
-            elif len(groups) == 3:
-                if re.search(r'\d{4}', groups[2]):
-                    # Has year
-                    metadata["artist"] = groups[0].strip()
-                    metadata["title"] = groups[1].strip()
-                    metadata["year"] = groups[2].strip()
-                else:
-                    # Has album
-                    metadata["artist"] = groups[0].strip()
-                    metadata["album"] = groups[1].strip()
-                    metadata["title"] = groups[2].strip()
-            elif len(groups) == 4:
-                metadata["artist"] = groups[0].strip()
-                metadata["album"] = groups[1].strip()
-                metadata["title"] = groups[2].strip()
-                metadata["year"] = groups[3].strip()
-            
-            return metadata
+        if os.path.isdir(pattern):
+            candidates = (str(p) for p in Path(pattern).rglob('*'))
+        elif glob.has_magic(pattern):
+            candidates = glob.iglob(pattern, recursive=True)
+        else:
+            candidates = [pattern]
+        for candidate in candidates:
+            if os.path.splitext(candidate)[1].lower() in AUDIO_EXTENSIONS and os.path.isfile(candidate):
+                found.add(os.path.normpath(candidate))
+    return sorted(found)
+
+
+def _open_cache(cache_path):
+    """Open the shared metadata cache and art store; returns (None, None) if unavailable."""
+    try:
+        from metadata_cache import MetadataCache, DEFAULT_CACHE_PATH
+        from art_store import ArtStore
+        return MetadataCache(cache_path or DEFAULT_CACHE_PATH), ArtStore()
+    except Exception as e:
+        print(f"Warning: metadata cache unavailable ({e}), reading files directly", file=sys.stderr)
+        return None, None
+
+
+def _inline_cached_art(metadata, art_store):
+    """Cached entries reference album art by hash; inline it as base64 for output."""
+    art_hash = metadata.pop('album_art_hash', None)
+    if art_hash:
+        album_art_data = art_store.read_base64(art_hash)
+        if album_art_data:
+            metadata["album_art"] = album_art_data["data"]
+            metadata["album_art_mime"] = album_art_data["mime"]
+    return metadata
+
+
+def _read_completed_paths(output_path, output_format):
+    """
+    Return the paths already present in a partially written output file.
+    
+    A trailing partial line left by an interruption is cut off so that
+    appending continues from the last complete record.
+    """
+    if not os.path.exists(output_path):
+        return set()
+    
+    with open(output_path, 'rb+') as f:
+        data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        if len(complete) != len(data):
+            f.truncate(len(complete))
+    
+    lines = complete.decode('utf-8').splitlines()
+    if output_format == 'csv':
+        import csv
+        return {row['path'] for row in csv.DictReader(lines) if row.get('path')}
     
-    return {"title": name_without_ext}
+    completed = set()
+    for line in lines:
+        try:
+            completed.add(json.loads(line)['path'])
+        except (ValueError, KeyError, TypeError):
+            continue
+    return completed
+
+
+class _ProgressReporter:
+    """Prints files done, throughput and ETA to stderr, at most a few times per second."""
+    
+    def __init__(self, total, enabled=True):
+        self.total = total
+        self.done = 0
+        self.enabled = enabled and total > 0
+        self.start = time.monotonic()
+        self.last_print = 0.0
+    
+    def update(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        if self.enabled and (now - self.last_print >= 0.25 or self.done == self.total):
+            self.last_print = now
+            elapsed = max(now - self.start, 1e-9)
+            rate = self.done / elapsed
+            eta = (self.total - self.done) / rate if rate else 0
+            print(f"\r  {self.done}/{self.total} files  {rate:.1f} files/s  ETA {eta:.0f}s   ",
+                  end='', file=sys.stderr, flush=True)
+    
+    def finish(self):
+        elapsed = time.monotonic() - self.start
+        if self.enabled:
+            print(file=sys.stderr)
+        print(f"Processed {self.done} files in {elapsed:.1f}s "
+              f"({self.done / max(elapsed, 1e-9):.1f} files/s)", file=sys.stderr)
+
+
+def run_batch(args):
+    """Extract metadata for many files in parallel and write NDJSON or CSV as results arrive."""
+    files = find_audio_files(args.paths)
+    if not files:
+        print("No audio files found", file=sys.stderr)
+        sys.exit(1)
+    
+    if args.resume and args.output:
+        completed = _read_completed_paths(args.output, args.format)
+        if completed:
+            print(f"Resuming: {len(completed)} files already in {args.output}", file=sys.stderr)
+        files = [f for f in files if f not in completed]
+    
+    output_exists = bool(args.output) and os.path.exists(args.output) and os.path.getsize(args.output) > 0
+    # Snapshots are written in one go once every file is done
+    snapshot_records = [] if args.format == 'snapshot' else None
+    if snapshot_records is not None:
+        out = None
+    elif args.output:
+        out = open(args.output, 'a' if args.resume else 'w', encoding='utf-8', newline='')
+    else:
+        out = sys.stdout
+    
+    writer = None
+    if args.format == 'csv':
+        import csv
+        writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        if not (args.resume and output_exists):
+            writer.writeheader()
+    
+    def write(file_path, metadata):
+        if 'error' in metadata and args.fallback:
+            filename = os.path.basename(file_path)
+            metadata = {**parse_filename_metadata(filename), "file_name": filename}
+        metadata.pop('transient', None)
+        if snapshot_records is not None:
+            st = os.stat(file_path)
+            snapshot_records.append((Path(file_path).as_posix(), st.st_size, st.st_mtime_ns, metadata))
+            return
+        record = {"path": file_path, **metadata}
+        if writer is not None:
+            writer.writerow(record)
+        else:
+            out.write(json.dumps(record, separators=(',', ':')) + '\n')
+        out.flush()
+    
+    cache, art_store = (None, None) if args.no_cache else _open_cache(args.cache)
+    progress = _ProgressReporter(len(files), enabled=not args.quiet)
+    
+    try:
+        # Cached files are written straight away; only the rest go to the pool
+        missing = []
+        for file_path in files:
+            metadata = cache.get(file_path) if cache is not None else None
+            if metadata is None:
+                missing.append(file_path)
+                continue
+            if args.no_art:
+                for key in ('album_art_hash', 'album_art', 'album_art_mime'):
+                    metadata.pop(key, None)
+            else:
+                _inline_cached_art(metadata, art_store)
+            write(file_path, metadata)
+            progress.update()
+        
+        extract_kwargs = {'include_art': not args.no_art, 'fast': not args.no_fast_path}
+        # Results without art would leave the shared cache incomplete
+        store_results = cache is not None and not args.no_art
+        if store_results:
+            extract_kwargs['art_store'] = art_store
+        
+        for file_path, metadata in iter_metadata_parallel(missing, jobs=args.jobs,
+                                                          timeout=args.timeout,
+                                                          extract_kwargs=extract_kwargs):
+            if store_results and not metadata.get('transient'):
+                cache.put(file_path, metadata)
+            if store_results:
+                metadata = _inline_cached_art(dict(metadata), art_store)
+            write(file_path, metadata)
+            progress.update()
+    except KeyboardInterrupt:
+        print("\nInterrupted; rerun with --resume to continue", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if out is not None and out is not sys.stdout:
+            out.close()
+    
+    progress.finish()
+    if snapshot_records is not None:
+        from library_snapshot import write_snapshot
+        count = write_snapshot(args.output, snapshot_records, root=Path.cwd())
+        print(f"Wrote {count} tracks to {args.output}", file=sys.stderr)
+
+
+def _snapshot_rows(snapshot, pattern):
+    """Rows of a snapshot matching a path, folder or glob pattern."""
+    import glob
+    import fnmatch
+    
+    key = pattern
+    if os.path.isabs(key) and snapshot.root:
+        try:
+            key = os.path.relpath(key, snapshot.root)
+        except ValueError:
+            pass
+    key = Path(key).as_posix().strip('/')
+    if glob.has_magic(key):
+        return [row for row in snapshot if fnmatch.fnmatchcase(snapshot.path(row), key)]
+    row = snapshot.find(key)
+    if row >= 0:
+        return [row]
+    return snapshot.select(folder=key) if key not in ('', '.') else list(snapshot)
+
+
+def run_snapshot_query(args):
+    """Answer from a memory-mapped library snapshot: a summary for one file, else NDJSON or CSV."""
+    from library_snapshot import LibrarySnapshot, SnapshotError
+    
+    try:
+        snapshot = LibrarySnapshot(args.snapshot)
+    except (OSError, SnapshotError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    with snapshot:
+        rows = []
+        for pattern in args.paths:
+            rows.extend(_snapshot_rows(snapshot, pattern))
+        
+        if args.format == 'snapshot':
+            from library_snapshot import write_snapshot
+            count = write_snapshot(args.output, [(snapshot.path(row), *snapshot.stat(row),
+                                                  snapshot.metadata(row)) for row in rows],
+                                   root=snapshot.root)
+            print(f"Wrote {count} tracks to {args.output}", file=sys.stderr)
+            return
+        
+        records = []
+        for row in rows:
+            track = snapshot.track(row)
+            if 'title' not in track and 'artist' not in track and args.fallback:
+                track.update(parse_filename_metadata(track['file_name']))
+            records.append(track)
+    
+    if not records:
+        print("No matching tracks in the snapshot", file=sys.stderr)
+        sys.exit(1)
+    
+    if len(args.paths) == 1 and len(records) == 1 and not args.output and args.format == 'ndjson':
+        if args.json:
+            print(json.dumps(records[0], indent=2))
+        else:
+            print("Metadata from snapshot:")
+            for key, value in records[0].items():
+                print(f"  {key}: {value}")
+        return
+    
+    out = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'csv':
+            import csv
+            writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+        else:
+            for record in records:
+                out.write(json.dumps(record, separators=(',', ':')) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
 
 
 def main():
     """Main function for command-line usage."""
-    parser = argparse.ArgumentParser(description='Extract metadata from audio files')
-    parser.add_argument('file', help='Audio file to analyze')
+    parser = argparse.ArgumentParser(
+        description='Extract metadata from audio files. Give one file for a readable summary, '
+                    'or directories / glob patterns for parallel NDJSON or CSV output.')
+    parser.add_argument('paths', nargs='+', metavar='path',
+                        help='Audio file, directory or glob pattern (e.g. "music/**/*.flac")')
     parser.add_argument('--json', action='store_true', help='Output as JSON')
     parser.add_argument('--fallback', action='store_true', help='Use filename parsing as fallback')
+    parser.add_argument('--cache', help='Metadata cache database (default: .cache/metadata.sqlite3)')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-read the file, bypassing the cache')
+    parser.add_argument('--no-fast-path', action='store_true',
+                        help='Read every file with mutagen instead of the fast tag reader')
+    batch = parser.add_argument_group('directory mode')
+    batch.add_argument('-j', '--jobs', type=int, default=None,
+                       help='Worker processes (default: CPU count)')
+    batch.add_argument('--format', choices=['ndjson', 'csv', 'snapshot'], default='ndjson',
+                       help='Output format (default: ndjson); snapshot writes a memory-mappable '
+                            'library snapshot (see library_snapshot.py) to --output')
+    batch.add_argument('-o', '--output', help='Write results to this file instead of stdout')
+    batch.add_argument('--resume', action='store_true',
+                       help='Skip files already present in --output and append the rest')
+    batch.add_argument('--no-art', action='store_true', help='Skip album art extraction')
+    batch.add_argument('--timeout', type=float, default=DEFAULT_FILE_TIMEOUT,
+                       help=f'Seconds allowed per file (default: {DEFAULT_FILE_TIMEOUT:g})')
+    batch.add_argument('-q', '--quiet', action='store_true', help='Hide the progress line')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='Look paths up in a library snapshot instead of reading the files; '
+                             'paths are relative to the music folder and may be folders or globs')
     
     args = parser.parse_args()
     
-    # Extract metadata
-    metadata = extract_metadata(args.file)
+    if args.resume and not args.output:
+        parser.error('--resume requires --output')
+    if args.format == 'snapshot' and (not args.output or args.resume):
+        parser.error('--format snapshot requires --output and cannot --resume')
+    
+    if args.snapshot:
+        run_snapshot_query(args)
+        return
+    
+    if len(args.paths) > 1 or args.output or not os.path.isfile(args.paths[0]):
+        run_batch(args)
+        return
+    
+    file_path = args.paths[0]
+    
+    # Extract metadata, reusing the server's persistent cache when possible
+    cache, art_store = (None, None) if args.no_cache else _open_cache(args.cache)
+    if cache is not None and not args.no_art:
+        metadata, _ = cache.get_or_extract(file_path, partial(extract_metadata, art_store=art_store,
+                                                              fast=not args.no_fast_path))
+        metadata = _inline_cached_art(metadata, art_store)
+    else:
+        metadata = extract_metadata(file_path, include_art=not args.no_art, fast=not args.no_fast_path)
     
     # If extraction failed and fallback is enabled, try filename parsing
     if 'error' in metadata and args.fallback:
-        filename = os.path.basename(args.file)
+        filename = os.path.basename(file_path)
         filename_metadata = parse_filename_metadata(filename)
         metadata = {**filename_metadata, "file_name": filename}
     
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Path Metadata Inference
+Infers title, artist, album, year and track number of untagged files from their
+file name and the folders above it, with a confidence score:
+
+    Artist/Album/01 - Title.mp3              artist and album from the folders
+    Artist/2003 - Album/CD2/05. Title.flac   year from the album folder, disc folder skipped
+    Artist - Album/01 Title.m4a              one folder holding both names
+    Artist - Album - Title (2003).mp3        everything from the file name
+    Artist - Title.mp3                       the classic fallback
+
+All patterns are compiled once and tried from the most specific to the most
+generic. Folder names are parsed once per directory, so a whole listing is
+labelled in one pass (``infer_batch``) at a few microseconds per file.
+
+``confidence`` (0-1) adds up the evidence behind a result: a bare title scores
+0.25, ``Artist - Title`` 0.55 and an ``Artist/Album/NN - Title`` rip 0.8, more
+when the file name and the folders agree on the artist.
+
+Can be run directly to show what is inferred for some paths.
+"""
+
+import re
+import sys
+import json
+import argparse
+from collections import namedtuple
+
+# Evidence weights in hundredths, summed into 'confidence' (capped at 1.0)
+CONFIDENCE_TITLE = 25
+CONFIDENCE_ARTIST = 30          # "Artist - Title" with a spaced dash
+CONFIDENCE_ARTIST_LOOSE = 15    # bare dash or underscore, or a lone folder
+CONFIDENCE_ARTIST_FOLDER = 25   # artist folder above the album folder
+CONFIDENCE_ALBUM = 15
+CONFIDENCE_TRACK = 15
+CONFIDENCE_AGREE = 10           # file name and folder name the same artist
+
+# Parsed directories kept by a shared PathInference
+DEFAULT_FOLDER_CACHE = 50000
+
+# Folder names that say nothing about the music inside them
+GENERIC_FOLDERS = frozenset((
+    'music', 'my music', 'mp3', 'mp3s', 'flac', 'audio', 'songs', 'tracks', 'library',
+    'downloads', 'download', 'misc', 'various', 'unsorted', 'unknown', 'new', 'incoming',
+    'itunes', 'itunes media', 'media', 'albums', 'singles', 'other',
+))
+
+# "1-05 Title", "05. Title", "05 - Title", "05_Title", "05) Title"
+_TRACK_RE = re.compile(r'(?:\d{1,2}[-.](?=\d))?(?P<track>\d{1,3})(?P<sep>\s*[-._)]\s*|\s+)(?P<rest>\S.*)')
+# "Title (2003)", "Title [2003]"
+_YEAR_SUFFIX_RE = re.compile(r'(?P<rest>.*?\S)\s*[(\[](?P<year>(?:19|20)\d{2})[)\]]')
+# "2003 - Album", "[2003] Album", "(2003) Album"
+_YEAR_PREFIX_RE = re.compile(r'[(\[]?(?P<year>(?:19|20)\d{2})[)\]]?(?:\s*[-.]\s*|\s+)(?P<rest>\S.*)')
+_YEAR_RE = re.compile(r'(?:19|20)\d{2}')
+_NUMBER_RE = re.compile(r'\d{1,3}')
+_SPACED_DASH_RE = re.compile(r'\s+[-–—]\s+|\s*_-_\s*')
+_DASH_RE = re.compile(r'\s*-\s*')
+_DISC_RE = re.compile(r'(?:cd|dis[ck])\s*[-_.]?\s*(?P<disc>\d{1,2})', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
+Folder = namedtuple('Folder', 'artist album year ambiguous')
+Folder.__doc__ = """What the folders above a file say; ``ambiguous`` marks a lone folder
+that may name either the album or the artist."""
+
+_NO_FOLDER = Folder(None, None, None, False)
+
+ParsedName = namedtuple('ParsedName', 'title artist album year track_number loose')
+
+
+def _clean(text):
+    if '_' in text or '  ' in text or '\t' in text:
+        return _SPACES_RE.sub(' ', text.replace('_', ' ')).strip()
+    return text.strip()
+
+
+def _same(a, b):
+    return a is not None and b is not None and a.casefold() == b.casefold()
+
+
+def parse_folder(name):
+    """
+    Parse one album folder name.
+
+    Returns:
+        tuple: (artist or None, album, year or None)
+    """
+    year = None
+    match = _YEAR_SUFFIX_RE.fullmatch(name) or _YEAR_PREFIX_RE.fullmatch(name)
+    if match:
+        year, name = match.group('year'), match.group('rest')
+    parts = [part for part in _SPACED_DASH_RE.split(name) if part]
+    artist = None
+    if len(parts) >= 2:
+        # "Artist - Album", "Artist - 2003 - Album"
+        if year is None and len(parts) >= 3 and _YEAR_RE.fullmatch(parts[1]):
+            year = parts.pop(1)
+        artist, name = parts[0], ' - '.join(parts[1:])
+    return (_clean(artist) if artist else None), _clean(name), year
+
+
+def parse_folders(dirs):
+    """
+    Parse the folders above a file (outermost first) into a Folder.
+
+    A trailing disc folder (``CD2``, ``Disc 1``) is skipped; the next folder up
+    is the album and the one above it the artist.
+    """
+    dirs = [d for d in dirs if d and d.casefold() not in GENERIC_FOLDERS]
+    if dirs and _DISC_RE.fullmatch(dirs[-1]):
+        dirs.pop()
+    if not dirs:
+        return _NO_FOLDER
+    artist, album, year = parse_folder(dirs[-1])
+    if len(dirs) >= 2:
+        parent = _clean(dirs[-2])
+        if artist is None or _same(artist, parent):
+            artist = parent
+        return Folder(artist, album, year, False)
+    return Folder(artist, album, year, artist is None and year is None)
+
+
+def parse_name(stem, in_folder=False):
+    """
+    Parse a file name without its extension.
+
+    Args:
+        stem (str): File name without extension
+        in_folder (bool): The file sits in an album folder, which makes a
+            number followed by a plain space a track number ("05 Title")
+
+    Returns:
+        ParsedName: Title and whatever else the name holds (None otherwise);
+        ``loose`` is set if the artist came from a bare dash or underscore
+    """
+    name = stem.strip()
+    artist = album = year = track = None
+    loose = False
+
+    if name[:1].isdigit():
+        match = _TRACK_RE.fullmatch(name)
+        # "50 Cent - Title" is an artist; "05 Title" and "05 Artist - Title" are tracks
+        if match and (match.group('sep').strip() or name[0] == '0'
+                      or (in_folder and not _SPACED_DASH_RE.search(match.group('rest')))):
+            track = str(int(match.group('track')))
+            name = match.group('rest')
+    if name[-1:] in ')]':
+        match = _YEAR_SUFFIX_RE.fullmatch(name)
+        if match:
+            year, name = match.group('year'), match.group('rest')
+
+    if '-' in name or '–' in name or '—' in name:
+        parts = [part for part in _SPACED_DASH_RE.split(name) if part.strip()]
+        if len(parts) == 1 and '-' in name:
+            parts = [part for part in _DASH_RE.split(name) if part]
+            loose = True
+    elif '_' in name and ' ' not in name and not in_folder:
+        parts = name.split('_', 1)
+        loose = True
+    else:
+        parts = [name]
+    if not parts:
+        parts = [name]
+    # "Artist - 05 - Title", "Artist - Album - 05 - Title": a bare number just
+    # before the title is the track
+    if len(parts) >= 3 and track is None and _NUMBER_RE.fullmatch(parts[-2].strip()):
+        track = str(int(parts.pop(-2)))
+
+    if len(parts) == 1:
+        title = _clean(parts[0])
+        loose = False
+    elif len(parts) == 2:
+        artist, title = _clean(parts[0]), _clean(parts[1])
+    else:
+        artist, album = _clean(parts[0]), _clean(parts[1])
+        title = ' - '.join(_clean(part) for part in parts[2:])
+    if not title:
+        title = _clean(stem) or stem
+    return ParsedName(title, artist or None, album or None, year, track, loose)
+
+
+class PathInference:
+    """
+    Infers metadata from library paths, parsing each directory only once.
+
+    Args:
+        root_depth (int): Leading path components that are not part of the
+            collection's own layout (library root names)
+        folder_cache (int): Parsed directories to keep; the cache is cleared
+            when it grows beyond this
+    """
+
+    def __init__(self, root_depth=0, folder_cache=DEFAULT_FOLDER_CACHE):
+        self.root_depth = root_depth
+        self.folder_cache = folder_cache
+        self._folders = {}
+
+    def _folder(self, directory):
+        folder = self._folders.get(directory)
+        if folder is None:
+            dirs = directory.split('/')[self.root_depth:] if directory else []
+            folder = parse_folders(dirs)
+            if len(self._folders) >= self.folder_cache:
+                self._folders.clear()
+            self._folders[directory] = folder
+        return folder
+
+    def infer(self, path):
+        """
+        Infer metadata for one ``/``-separated library path (or a bare file name).
+
+        Returns:
+            dict: 'title' always, 'artist', 'album', 'year' and 'track_number'
+            when found, and 'confidence'
+        """
+        directory, _, filename = path.rpartition('/')
+        stem, dot, _ = filename.rpartition('.')
+        if not stem:
+            stem = filename
+        folder = self._folders.get(directory) or self._folder(directory)
+        name = parse_name(stem, in_folder=folder.album is not None)
+
+        confidence = CONFIDENCE_TITLE
+        artist, album, track = name.artist, name.album, name.track_number
+        if artist is not None:
+            confidence += CONFIDENCE_ARTIST_LOOSE if name.loose else CONFIDENCE_ARTIST
+
+        folder_artist, folder_album = folder.artist, folder.album
+        if folder.ambiguous and track is None and artist is None:
+            # A lone folder of unnumbered files is more likely the artist's
+            folder_artist, folder_album = folder_album, None
+        if folder_artist is not None:
+            if artist is None:
+                artist = folder_artist
+                confidence += (CONFIDENCE_ARTIST_LOOSE if folder.ambiguous
+                               else CONFIDENCE_ARTIST_FOLDER)
+            elif _same(artist, folder_artist):
+                confidence += CONFIDENCE_AGREE
+        if album is None:
+            album = folder_album
+
+        result = {'title': name.title}
+        if artist is not None:
+            result['artist'] = artist
+        if album is not None:
+            result['album'] = album
+            confidence += CONFIDENCE_ALBUM
+        year = name.year or folder.year
+        if year is not None:
+            result['year'] = year
+        if track is not None:
+            result['track_number'] = track
+            confidence += CONFIDENCE_TRACK
+        result['confidence'] = min(confidence, 100) / 100
+        return result
+
+    def infer_many(self, paths):
+        """Infer metadata for a whole listing; returns one dict per path, in order."""
+        infer = self.infer
+        return [infer(path) for path in paths]
+
+
+_shared = {}
+
+
+def infer_path_metadata(path, root_depth=0):
+    """
+    Infer metadata for one library path, reusing folders parsed by earlier calls.
+
+    Args:
+        path (str): ``/``-separated path below the library root, or a file name
+        root_depth (int): Leading components to ignore (library root names)
+
+    Returns:
+        dict: See PathInference.infer()
+    """
+    inference = _shared.get(root_depth)
+    if inference is None:
+        inference = _shared.setdefault(root_depth, PathInference(root_depth))
+    return inference.infer(path)
+
+
+def infer_batch(paths, root_depth=0):
+    """
+    Infer metadata for a whole listing in one pass.
+
+    Args:
+        paths (iterable): ``/``-separated paths below the library root
+        root_depth (int): Leading components to ignore (library root names)
+
+    Returns:
+        list: One metadata dict per path, in order
+    """
+    return PathInference(root_depth).infer_many(paths)
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Infer track metadata from file and folder names')
+    parser.add_argument('paths', nargs='*', help='Paths below the library root (default: read lines from stdin)')
+    parser.add_argument('--root-depth', type=int, default=0,
+                        help='Leading path components to ignore, e.g. 1 for library root names')
+    args = parser.parse_args()
+
+    paths = args.paths or [line.rstrip('\n') for line in sys.stdin if line.strip()]
+    for path, metadata in zip(paths, infer_batch(paths, args.root_depth)):
+        print(json.dumps({'path': path, **metadata}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
+
+
+# Version: v5.2.0
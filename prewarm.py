@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Metadata Pre-warming
+Background ingestion of the music folder: new and changed files are found through the
+library index, and their metadata, album-art thumbnails and (for WAV) waveform peaks
+are computed ahead of time on low-priority worker processes and stored in the
+metadata cache, art store and peaks cache.
+
+Files a client is waiting for jump to the front of the queue, and one worker slot is
+kept free of background work so such requests start immediately.
+"""
+
+import os
+import time
+import heapq
+import queue
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+
+from metadata_reader import extract_metadata, DEFAULT_FILE_TIMEOUT
+from art_store import ART_SIZES
+
+PRIORITY_ON_DEMAND = 0
+PRIORITY_CHANGED = 5      # files the index reported as added or modified
+PRIORITY_BACKFILL = 10    # files found missing from the cache at startup
+
+DEFAULT_PREWARM_JOBS = 1
+NICE_INCREMENT = 10
+BUSY_POLL_INTERVAL = 0.5
+RATE_WINDOW = 60.0        # seconds of completions used for the rate and ETA
+
+
+def _lower_priority():
+    """Pool initializer: run background extraction below the server's priority."""
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(NICE_INCREMENT)
+        except OSError:
+            pass
+
+
+def _warm_file(file_path, art_store, art_sizes, peaks_cache=None):
+    """Worker entry point: extract metadata, render every thumbnail size and WAV peaks."""
+    metadata = extract_metadata(file_path, art_store=art_store)
+    digest = metadata.get('album_art_hash') if art_store is not None else None
+    if digest:
+        for size in art_sizes:
+            art_store.get(digest, size)
+    if peaks_cache is not None and file_path.lower().endswith('.wav'):
+        try:
+            peaks_cache.get(file_path)
+        except (OSError, ValueError):
+            pass  # not a decodable WAV; /api/peaks reports the error when asked
+    return metadata
+
+
+class _Waiter:
+    __slots__ = ('event', 'result')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class MetadataWarmer:
+    """
+    Keeps the metadata cache and art thumbnails ahead of client requests.
+
+    Args:
+        index (LibraryIndex): Index of the music folder; its change events feed the queue
+        cache (MetadataCache): Where results are stored
+        art_store (ArtStore): Where cover images and thumbnails are stored
+        jobs (int): Worker processes used for background work
+        timeout (float): Per-file time limit in seconds
+        is_busy (callable): Optional; background dispatch pauses while it returns True
+        art_sizes (tuple): Thumbnail sizes to pre-render
+        peaks_cache (PeaksCache): Optional; waveform peaks of WAV files are computed too
+    """
+
+    def __init__(self, index, cache, art_store, jobs=DEFAULT_PREWARM_JOBS,
+                 timeout=DEFAULT_FILE_TIMEOUT, is_busy=None, art_sizes=ART_SIZES,
+                 peaks_cache=None):
+        self.index = index
+        self.cache = cache
+        self.art_store = art_store
+        self.jobs = max(1, int(jobs))
+        self.timeout = timeout
+        self.is_busy = is_busy
+        self.art_sizes = tuple(art_sizes)
+        self.peaks_cache = peaks_cache
+
+        self._heap = []
+        self._queued = {}           # path -> heap entry [priority, seq, path, live]
+        self._seq = itertools.count()
+        self._in_flight = {}        # path -> (deadline, priority)
+        self._waiters = {}          # path -> _Waiter
+        self._lock = threading.Lock()
+        self._events = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._generation = 0
+
+        self.started = None
+        self.completed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.last_error = None
+        self._recent = deque()      # completion times within RATE_WINDOW
+
+    # ------------------------------------------------------------------ queue
+
+    def _path_for(self, rel_path):
+        return str(self.index.file_path(rel_path))
+
+    def _push(self, file_path, priority):
+        """Queue a file, or raise the priority of one already queued. Caller holds the lock."""
+        if file_path in self._in_flight:
+            return
+        entry = self._queued.get(file_path)
+        if entry is not None:
+            if entry[0] <= priority:
+                return
+            entry[3] = False
+        entry = [priority, next(self._seq), file_path, True]
+        self._queued[file_path] = entry
+        heapq.heappush(self._heap, entry)
+
+    def _pop(self, max_priority):
+        """Take the most urgent queued file with priority <= max_priority. Caller holds the lock."""
+        while self._heap:
+            entry = self._heap[0]
+            if not entry[3]:
+                heapq.heappop(self._heap)
+                continue
+            if entry[0] > max_priority:
+                return None
+            heapq.heappop(self._heap)
+            del self._queued[entry[2]]
+            return entry[2], entry[0]
+        return None
+
+    def enqueue(self, file_paths, priority=PRIORITY_CHANGED):
+        """Queue files for pre-warming."""
+        with self._lock:
+            for file_path in file_paths:
+                self._push(str(file_path), priority)
+        self._events.put(None)
+
+    def discard(self, file_paths):
+        """Forget queued files (they were removed from the library)."""
+        with self._lock:
+            for file_path in file_paths:
+                entry = self._queued.pop(str(file_path), None)
+                if entry is not None:
+                    entry[3] = False
+
+    def fetch(self, file_path, timeout=None):
+        """
+        Move a file to the front of the queue and wait for its metadata.
+
+        Returns:
+            dict: Extracted metadata, or None if it did not finish in time
+            (the caller should then extract it itself)
+        """
+        file_path = str(file_path)
+        with self._lock:
+            if self._thread is None:
+                return None
+            waiter = self._waiters.get(file_path)
+            if waiter is None:
+                waiter = self._waiters[file_path] = _Waiter()
+            self._push(file_path, PRIORITY_ON_DEMAND)
+        self._events.put(None)
+        if not waiter.event.wait(self.timeout if timeout is None else timeout):
+            return None
+        return waiter.result
+
+    def _on_library_change(self, index, changes):
+        self.enqueue([self._path_for(p) for p in changes['added'] + changes['modified']],
+                     PRIORITY_CHANGED)
+        self.discard([self._path_for(p) for p in changes['removed']])
+
+    def _backfill(self):
+        """Queue every indexed file the cache does not hold yet."""
+        missing = []
+        for entry in self.index.entries():
+            if self._stop.is_set():
+                return
+            file_path = self._path_for(entry.path)
+            if self.cache is None or not self.cache.contains(file_path):
+                missing.append(file_path)
+        self.enqueue(missing, PRIORITY_BACKFILL)
+
+    # ------------------------------------------------------------------ workers
+
+    def start(self):
+        """Start the background worker and queue everything not yet cached."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.started = time.time()
+        self.index.add_listener(self._on_library_change)
+        self._thread = threading.Thread(target=self._run, name='metadata-prewarm', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop dispatching work and terminate the worker processes."""
+        self._stop.set()
+        self._events.put(None)
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+        with self._lock:
+            waiters, self._waiters = self._waiters, {}
+        for waiter in waiters.values():
+            waiter.event.set()
+
+    def _new_pool(self):
+        # spawn rather than fork: the server is multi-threaded. One extra process
+        # is reserved for on-demand requests.
+        context = multiprocessing.get_context('spawn')
+        return context.Pool(self.jobs + 1, initializer=_lower_priority)
+
+    def _submit(self, file_path, priority):
+        generation = self._generation
+        self._in_flight[file_path] = (time.monotonic() + self.timeout, priority)
+        self._pool.apply_async(
+            _warm_file, (file_path, self.art_store, self.art_sizes, self.peaks_cache),
+            callback=lambda metadata: self._events.put((generation, file_path, metadata)),
+            error_callback=lambda exc: self._events.put(
+                (generation, file_path, {"error": f"Error reading metadata: {exc}", "transient": True}))
+        )
+
+    def _dispatch(self):
+        """Hand queued files to free worker slots."""
+        busy = bool(self.is_busy and self.is_busy())
+        while True:
+            with self._lock:
+                slots = self.jobs + 1 - len(self._in_flight)
+                if slots <= 0:
+                    return
+                # The last free slot is reserved for files a client is waiting on
+                if slots == 1 or busy:
+                    max_priority = PRIORITY_ON_DEMAND
+                else:
+                    max_priority = PRIORITY_BACKFILL
+                item = self._pop(max_priority)
+                if item is None:
+                    return
+                file_path, priority = item
+                waiter = self._waiters.get(file_path)
+
+            if self.cache is not None:
+                cached = self.cache.get(file_path) if waiter else None
+                if cached is not None or (not waiter and self.cache.contains(file_path)):
+                    self.skipped += 1
+                    self._finish(file_path, cached)
+                    continue
+            with self._lock:
+                self._submit(file_path, priority)
+
+    def _finish(self, file_path, metadata):
+        with self._lock:
+            waiter = self._waiters.pop(file_path, None)
+        if waiter is not None:
+            waiter.result = metadata
+            waiter.event.set()
+
+    def _record(self, file_path, metadata):
+        if 'error' in metadata:
+            self.failed += 1
+            self.last_error = f"{file_path}: {metadata['error']}"
+        else:
+            self.completed += 1
+        if self.cache is not None and not metadata.get('transient'):
+            self.cache.put(file_path, metadata)
+        now = time.monotonic()
+        self._recent.append(now)
+        while self._recent and self._recent[0] < now - RATE_WINDOW:
+            self._recent.popleft()
+        self._finish(file_path, metadata)
+
+    def _run(self):
+        self._pool = self._new_pool()
+        try:
+            self._backfill()
+            while not self._stop.is_set():
+                self._dispatch()
+                with self._lock:
+                    deadlines = [d for d, _ in self._in_flight.values()]
+                    queued = bool(self._queued)
+                wait = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                if queued and (wait is None or wait > BUSY_POLL_INTERVAL):
+                    # Re-check periodically: background work may be held back while busy
+                    wait = BUSY_POLL_INTERVAL
+                try:
+                    event = self._events.get(timeout=wait)
+                except queue.Empty:
+                    event = None
+                if event is not None:
+                    generation, file_path, metadata = event
+                    with self._lock:
+                        current = generation == self._generation and file_path in self._in_flight
+                        if current:
+                            del self._in_flight[file_path]
+                    if current:
+                        self._record(file_path, metadata)
+                self._expire()
+        finally:
+            self._pool.terminate()
+            self._pool = None
+
+    def _expire(self):
+        """Fail files that exceeded the timeout and restart the stuck pool."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [p for p, (deadline, _) in self._in_flight.items() if deadline <= now]
+            if not expired:
+                return
+            for file_path in expired:
+                del self._in_flight[file_path]
+            survivors = list(self._in_flight.items())
+            self._in_flight.clear()
+            self._generation += 1
+        for file_path in expired:
+            self._record(file_path, {"error": f"Timed out after {self.timeout:g}s reading metadata",
+                                     "transient": True})
+        self._pool.terminate()
+        self._pool = self._new_pool()
+        with self._lock:
+            for file_path, (_, priority) in survivors:
+                self._push(file_path, priority)
+
+    # ------------------------------------------------------------------ status
+
+    def status(self):
+        """Return queue depth, progress and throughput as a JSON-ready dict."""
+        with self._lock:
+            queued = [entry for entry in self._queued.values() if entry[3]]
+            in_flight = sorted(self._in_flight)
+            waiting = len(self._waiters)
+        on_demand = sum(1 for entry in queued if entry[0] == PRIORITY_ON_DEMAND)
+        rate = len(self._recent) / RATE_WINDOW if self._recent else 0.0
+        remaining = len(queued) + len(in_flight)
+        return {
+            'running': self._thread is not None,
+            'jobs': self.jobs,
+            'paused': bool(self.is_busy and self.is_busy()),
+            'queued': len(queued),
+            'queued_on_demand': on_demand,
+            'in_flight': in_flight,
+            'waiting_clients': waiting,
+            'completed': self.completed,
+            'failed': self.failed,
+            'skipped_cached': self.skipped,
+            'rate': round(rate, 2),
+            'eta_seconds': round(remaining / rate) if rate else None,
+            'last_error': self.last_error,
+            'started': self.started,
+        }
+
+
+# Version: v5.2.0
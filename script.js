@@ -872,6 +872,7 @@ class MusicPlayer {
                 metadata.genre = extractedMetadata.genre || null;
                 metadata.album_art = extractedMetadata.album_art || null;
                 metadata.album_art_mime = extractedMetadata.album_art_mime || null;
+                metadata.album_art_hash = extractedMetadata.album_art_hash || null;
             }
         } catch (error) {
             console.warn('Metadata extraction failed, using filename fallback:', error);
@@ -887,7 +888,8 @@ class MusicPlayer {
             url: null, // Will be set when needed
             duration: 0,
             album_art: metadata.album_art,
-            album_art_mime: metadata.album_art_mime
+            album_art_mime: metadata.album_art_mime,
+            album_art_hash: metadata.album_art_hash
         };
 
         if (addToTop) {
@@ -1438,7 +1440,7 @@ class MusicPlayer {
         } else {
             console.error('No URL available for track:', track.name);
         }
-        this.updateTrackInfo(track.name || 'Unknown Title', track.artist || 'Unknown Artist', track.album_art, track.album_art_mime);
+        this.updateTrackInfo(track.name || 'Unknown Title', track.artist || 'Unknown Artist', track.album_art, track.album_art_mime, track.album_art_hash);
         this.renderPlaylist();
         
         // Load metadata
@@ -1727,7 +1729,7 @@ class MusicPlayer {
         }
     }
 
-    updateTrackInfo(title, artist, albumArt = null, albumArtMime = null) {
+    updateTrackInfo(title, artist, albumArt = null, albumArtMime = null, albumArtHash = null) {
         this.trackTitle.textContent = title;
         this.trackArtist.textContent = artist;
         
@@ -1735,9 +1737,11 @@ class MusicPlayer {
         const albumArtElement = document.querySelector('.album-art');
         
         if (albumArtElement) {
-            if (albumArt && albumArtMime) {
-                // Show album art
-                albumArtElement.style.backgroundImage = `url(data:${albumArtMime};base64,${albumArt})`;
+            if (albumArtHash || (albumArt && albumArtMime)) {
+                // Show album art (served by hash from the art store, or inline base64)
+                albumArtElement.style.backgroundImage = albumArtHash
+                    ? `url(/api/art/${albumArtHash}?size=600)`
+                    : `url(data:${albumArtMime};base64,${albumArt})`;
                 albumArtElement.style.display = 'block';
                 albumArtElement.classList.add('has-art');
                 
@@ -2452,7 +2456,8 @@ class MusicPlayer {
                 url: null, 
                 duration: 0,
                 album_art: t.album_art,
-                album_art_mime: t.album_art_mime
+                album_art_mime: t.album_art_mime,
+                album_art_hash: t.album_art_hash
             });
         });
         this.renderPlaylist();
@@ -2836,6 +2841,18 @@ class MusicPlayer {
             // Show loading notification
             this.showNotification('Scanning music folder...', 'fa-sync');
             
+            // Prefer the batch endpoint: one streamed request for the whole library
+            const addedFromLibrary = await this.loadMusicLibraryStream();
+            if (addedFromLibrary !== null) {
+                if (addedFromLibrary === 0) {
+                    this.showNotification('No music files found in the music folder', 'fa-exclamation-triangle');
+                } else {
+                    this.showNotification(`Added ${addedFromLibrary} files from music folder`, 'fa-music');
+                }
+                this.watchLibraryEvents();
+                return;
+            }
+            
             // Try to fetch the music folder contents from the server
             const response = await fetch('/api/music-folder');
             
@@ -2870,23 +2887,8 @@ class MusicPlayer {
                             metadata = await metadataResponse.json();
                         }
                         
-                        // Create a track object with extracted metadata
-                        const track = {
-                            id: `local_${Date.now()}_${Math.random().toString(36).slice(2)}`,
-                            name: metadata.title || file.name.replace(/\.[^/.]+$/, ""), // Use extracted title or filename
-                            artist: metadata.artist || "Unknown Artist",
-                            album: metadata.album || "Local Music",
-                            year: metadata.year || "",
-                            genre: metadata.genre || "",
-                            duration: metadata.duration || 0,
-                            album_art: metadata.album_art || null,
-                            album_art_mime: metadata.album_art_mime || null,
-                            url: `/api/music-file/${encodeURIComponent(file.path)}`,
-                            isLocalFile: true
-                        };
-                        
                         // Add to playlist directly
-                        this.playlist.push(track);
+                        this.playlist.push(this.createLocalTrack(file, metadata));
                         addedCount++;
                         
                     } catch (error) {
@@ -2912,6 +2914,196 @@ class MusicPlayer {
         }
     }
 
+    // Create a track object for a file served from the music folder
+    createLocalTrack(file, metadata) {
+        return {
+            id: `local_${Date.now()}_${Math.random().toString(36).slice(2)}`,
+            name: metadata.title || file.name.replace(/\.[^/.]+$/, ""), // Use extracted title or filename
+            artist: metadata.artist || "Unknown Artist",
+            album: metadata.album || "Local Music",
+            year: metadata.year || "",
+            genre: metadata.genre || "",
+            duration: metadata.duration || 0,
+            album_art: metadata.album_art || null,
+            album_art_mime: metadata.album_art_mime || null,
+            album_art_hash: metadata.album_art_hash || null,
+            url: `/api/music-file/${encodeURIComponent(file.path)}`,
+            isLocalFile: true
+        };
+    }
+
+    // Load the whole music folder from the NDJSON batch endpoint, rendering as tracks arrive.
+    // Returns the number of tracks added, or null if the endpoint is unavailable.
+    async loadMusicLibraryStream() {
+        let response;
+        try {
+            response = await fetch('/api/music-library');
+        } catch (error) {
+            return null;
+        }
+        if (!response.ok || !response.body || typeof TextDecoder === 'undefined') {
+            return null;
+        }
+
+        const totalFiles = parseInt(response.headers.get('X-Total-Count') || '0', 10);
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffered = '';
+        let addedCount = 0;
+        let lastRender = Date.now();
+
+        const addLine = (line) => {
+            if (!line.trim()) return;
+            try {
+                const record = JSON.parse(line);
+                this.playlist.push(this.createLocalTrack(record, record.metadata || {}));
+                addedCount++;
+            } catch (error) {
+                console.error('Error adding library record:', error);
+            }
+        };
+
+        if (totalFiles > 0) {
+            this.showNotification(`Loading ${totalFiles} files...`, 'fa-music');
+        }
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffered += decoder.decode(value, { stream: true });
+            const lines = buffered.split('\n');
+            buffered = lines.pop();
+            lines.forEach(addLine);
+
+            // Render progressively, but not on every chunk
+            if (Date.now() - lastRender > 500) {
+                lastRender = Date.now();
+                this.renderPlaylist();
+                this.showNotification(`Loaded ${addedCount}/${totalFiles || '?'} files...`, 'fa-music');
+            }
+        }
+        addLine(buffered + decoder.decode());
+
+        if (addedCount > 0) {
+            this.renderPlaylist();
+            this.saveToStorage();
+        }
+        return addedCount;
+    }
+
+    // Keep music-folder tracks in sync with the server through /api/events (Server-Sent Events):
+    // added and changed files are fetched from the batch endpoint, removed ones leave the queue.
+    watchLibraryEvents() {
+        if (this.libraryEvents || typeof EventSource === 'undefined') return;
+        const source = new EventSource('/api/events');
+        this.libraryEvents = source;
+
+        source.addEventListener('hello', (event) => {
+            // Catch up with changes made while no stream was open (or the page was closed)
+            const { generation } = JSON.parse(event.data);
+            if (generation !== this.libraryGeneration) {
+                this.resyncMusicFolder();
+            }
+            this.libraryGeneration = generation;
+        });
+        source.addEventListener('reset', (event) => {
+            this.libraryGeneration = JSON.parse(event.data).generation;
+            this.resyncMusicFolder();
+        });
+        source.addEventListener('library', (event) => {
+            this.applyLibraryChanges(JSON.parse(event.data)).catch((error) => {
+                console.error('Error applying library changes:', error);
+            });
+        });
+        source.onerror = () => {
+            // Dropped streams are resumed by EventSource itself; a refused one is retried here
+            if (source.readyState === EventSource.CLOSED) {
+                this.libraryEvents = null;
+                setTimeout(() => this.watchLibraryEvents(), 30000);
+            }
+        };
+    }
+
+    // Apply one 'library' event: {added: [files], modified: [files], removed: [paths]}
+    async applyLibraryChanges(changes) {
+        const urlFor = (path) => `/api/music-file/${encodeURIComponent(path)}`;
+        const files = [...(changes.added || []), ...(changes.modified || [])];
+        const records = files.length ? await this.fetchLibraryRecords(files.map(file => file.path)) : [];
+        if (changes.generation !== undefined) {
+            this.libraryGeneration = changes.generation;
+        }
+
+        let added = 0;
+        records.forEach(record => {
+            const track = this.createLocalTrack(record, record.metadata || {});
+            const existing = this.playlist.find(t => t.url === track.url);
+            if (existing) {
+                Object.assign(existing, track, { id: existing.id });
+            } else {
+                this.playlist.push(track);
+                added++;
+            }
+        });
+
+        const removedUrls = new Set((changes.removed || []).map(urlFor));
+        const inQueue = this.currentPlaylistId === 'current';
+        let removed = 0;
+        for (let i = this.playlist.length - 1; i >= 0; i--) {
+            if (!removedUrls.has(this.playlist[i].url)) continue;
+            this.playlist.splice(i, 1);
+            removed++;
+            if (inQueue && i < this.currentTrackIndex) {
+                this.currentTrackIndex--;
+            }
+        }
+        if (inQueue && removed) {
+            this.currentTrackIndex = Math.max(0, Math.min(this.currentTrackIndex, this.playlist.length - 1));
+        }
+
+        if (records.length || removed) {
+            this.renderPlaylist();
+            this.saveToStorage();
+        }
+        if (added || removed) {
+            const parts = [];
+            if (added) parts.push(`${added} added`);
+            if (removed) parts.push(`${removed} removed`);
+            this.showNotification(`Music folder updated: ${parts.join(', ')}`, 'fa-sync');
+        }
+    }
+
+    // Fetch library records (NDJSON) for specific music-folder paths
+    async fetchLibraryRecords(paths) {
+        const response = await fetch('/api/music-library', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ paths })
+        });
+        if (!response.ok) return [];
+        const text = await response.text();
+        return text.split('\n').filter(line => line.trim()).map(line => JSON.parse(line));
+    }
+
+    // Compare the queue's music-folder tracks with a fresh listing (after missed events)
+    async resyncMusicFolder() {
+        try {
+            const response = await fetch('/api/music-folder');
+            if (!response.ok) return;
+            const files = await response.json();
+            const prefix = '/api/music-file/';
+            const listed = new Set(files.map(file => prefix + encodeURIComponent(file.path)));
+            const known = new Set(this.playlist.filter(t => t.isLocalFile).map(t => t.url));
+            await this.applyLibraryChanges({
+                added: files.filter(file => !known.has(prefix + encodeURIComponent(file.path))),
+                modified: [],
+                removed: [...known].filter(url => url && url.startsWith(prefix) && !listed.has(url))
+                    .map(url => decodeURIComponent(url.slice(prefix.length)))
+            });
+        } catch (error) {
+            console.error('Error resyncing music folder:', error);
+        }
+    }
+
     // Theme section removed
 
     // changeTheme removed; always dark
@@ -3177,6 +3369,7 @@ class MusicPlayer {
             duration: t.duration || 0,
             album_art: t.album_art,
             album_art_mime: t.album_art_mime,
+            album_art_hash: t.album_art_hash,
             url: t.isLocalFile ? t.url : null, // Preserve URL for local files
             isLocalFile: t.isLocalFile || false
         }));
@@ -3212,6 +3405,7 @@ class MusicPlayer {
                         url: t.url || null, // Restore URL for local files
                         album_art: t.album_art,
                         album_art_mime: t.album_art_mime,
+                        album_art_hash: t.album_art_hash,
                         isLocalFile: t.isLocalFile || false
                     }));
                     // Preload object URLs in background and track which are in IndexedDB
@@ -3241,6 +3435,10 @@ class MusicPlayer {
                         });
                         // Update storage status after loading
                         this.updateStorageStatus();
+                        // Follow changes to the music folder the queue was loaded from
+                        if (this.playlist.some(t => t.isLocalFile)) {
+                            this.watchLibraryEvents();
+                        }
                     }).catch(() => {});
                 }
                 
@@ -3258,7 +3456,8 @@ class MusicPlayer {
                             duration: t.duration || 0, 
                             url: null,
                             album_art: t.album_art,
-                            album_art_mime: t.album_art_mime
+                            album_art_mime: t.album_art_mime,
+                            album_art_hash: t.album_art_hash
                         }));
                         rebuilt.set(id, { name: pl.name, cover: pl.cover, tracks });
                     });
@@ -3390,13 +3589,35 @@ class MusicPlayer {
         try {
             // First try Python backend if available (for local development)
             try {
-                const response = await fetch('/extract-metadata', {
-                    method: 'POST',
-                    headers: {
-                        'X-Filename': file.name
-                    },
-                    body: file
-                });
+                // Send only the tag region when we can find it; otherwise the whole file
+                let response = null;
+                const headerLength = await this.getTagRegionLength(file);
+                if (headerLength && headerLength < file.size) {
+                    response = await fetch('/extract-metadata', {
+                        method: 'POST',
+                        headers: {
+                            'X-Filename': file.name,
+                            'X-Metadata-Mode': 'header',
+                            'X-File-Size': String(file.size)
+                        },
+                        body: file.slice(0, headerLength)
+                    });
+                    if (response.ok) {
+                        const headerMetadata = await response.clone().json();
+                        if (headerMetadata.extraction_method !== 'tags') {
+                            response = null; // Tags not found in the header; retry with the full file
+                        }
+                    }
+                }
+                if (!response || !response.ok) {
+                    response = await fetch('/extract-metadata', {
+                        method: 'POST',
+                        headers: {
+                            'X-Filename': file.name
+                        },
+                        body: file
+                    });
+                }
                 
                 if (response.ok) {
                     const metadata = await response.json();
@@ -3411,7 +3632,8 @@ class MusicPlayer {
                             duration: metadata.duration,
                             extraction_method: metadata.extraction_method,
                             album_art: metadata.album_art,
-                            album_art_mime: metadata.album_art_mime
+                            album_art_mime: metadata.album_art_mime,
+                            album_art_hash: metadata.album_art_hash
                         };
                     }
                 }
@@ -3428,6 +3650,61 @@ class MusicPlayer {
         }
     }
 
+    // Length of the leading bytes that hold a file's tags (ID3v2 plus the first MPEG frames,
+    // FLAC metadata blocks, or an MP4 up to the end of its moov box). Returns null when
+    // the tags cannot be located up front (e.g. an MP3 with only an ID3v1 tag) and the
+    // whole file must be sent.
+    async getTagRegionLength(file) {
+        try {
+            const read = async (start, length) =>
+                new Uint8Array(await file.slice(start, start + length).arrayBuffer());
+            const text = (bytes, start, end) => String.fromCharCode(...bytes.slice(start, end));
+            const uint32 = (bytes, offset) =>
+                ((bytes[offset] << 24) >>> 0) + (bytes[offset + 1] << 16) + (bytes[offset + 2] << 8) + bytes[offset + 3];
+            const head = await read(0, 16);
+            if (head.length < 12) return null;
+
+            // MP3 with ID3v2: syncsafe tag size, optional footer, then room for the Xing/LAME frame
+            if (text(head, 0, 3) === 'ID3') {
+                const tagSize = ((head[6] & 0x7f) << 21) | ((head[7] & 0x7f) << 14) | ((head[8] & 0x7f) << 7) | (head[9] & 0x7f);
+                const footer = (head[5] & 0x10) ? 10 : 0;
+                return Math.min(file.size, 10 + tagSize + footer + 64 * 1024);
+            }
+
+            // FLAC: walk metadata blocks until the one flagged as last
+            if (text(head, 0, 4) === 'fLaC') {
+                let offset = 4;
+                while (offset + 4 <= file.size) {
+                    const block = await read(offset, 4);
+                    offset += 4 + ((block[1] << 16) | (block[2] << 8) | block[3]);
+                    if (block[0] & 0x80) return Math.min(file.size, offset);
+                }
+                return null;
+            }
+
+            // MP4/M4A: walk top-level boxes; only usable when moov comes before mdat
+            if (text(head, 4, 8) === 'ftyp') {
+                let offset = 0;
+                while (offset + 8 <= file.size) {
+                    const box = await read(offset, 16);
+                    let size = uint32(box, 0);
+                    const type = text(box, 4, 8);
+                    if (size === 1) size = uint32(box, 8) * 4294967296 + uint32(box, 12);
+                    else if (size === 0) size = file.size - offset;
+                    if (type === 'moov') return Math.min(file.size, offset + size);
+                    if (type === 'mdat' || size < 8) return null;
+                    offset += size;
+                }
+                return null;
+            }
+
+            // Anything else is sent whole, such as an MP3 without ID3v2 whose ID3v1 or APE tag sits at the end
+        } catch (error) {
+            console.log('Could not locate tag region, sending whole file:', error);
+        }
+        return null;
+    }
+
     // Client-side metadata extraction using Web APIs
     async extractMetadataClientSide(file) {
         try {
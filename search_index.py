@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Library Search Index
+In-memory inverted index over track metadata (title, artist, album, genre, year and
+the words of the file path) behind /api/search. Query words match whole words, word
+prefixes (for search-as-you-type) and, from four letters on, words within one or two
+typos. Results are ranked by field, match quality and word rarity.
+
+The index follows the library index (added and removed files) and the metadata cache
+(every extraction result), so it stays current without rebuilding.
+"""
+
+import re
+import math
+import heapq
+import bisect
+import threading
+import unicodedata
+
+from metrics import stage
+
+# Relative importance of a word depending on the field it came from
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'artist': 2.5,
+    'album': 2.0,
+    'genre': 1.0,
+    'year': 1.0,
+    'path': 0.5,
+}
+
+# Match quality multipliers
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.75
+FUZZY_MATCH = 0.5
+
+MIN_FUZZY_LENGTH = 4      # shorter words only match exactly or by prefix
+MAX_PREFIX_EXPANSIONS = 200
+MAX_QUERY_TERMS = 8
+
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+# Metadata returned with each hit
+RESULT_FIELDS = ('title', 'artist', 'album', 'genre', 'year', 'duration', 'album_art_hash')
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-free words."""
+    if not text:
+        return []
+    text = str(text).lower()
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _WORD_RE.findall(text)
+
+
+def _deletes(word):
+    """Every variant of ``word`` with one character removed."""
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def max_typos(word):
+    """Edit distance tolerated for a query word of this length."""
+    if len(word) < MIN_FUZZY_LENGTH:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal string alignment distance between ``a`` and ``b`` (adjacent
+    transpositions count as one edit), or ``limit + 1`` once it exceeds ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (previous2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SearchIndex:
+    """
+    Inverted index from words to the tracks containing them.
+
+    Documents are keyed by library path. All public methods are thread-safe.
+
+    Args:
+        describe (callable): Optional ``describe(path, metadata)`` returning the
+            metadata to index; called with ``metadata=None`` for files that have
+            not been read yet (to fall back to filename parsing, for example)
+    """
+
+    def __init__(self, describe=None):
+        self.describe = describe
+        self.version = 0
+        self._docs = {}        # path -> (display fields, {word: weight})
+        self._postings = {}    # word -> {path: weight}
+        self._vocabulary = []  # sorted words, for prefix lookups
+        self._variants = {}    # one-deletion variant -> words, for typo lookups
+        self._bulk = False     # while building, the vocabulary is sorted once at the end
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+    # ------------------------------------------------------------------ updates
+
+    def _add_word(self, word, path, weight):
+        postings = self._postings.get(word)
+        if postings is None:
+            postings = self._postings[word] = {}
+            if self._bulk:
+                self._vocabulary.append(word)
+            else:
+                bisect.insort(self._vocabulary, word)
+            if len(word) >= MIN_FUZZY_LENGTH - 1:
+                for variant in _deletes(word):
+                    self._variants.setdefault(variant, set()).add(word)
+        postings[path] = weight
+
+    def _remove_word(self, word, path):
+        postings = self._postings.get(word)
+        if postings is None:
+            return
+        postings.pop(path, None)
+        if postings:
+            return
+        del self._postings[word]
+        if self._bulk:
+            self._vocabulary.remove(word)
+        else:
+            del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+        if len(word) >= MIN_FUZZY_LENGTH - 1:
+            for variant in _deletes(word):
+                words = self._variants.get(variant)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._variants[variant]
+
+    def update(self, path, metadata=None):
+        """Index (or re-index) one track from its metadata."""
+        if self.describe is not None:
+            metadata = self.describe(path, metadata)
+        metadata = metadata or {}
+        if 'error' in metadata:
+            metadata = {}
+
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            text = path if field == 'path' else metadata.get(field)
+            for word in tokenize(text):
+                if weights.get(word, 0.0) < weight:
+                    weights[word] = weight
+        fields = {field: metadata.get(field) for field in RESULT_FIELDS}
+
+        with self._lock:
+            old = self._docs.get(path)
+            if old is not None:
+                for word in old[1]:
+                    if word not in weights:
+                        self._remove_word(word, path)
+            for word, weight in weights.items():
+                self._add_word(word, path, weight)
+            self._docs[path] = (fields, weights)
+            self.version += 1
+
+    def remove(self, path):
+        """Drop a track from the index."""
+        with self._lock:
+            doc = self._docs.pop(path, None)
+            if doc is None:
+                return
+            for word in doc[1]:
+                self._remove_word(word, path)
+            self.version += 1
+
+    def build(self, library_index, cache=None):
+        """
+        Index every file in the library, using cached metadata where available.
+
+        Returns:
+            int: Number of tracks indexed
+        """
+        with stage('search_build'), self._lock:
+            paths = {entry.path for entry in library_index.entries()}
+            seen = set()
+            self._bulk = True
+            try:
+                if cache is not None:
+                    for key, metadata in cache.items():
+                        if key in paths:
+                            self.update(key, metadata)
+                            seen.add(key)
+                for path in paths - seen:
+                    self.update(path)
+            finally:
+                self._bulk = False
+                self._vocabulary.sort()
+            for path in set(self._docs) - paths:
+                self.remove(path)
+        return len(self)
+
+    def attach(self, library_index, cache=None):
+        """Keep the index current as files change and metadata is extracted."""
+        def on_library_change(index, changes):
+            for path in changes['removed']:
+                self.remove(path)
+            # Modified files keep their old entry until the new metadata is cached
+            for path in changes['added']:
+                with self._lock:
+                    known = path in self._docs
+                if not known:
+                    self.update(path)
+
+        def on_metadata(key, metadata):
+            if library_index.get(key) is not None:
+                self.update(key, metadata)
+
+        library_index.add_listener(on_library_change)
+        if cache is not None:
+            cache.add_listener(on_metadata)
+
+    # ------------------------------------------------------------------ queries
+
+    def _expand(self, term):
+        """Return ``{word: quality}`` for every indexed word matching a query word."""
+        matches = {}
+        if term in self._postings:
+            matches[term] = EXACT_MATCH
+
+        start = bisect.bisect_left(self._vocabulary, term)
+        for word in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS + 1]:
+            if not word.startswith(term):
+                break
+            if word != term:
+                # Completions close in length to the typed prefix rank higher
+                matches[word] = PREFIX_MATCH * (0.5 + 0.5 * len(term) / len(word))
+
+        limit = max_typos(term)
+        if limit:
+            candidates = set()
+            for variant in _deletes(term) | {term}:
+                candidates.update(self._variants.get(variant, ()))
+                if variant in self._postings:
+                    candidates.add(variant)
+            for word in candidates:
+                if word in matches:
+                    continue
+                distance = edit_distance(term, word, limit)
+                if distance <= limit:
+                    matches[word] = FUZZY_MATCH / distance
+        return matches
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, offset=0):
+        """
+        Find tracks matching every word of ``query``.
+
+        Args:
+            query (str): Free text
+            limit (int): Page size
+            offset (int): Number of ranked results to skip
+
+        Returns:
+            dict: 'total' matches and the requested page of 'results', each with
+            its 'path', 'score' and display fields
+        """
+        terms = list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+        with stage('search'), self._lock:
+            total_docs = len(self._docs) or 1
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for word, quality in self._expand(term).items():
+                    postings = self._postings[word]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for path, weight in postings.items():
+                        score = weight * quality * idf
+                        if score > term_scores.get(path, 0.0):
+                            term_scores[path] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {path: score + term_scores[path]
+                              for path, score in scores.items() if path in term_scores}
+                if not scores:
+                    break
+            scores = scores or {}
+
+            ranked = heapq.nsmallest(offset + limit, scores.items(),
+                                     key=lambda item: (-item[1], item[0].lower()))[offset:]
+            results = [{'path': path, 'score': round(score, 3), **self._docs[path][0]}
+                       for path, score in ranked]
+        return {
+            'query': query,
+            'total': len(scores),
+            'offset': offset,
+            'limit': limit,
+            'results': results,
+        }
+
+
+# Version: v5.2.0
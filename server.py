@@ -5,59 +5,952 @@ Run this script and open http://localhost:8000 in your browser
 """
 
 import http.server
-import socketserver
 import webbrowser
 import os
 import sys
+import io
+import html
+import select
+import socket
+import signal
 import json
+import stat
+import argparse
 import tempfile
+import threading
+import queue
+import time
 import urllib.parse
+import email.utils
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Import our metadata reader
 try:
-    from metadata_reader import extract_metadata, parse_filename_metadata
+    # mutagen and Pillow are imported on first use (see preload_libraries)
+    from metadata_reader import (extract_metadata, extract_metadata_from_fileobj,
+                                 extract_metadata_from_header, parse_filename_metadata,
+                                 iter_metadata_parallel, load_libraries, DEFAULT_FILE_TIMEOUT)
     METADATA_AVAILABLE = True
 except ImportError:
     METADATA_AVAILABLE = False
+    DEFAULT_FILE_TIMEOUT = 20.0
     print("Warning: metadata_reader.py not found. Metadata extraction will be disabled.")
 
+try:
+    from metadata_cache import MetadataCache
+except ImportError:
+    MetadataCache = None
+
+try:
+    from prewarm import MetadataWarmer, DEFAULT_PREWARM_JOBS
+except ImportError:
+    MetadataWarmer = None
+    DEFAULT_PREWARM_JOBS = 1
+
+from art_store import ArtStore, ART_SIZES, DEFAULT_ART_SIZE, is_valid_hash
+from library_index import (LibraryIndex, DEFAULT_SCAN_INTERVAL, DEFAULT_FULL_SCAN_INTERVAL,
+                           DEFAULT_SCAN_JOBS)
+from library_roots import LibraryRoots, parse_roots
+from search_index import SearchIndex, DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT
+from library_catalog import TrackCatalog, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, DEFAULT_SORT
+from waveform import PeaksCache, NUMPY_AVAILABLE, DEFAULT_BUCKETS, MAX_BUCKETS, load_numpy
+from content_hash import FingerprintIndex, DEFAULT_HASH_JOBS
+from library_snapshot import SnapshotMetadata, SnapshotWriter, open_snapshot
+from path_metadata import infer_path_metadata
+from events import (EventBus, ProgressReporter, watch_library, format_event,
+                    HEARTBEAT_INTERVAL, RETRY_MS)
+import metrics
+from metrics import stage
+from compression import (StaticCompressionCache, StreamCompressor, choose_encoding, compress,
+                         is_compressible, MIN_COMPRESS_SIZE)
+
+# Concurrency defaults (overridable from the command line)
+DEFAULT_PORT = 8000
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_DRAIN_TIMEOUT = 30.0
+
+# HTTP/1.1 keep-alive: seconds a connection may sit idle between requests and
+# requests answered on one connection before it is closed
+DEFAULT_KEEPALIVE_TIMEOUT = 5.0
+DEFAULT_KEEPALIVE_REQUESTS = 100
+# Seconds a new connection may take to start its first request, and any single
+# socket read or write may block, so a silent or stalled client cannot pin a worker
+DEFAULT_REQUEST_TIMEOUT = 30.0
+# A header-only metadata upload without any of these found no tags
+TAG_FIELDS = ('title', 'artist', 'album', 'year', 'genre', 'track_number')
+# Idle connections check this often whether their worker is needed elsewhere
+KEEPALIVE_POLL_INTERVAL = 0.25
+# Request bodies a handler left unread are discarded up to this size to keep
+# the connection usable; larger ones close it
+MAX_DISCARD_BODY = 64 * 1024
+
+# Uploads to /extract-metadata: bodies are read in chunks into a buffer that
+# stays in memory up to UPLOAD_SPOOL_SIZE and spills to a temp file beyond it
+DEFAULT_MAX_UPLOAD_MB = 512
+UPLOAD_SPOOL_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Header-only uploads (X-Metadata-Mode: header) are parsed from memory
+MAX_HEADER_UPLOAD = 32 * 1024 * 1024
+
+# Open /api/events streams check this often whether the client left or the
+# worker is needed elsewhere
+EVENT_POLL_INTERVAL = 1.0
+
+# Cached /api/music-library records written (and compressed) per write
+LIBRARY_BATCH_RECORDS = 256
+
+# Library index saved on shutdown and restored on the next start
+# (one file per root, e.g. library-index-nas.json, with --library-root)
+LIBRARY_SNAPSHOT_PATH = Path('.cache') / 'library-index.json'
+# Memory-mapped metadata of every track (see library_snapshot.py), read on the next start
+LIBRARY_METADATA_PATH = Path('.cache') / 'library.lms'
+
+# Album art is content-addressed, so a given URL never changes
+ART_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Freshness lifetimes in seconds (0 = always revalidate, answered with a cheap 304)
+DEFAULT_AUDIO_MAX_AGE = 3600
+DEFAULT_METADATA_MAX_AGE = 0
+DEFAULT_STATIC_MAX_AGE = 0
+
+# Metrics label for each route; anything else is counted as 'static'
+ENDPOINT_LABELS = (
+    ('/extract-metadata', 'extract_metadata'),
+    ('/version', 'version'),
+    ('/api/music-folder', 'music_folder'),
+    ('/api/music-file/', 'music_file'),
+    ('/api/music-metadata/', 'music_metadata'),
+    ('/api/music-library', 'music_library'),
+    ('/api/art/', 'art'),
+    ('/api/peaks/', 'peaks'),
+    ('/api/ingest', 'ingest'),
+    ('/api/duplicates', 'duplicates'),
+    ('/api/search', 'search'),
+    ('/api/tracks', 'tracks'),
+    ('/api/artists', 'artists'),
+    ('/api/albums', 'albums'),
+    ('/api/events', 'events'),
+    ('/metrics', 'metrics'),
+)
+
+REQUESTS_TOTAL = metrics.counter('liquid_music_http_requests_total',
+                                 'HTTP requests handled', ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = metrics.histogram('liquid_music_http_request_duration_seconds',
+                                    'Time to handle a request, including writing the body',
+                                    ('endpoint',))
+RESPONSE_BYTES = metrics.counter('liquid_music_http_response_bytes_total',
+                                 'Bytes written to clients, headers included', ('endpoint',))
+ACTIVE_CONNECTIONS = metrics.gauge('liquid_music_active_connections',
+                                   'Connections currently being served by a worker')
+KEEPALIVE_REQUESTS = metrics.counter('liquid_music_keepalive_requests_total',
+                                     'Requests that reused an already open connection')
+CONNECTION_CLOSES = metrics.counter('liquid_music_connection_closes_total',
+                                    'Connections closed, by reason', ('reason',))
+REQUESTS_PER_CONNECTION = metrics.histogram('liquid_music_requests_per_connection',
+                                            'Requests answered on each closed connection',
+                                            buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+REJECTED_CONNECTIONS = metrics.counter('liquid_music_rejected_connections_total',
+                                       'Connections answered with 503 because the pool was full')
+
+# Audio files served from the music folder, with the MIME type sent for each
+AUDIO_MIME_TYPES = {
+    '.mp3': 'audio/mpeg',
+    '.wav': 'audio/wav',
+    '.flac': 'audio/flac',
+    '.m4a': 'audio/mp4',
+    '.aac': 'audio/aac',
+    '.ogg': 'audio/ogg',
+    '.wma': 'audio/x-ms-wma',
+}
+AUDIO_EXTENSIONS = set(AUDIO_MIME_TYPES)
+
+
+def endpoint_label(path):
+    """Map a request path to the bounded set of endpoint names used in metrics."""
+    route = urllib.parse.urlsplit(path).path
+    for prefix, label in ENDPOINT_LABELS:
+        if route.startswith(prefix):
+            return label
+    return 'static'
+
+
+class _CountingReader:
+    """Wraps a handler's ``rfile`` and counts the bytes read through it."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def read1(self, size=-1):
+        data = self._raw.read1(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self._raw.readline(size)
+        self.bytes_read += len(data)
+        return data
+
+    def readinto(self, buffer):
+        count = self._raw.readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+    def __getattr__(self, attr):
+        return getattr(self._raw, attr)
+
+
+class _CountingWriter:
+    """Wraps a handler's ``wfile`` and counts the bytes written through it."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_written = 0
+
+    def write(self, data):
+        result = self._raw.write(data)
+        self.bytes_written += len(data)
+        return result
+
+    def __getattr__(self, attr):
+        return getattr(self._raw, attr)
+
+
+def file_etag(st, kind=''):
+    """
+    Strong ETag for a file, derived from its identity (inode, size, mtime).
+
+    ``kind`` distinguishes representations of the same file, such as its
+    bytes and its extracted metadata.
+    """
+    return f'"{kind}{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def etag_matches(header, etag):
+    """Weak comparison of an If-None-Match / If-Range header against an ETag."""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def modified_since(header, mtime):
+    """
+    Evaluate If-Modified-Since.
+
+    Returns:
+        bool: False if the resource has not changed since the given date,
+        True if it has or the header is missing or unparsable
+    """
+    if not header:
+        return True
+    try:
+        since = email.utils.parsedate_to_datetime(header)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return True
+    if since is None:
+        return True
+    return int(mtime) > since.timestamp()
+
+
+def encode_json(payload):
+    """Serialize an API response compactly as UTF-8 JSON."""
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def cache_control(max_age):
+    """Cache-Control value for a freshness lifetime in seconds."""
+    return f'public, max-age={int(max_age)}' if max_age > 0 else 'no-cache'
+
+
+def is_library_path(rel_path):
+    """True if a library path sent by a client cannot climb out of its root."""
+    path = Path(rel_path)
+    return not (path.is_absolute() or path.drive or '..' in path.parts)
+
+
+def stat_files(index, rel_paths):
+    """
+    Stat library files of one root, ``index.scan_jobs`` at a time.
+
+    Returns:
+        dict: Library path -> (filesystem path, stat result) for existing regular files
+    """
+    def lookup(rel_path):
+        file_path = index.file_path(rel_path)
+        try:
+            return file_path, file_path.stat()
+        except OSError:
+            return file_path, None
+
+    if index.scan_jobs > 1 and len(rel_paths) > 1:
+        with ThreadPoolExecutor(index.scan_jobs, thread_name_prefix='library-stat') as executor:
+            found = list(executor.map(lookup, rel_paths))
+    else:
+        found = [lookup(rel_path) for rel_path in rel_paths]
+    return {rel_path: (str(file_path), st) for rel_path, (file_path, st) in zip(rel_paths, found)
+            if st is not None and stat.S_ISREG(st.st_mode)}
+
+
+def parse_range_header(header, file_size):
+    """
+    Parse a single-range HTTP ``Range`` header.
+
+    Supports ``bytes=start-end``, open-ended ``bytes=start-`` and suffix
+    ``bytes=-length`` forms. Multi-range and malformed headers are ignored,
+    as RFC 9110 allows, so the caller serves the whole file instead.
+
+    Args:
+        header (str): Value of the Range header (may be None)
+        file_size (int): Size of the resource in bytes
+
+    Returns:
+        tuple: Inclusive (start, end) byte positions, or None to serve the whole file
+
+    Raises:
+        ValueError: If the range is well-formed but cannot be satisfied
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+
+    start_str, sep, end_str = spec.strip().partition('-')
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not sep or not (start_str or end_str):
+        return None
+    if (start_str and not start_str.isdigit()) or (end_str and not end_str.isdigit()):
+        return None
+
+    if not start_str:
+        # Suffix range: the last N bytes
+        suffix_length = int(end_str)
+        if suffix_length == 0 or file_size == 0:
+            raise ValueError("Unsatisfiable suffix range")
+        return max(0, file_size - suffix_length), file_size - 1
+
+    start = int(start_str)
+    end = int(end_str) if end_str else None
+    if end is not None and end < start:
+        return None
+    if start >= file_size:
+        raise ValueError("Range starts beyond end of file")
+    if end is None:
+        end = file_size - 1
+    return start, min(end, file_size - 1)
+
+
+class PooledHTTPServer(http.server.HTTPServer):
+    """
+    HTTP server that hands each accepted connection to a bounded thread pool.
+
+    At most ``max_workers`` connections are processed at once and at most
+    ``max_queue`` more may wait for a free worker. Connections beyond that are
+    answered immediately with ``503 Service Unavailable`` so a burst of
+    clients cannot pile up unbounded work. ``server_close()`` stops accepting
+    and waits up to ``drain_timeout`` seconds for in-flight requests (such as
+    long audio streams) to finish, then shuts down the connections still open
+    so their workers end and the process can exit.
+
+    A kept-alive connection holds its worker while idle, so idle connections
+    give their worker up as soon as another connection is waiting for one
+    (see ``needs_workers``).
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+    metadata_cache = None
+    art_store = None
+    library_index = None
+    max_upload_size = DEFAULT_MAX_UPLOAD_MB * 1024 * 1024
+    library_jobs = None  # worker processes for /api/music-library (None = CPU count)
+    file_timeout = DEFAULT_FILE_TIMEOUT
+    keepalive_timeout = DEFAULT_KEEPALIVE_TIMEOUT    # 0 closes after every response
+    keepalive_requests = DEFAULT_KEEPALIVE_REQUESTS
+    request_timeout = DEFAULT_REQUEST_TIMEOUT    # 0 lets socket reads and writes block forever
+    trace_all = False    # send Server-Timing on every response, not only on X-Trace
+    audio_max_age = DEFAULT_AUDIO_MAX_AGE
+    metadata_max_age = DEFAULT_METADATA_MAX_AGE
+    static_max_age = DEFAULT_STATIC_MAX_AGE
+    compression = True
+    static_compression = None  # StaticCompressionCache for precompressed assets
+    warmer = None              # MetadataWarmer pre-computing metadata in the background
+    search_index = None
+    catalog = None             # TrackCatalog behind /api/tracks, /api/artists, /api/albums
+    peaks_cache = None         # PeaksCache for WAV waveforms (needs numpy)
+    fingerprints = None        # FingerprintIndex relinking cached data of moved files
+    snapshot_writer = None     # SnapshotWriter keeping LIBRARY_METADATA_PATH current
+    events = None              # EventBus behind /api/events
+    library_root_depth = 0     # leading path components naming a library root (1 with --library-root)
+    max_event_streams = 0
+
+    def __init__(self, server_address, handler_class, max_workers=DEFAULT_MAX_WORKERS,
+                 max_queue=DEFAULT_MAX_QUEUE, drain_timeout=DEFAULT_DRAIN_TIMEOUT,
+                 bind_and_activate=True):
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.drain_timeout = drain_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='liquid-music-worker')
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        # The kernel accept backlog must hold a reconnect burst (idle keep-alive
+        # connections closed to free workers); connections it drops are only
+        # retried by the client's TCP stack a second later
+        self.request_queue_size = self.max_workers + self.max_queue
+        self._in_flight = 0
+        self._in_flight_lock = threading.Condition()
+        self._connections = set()   # sockets queued or being processed
+        self.aborted = False        # open connections were shut down after the drain timeout
+        self._closing = False
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+    @property
+    def in_flight(self):
+        """Number of connections currently queued or being processed."""
+        with self._in_flight_lock:
+            return self._in_flight
+
+    @property
+    def needs_workers(self):
+        """True if idle keep-alive connections should close to free their worker."""
+        with self._in_flight_lock:
+            return self._closing or self._in_flight > self.max_workers
+
+    def process_request(self, request, client_address):
+        """Queue the connection on the worker pool, or reject it if the pool is full."""
+        if not self._slots.acquire(blocking=False):
+            self._reject_request(request)
+            return
+
+        with self._in_flight_lock:
+            self._in_flight += 1
+            self._connections.add(request)
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            # Executor already shut down; we are on our way out
+            self._release_slot(request)
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            # Failures on connections cut by server_close() are expected
+            if not self.aborted:
+                self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._release_slot(request)
+
+    def _release_slot(self, request):
+        self._slots.release()
+        with self._in_flight_lock:
+            self._in_flight -= 1
+            self._connections.discard(request)
+            self._in_flight_lock.notify_all()
+
+    def _reject_request(self, request):
+        """Answer with a minimal 503 without touching the worker pool."""
+        REJECTED_CONNECTIONS.inc()
+        try:
+            request.sendall(
+                b'HTTP/1.0 503 Service Unavailable\r\n'
+                b'Retry-After: 1\r\n'
+                b'Content-Length: 0\r\n'
+                b'Connection: close\r\n\r\n'
+            )
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    def drain(self, timeout=None):
+        """
+        Wait for in-flight requests to complete.
+
+        Args:
+            timeout (float): Maximum seconds to wait, or None to wait forever
+
+        Returns:
+            bool: True if every request finished, False if the timeout expired
+        """
+        with self._in_flight_lock:
+            return self._in_flight_lock.wait_for(lambda: self._in_flight == 0, timeout)
+
+    def server_close(self):
+        """Stop listening, drain in-flight streams and release the worker pool."""
+        super().server_close()
+        with self._in_flight_lock:
+            self._closing = True
+        if not self.drain(self.drain_timeout):
+            print(f"⚠️  {self.in_flight} request(s) still running after "
+                  f"{self.drain_timeout:.0f}s, closing anyway")
+            self._abort_connections()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _abort_connections(self):
+        """Shut down every open connection so blocked reads and writes fail and workers end."""
+        with self._in_flight_lock:
+            self.aborted = True
+            connections = list(self._connections)
+        for request in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
 class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Connections are kept open between requests; every response is framed by
+    # Content-Length or chunked transfer encoding
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes: with Nagle's algorithm the body
+    # of a small response waits for the client's delayed ACK (~40 ms) on a
+    # kept-alive connection
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        # StreamRequestHandler applies this to the socket: every read and write is bounded
+        self.timeout = self.server.request_timeout or None
+        super().setup()
+        self.rfile = _CountingReader(self.rfile)
+        self.wfile = _CountingWriter(self.wfile)
+        self._status = None
+        self._deferred_headers = []
+        self._headers_sent = False
+        self._connection_header = False
+        self._body_start = None
+        self._chunked = False
+        self._requests_served = 0
+        self._close_reason = 'client'
+        ACTIVE_CONNECTIONS.inc()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            ACTIVE_CONNECTIONS.dec()
+            CONNECTION_CLOSES.inc(reason=self._close_reason)
+            if self._requests_served:
+                REQUESTS_PER_CONNECTION.observe(self._requests_served)
+
+    def handle_one_request(self):
+        """
+        Read and answer one request on a possibly reused connection.
+
+        Records the request's latency, status and bytes sent. The time a
+        connection spends idle before the request arrives is not counted.
+        """
+        if not self.wait_for_request():
+            self.close_connection = True
+            return
+
+        started = time.perf_counter()
+        written = self.wfile.bytes_written
+        self._status = None
+        self._deferred_headers = []
+        self._headers_sent = False
+        self._connection_header = False
+        self._body_start = None
+        self._chunked = False
+        metrics.start_trace()
+        try:
+            self.raw_requestline = self.rfile.readline(65537)
+            if not self.raw_requestline:
+                self.close_connection = True
+                return
+            if self._requests_served:
+                KEEPALIVE_REQUESTS.inc()
+            self._requests_served += 1
+            if len(self.raw_requestline) > 65536:
+                self.requestline = ''
+                self.request_version = ''
+                self.command = ''
+                self.send_error(414)
+                return
+            if not self.parse_request():
+                return
+            if getattr(self.server, 'aborted', False):
+                # Whatever was read before the connection was cut may be incomplete
+                self.close_connection = True
+                return
+            self._body_start = self.rfile.bytes_read
+            method = getattr(self, 'do_' + self.command, None)
+            if method is None:
+                self.send_error(501, f"Unsupported method ({self.command!r})")
+                return
+            method()
+            self.wfile.flush()
+            self.discard_request_body()
+        except TimeoutError as e:
+            self.log_error("Request timed out: %r", e)
+            self.close_connection = True
+            self._close_reason = 'error'
+        finally:
+            metrics.end_trace()
+            if self._status is not None:
+                endpoint = endpoint_label(getattr(self, 'path', ''))
+                REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+                REQUESTS_TOTAL.inc(endpoint=endpoint, method=self.command or '',
+                                   status=self._status)
+                RESPONSE_BYTES.inc(self.wfile.bytes_written - written, endpoint=endpoint)
+
+    def wait_for_request(self):
+        """
+        Wait for the next request on a connection.
+
+        A new connection may wait up to the request timeout for its first
+        request, a kept-alive one up to the keep-alive timeout; either gives its
+        worker up early when another connection is waiting for one.
+
+        Returns:
+            bool: True once request bytes are available, False if the connection
+            stayed idle past its timeout or its worker is needed for a waiting
+            connection
+        """
+        # Bytes may already be buffered (pipelining) or waiting on the socket
+        self.connection.settimeout(0)
+        try:
+            if self.rfile.peek(1):
+                return True
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+        timeout = (self.server.keepalive_timeout if self._requests_served
+                   else self.server.request_timeout or float('inf'))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._close_reason = 'idle_timeout'
+                return False
+            readable, _, _ = select.select([self.connection], [], [],
+                                           min(remaining, KEEPALIVE_POLL_INTERVAL))
+            if readable:
+                return True
+            if self.server.needs_workers:
+                self._close_reason = 'busy'
+                return False
+
+    def request_body_remaining(self):
+        """
+        Bytes of the current request body not read yet, or None if the body is
+        not delimited by Content-Length (and so cannot be skipped).
+        """
+        if self._body_start is None:
+            return 0
+        if 'Transfer-Encoding' in self.headers:
+            return None
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            return None
+        return max(0, length - (self.rfile.bytes_read - self._body_start))
+
+    def discard_request_body(self):
+        """Skip whatever the handler left of the request body so the next request can be read."""
+        if self.close_connection:
+            return
+        remaining = self.request_body_remaining()
+        if remaining is None or remaining > MAX_DISCARD_BODY:
+            self.close_connection = True
+            return
+        while remaining > 0:
+            chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                self.close_connection = True
+                return
+            remaining -= len(chunk)
+
+    def keep_alive(self):
+        """Decide whether the connection can stay open after the current response."""
+        if self.close_connection:
+            return False
+        if self.server.keepalive_timeout <= 0:
+            reason = 'disabled'
+        elif self._requests_served >= self.server.keepalive_requests:
+            reason = 'max_requests'
+        elif self.server.needs_workers:
+            reason = 'busy'
+        else:
+            remaining = self.request_body_remaining()
+            if remaining is not None and remaining <= MAX_DISCARD_BODY:
+                return True
+            reason = 'unread_body'
+        self._close_reason = reason
+        return False
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection':
+            self._connection_header = True
+        super().send_header(keyword, value)
+
+    def send_error(self, code, message=None, explain=None):
+        """
+        Send an error page framed with Content-Length.
+
+        Unlike the inherited version this does not force the connection closed,
+        so a 404 does not cost the client a new connection. An error raised after
+        the response headers went out cannot be reported; the connection is
+        closed instead so the client sees a truncated response.
+        """
+        if self._headers_sent:
+            self.close_connection = True
+            self._close_reason = 'error'
+            return
+        short_message, long_message = self.responses.get(code, ('???', '???'))
+        if message is None:
+            message = short_message
+        if explain is None:
+            explain = long_message
+        self.log_error("code %d, message %s", code, message)
+        self.send_response(code, message)
+        body = None
+        if code >= 200 and code not in (204, 205, 304):
+            body = (self.error_message_format % {
+                'code': code,
+                'message': html.escape(message, quote=False),
+                'explain': html.escape(explain, quote=False),
+            }).encode('UTF-8', 'replace')
+            self.send_header('Content-Type', self.error_content_type)
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            self.wfile.write(body)
+
+    def trace_requested(self):
+        """True if this response should carry a Server-Timing stage breakdown."""
+        if getattr(self.server, 'trace_all', False):
+            return True
+        return self.headers.get('X-Trace', '').lower() in ('1', 'true', 'yes')
+
     def end_headers(self):
         # Add CORS headers to allow file uploads
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, X-Trace')
+        self.send_header('Access-Control-Expose-Headers',
+                         'Server-Timing, X-Peaks-Buckets, X-Peaks-Sample-Rate, X-Peaks-Duration')
+        trace = metrics.current_trace()
+        if trace is not None and getattr(self, 'headers', None) is not None and self.trace_requested():
+            self.send_header('Server-Timing', trace.server_timing())
+        if self._status in (200, 304):
+            for keyword, value in self._deferred_headers:
+                self.send_header(keyword, value)
+        self._deferred_headers = []
+        if self._status is not None and not self._connection_header:
+            if not self.keep_alive():
+                self.send_header('Connection', 'close')
+            else:
+                if self.request_version == 'HTTP/1.0':
+                    self.send_header('Connection', 'keep-alive')
+                self.send_header('Keep-Alive', f'timeout={max(1, int(self.server.keepalive_timeout))}, '
+                                 f'max={self.server.keepalive_requests - self._requests_served}')
+        if self._status is not None:
+            self._headers_sent = True
         super().end_headers()
 
+    def is_fresh(self, etag, mtime=None):
+        """
+        True if the client's cached copy is current (answer with 304).
+
+        If-None-Match takes precedence; If-Modified-Since is only consulted
+        when no entity tag was sent.
+        """
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag_matches(if_none_match, etag)
+        if mtime is not None and 'If-Modified-Since' in self.headers:
+            return not modified_since(self.headers.get('If-Modified-Since'), mtime)
+        return False
+
+    def send_validators(self, etag, cache_policy, mtime=None):
+        """Send ETag, Last-Modified and Cache-Control headers."""
+        self.send_header('ETag', etag)
+        if mtime is not None:
+            self.send_header('Last-Modified', self.date_time_string(mtime))
+        self.send_header('Cache-Control', cache_policy)
+
+    def send_not_modified(self, etag, cache_policy, mtime=None):
+        """Answer 304 Not Modified with the current validators."""
+        self.send_response(304)
+        self.send_validators(etag, cache_policy, mtime)
+        self.end_headers()
+
+    def response_encoding(self, content_type, size=None):
+        """Content-Encoding to use for a body of this type and size, or None."""
+        if not getattr(self.server, 'compression', False) or not is_compressible(content_type):
+            return None
+        if size is not None and size < MIN_COMPRESS_SIZE:
+            return None
+        return choose_encoding(self.headers.get('Accept-Encoding'))
+
+    def send_body(self, body, content_type, etag=None, cache_policy=None, mtime=None):
+        """
+        Finish a response whose status line has been sent: content headers and body.
+
+        Text and JSON bodies are compressed when the client accepts it. A
+        compressed body gets a weak ETag, since its bytes differ from the
+        identity representation.
+        """
+        encoding = self.response_encoding(content_type, len(body))
+        if encoding:
+            with stage('compress'):
+                body = compress(body, encoding)
+            self.send_header('Content-Encoding', encoding)
+            if etag and not etag.startswith('W/'):
+                etag = 'W/' + etag
+        if is_compressible(content_type):
+            self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_validators(etag, cache_policy or 'no-cache', mtime)
+        self.end_headers()
+        if self.command != 'HEAD':
+            with stage('socket_write'):
+                self.wfile.write(body)
+
+    def send_head(self):
+        """
+        Serve static files with an ETag, revalidation and precompression.
+
+        Adds a strong ETag and the configured Cache-Control lifetime to the
+        inherited static file handling, and answers If-None-Match with 304.
+        Text assets are served from the on-disk compression cache when the
+        client accepts gzip or Brotli.
+        """
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and urllib.parse.urlsplit(self.path).path.endswith('/'):
+            path = os.path.join(path, 'index.html')
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is not None and stat.S_ISREG(st.st_mode):
+            etag = file_etag(st)
+            policy = cache_control(getattr(self.server, 'static_max_age', DEFAULT_STATIC_MAX_AGE))
+            if self.is_fresh(etag, st.st_mtime):
+                self.send_not_modified(etag, policy, st.st_mtime)
+                return None
+
+            content_type = self.guess_type(path)
+            encoding = self.response_encoding(content_type, st.st_size)
+            cache = getattr(self.server, 'static_compression', None)
+            compressed = cache.get(path, st, encoding) if encoding and cache is not None else None
+            if compressed is not None:
+                f = open(compressed, 'rb')
+                try:
+                    self.send_response(200)
+                    self.send_header('Content-Type', content_type)
+                    self.send_header('Content-Encoding', encoding)
+                    self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+                    self.send_header('Vary', 'Accept-Encoding')
+                    self.send_validators('W/' + etag, policy, st.st_mtime)
+                    self.end_headers()
+                    return f
+                except Exception:
+                    f.close()
+                    raise
+
+            self._deferred_headers = [('ETag', etag), ('Cache-Control', policy)]
+            if is_compressible(content_type):
+                self._deferred_headers.append(('Vary', 'Accept-Encoding'))
+        return super().send_head()
+
     def do_OPTIONS(self):
-        # Handle preflight requests
-        self.send_response(200)
+        # Handle preflight requests; browsers may reuse the answer for a day
+        self.send_response(204)
+        self.send_header('Access-Control-Max-Age', '86400')
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def do_POST(self):
         """Handle POST requests for metadata extraction."""
         if self.path == '/extract-metadata':
             self.handle_metadata_extraction()
+        elif self.path == '/api/music-library':
+            self.handle_music_library()
         else:
             self.send_error(404, "Not Found")
 
+    def do_HEAD(self):
+        if self.path.startswith('/api/music-file/'):
+            return self.handle_music_file(head_only=True)
+        return super().do_HEAD()
+
     def do_GET(self):
         # Lightweight API endpoint for version info
         if self.path.startswith('/version'):
             return self.handle_version_info()
         # Music folder API endpoints
-        elif self.path == '/api/music-folder':
+        elif self.path == '/api/music-folder' or self.path.startswith('/api/music-folder?'):
             return self.handle_music_folder_list()
         elif self.path.startswith('/api/music-file/'):
             return self.handle_music_file()
         elif self.path.startswith('/api/music-metadata/'):
             return self.handle_music_metadata()
+        elif self.path == '/api/music-library' or self.path.startswith('/api/music-library?'):
+            return self.handle_music_library()
+        elif self.path.startswith('/api/art/'):
+            return self.handle_album_art()
+        elif self.path.startswith('/api/peaks/'):
+            return self.handle_peaks()
+        elif self.path == '/api/search' or self.path.startswith('/api/search?'):
+            return self.handle_search()
+        elif self.path == '/api/tracks' or self.path.startswith('/api/tracks?'):
+            return self.handle_tracks()
+        elif self.path == '/api/artists' or self.path.startswith('/api/artists?'):
+            return self.handle_groups('artists')
+        elif self.path == '/api/albums' or self.path.startswith('/api/albums?'):
+            return self.handle_groups('albums')
+        elif self.path == '/api/ingest':
+            return self.handle_ingest_status()
+        elif self.path == '/api/duplicates':
+            return self.handle_duplicates()
+        elif self.path == '/api/events' or self.path.startswith('/api/events?'):
+            return self.handle_events()
+        elif self.path == '/metrics':
+            return self.handle_metrics()
         # Fallback to default static file serving
         return super().do_GET()
 
     def handle_metadata_extraction(self):
-        """Extract metadata from uploaded audio file."""
+        """
+        Extract metadata from an uploaded audio file.
+
+        The body is streamed in fixed-size chunks into a spooled buffer that
+        only touches disk for large files, and is rejected with 413 above the
+        configured size cap. With ``X-Metadata-Mode: header`` the client sends
+        only the leading bytes that hold the tags (plus ``X-File-Size``), and
+        they are parsed entirely in memory. If those bytes hold no tags (they may
+        sit at the end of the file, like ID3v1 and APE tags), the result is
+        labelled ``extraction_method: "header"`` so the client sends the whole file.
+        """
         if not METADATA_AVAILABLE:
             self.send_error(503, "Metadata extraction not available")
             return
@@ -69,45 +962,72 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 self.send_error(400, "No file data received")
                 return
 
-            # Read file data
-            file_data = self.rfile.read(content_length)
-            
             # Get filename from headers
             filename = self.headers.get('X-Filename', 'unknown.mp3')
-            
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1]) as temp_file:
-                temp_file.write(file_data)
-                temp_file_path = temp_file.name
+            header_only = self.headers.get('X-Metadata-Mode', '').lower() == 'header'
+            size_limit = MAX_HEADER_UPLOAD if header_only else self.server.max_upload_size
 
-            try:
-                # Extract metadata
-                metadata = extract_metadata(temp_file_path)
-                
-                # If extraction failed, try filename parsing
-                if 'error' in metadata:
-                    filename_metadata = parse_filename_metadata(filename)
-                    metadata = {**filename_metadata, "file_name": filename}
-                    metadata["extraction_method"] = "filename"
-                else:
-                    metadata["extraction_method"] = "tags"
-                
-                # Send response
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps(metadata).encode('utf-8'))
-                
-            finally:
-                # Clean up temporary file
+            if content_length > size_limit:
+                # The body is left unread, so the response closes the connection
+                self.send_error(413, f"Upload too large (limit {size_limit // (1024 * 1024)} MB)")
+                return
+
+            if header_only:
+                with stage('upload_read'):
+                    data = self.read_body_chunks(content_length, io.BytesIO()).getvalue()
                 try:
-                    os.unlink(temp_file_path)
-                except:
-                    pass
+                    file_size = int(self.headers.get('X-File-Size', len(data)))
+                except ValueError:
+                    file_size = len(data)
+                metadata = extract_metadata_from_header(data, filename, file_size,
+                                                        art_store=self.server.art_store)
+            else:
+                with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_SIZE) as upload:
+                    with stage('upload_read'):
+                        self.read_body_chunks(content_length, upload)
+                    metadata = extract_metadata_from_fileobj(upload, filename,
+                                                             art_store=self.server.art_store)
+
+            # If extraction failed, try filename parsing
+            if 'error' in metadata:
+                filename_metadata = parse_filename_metadata(filename)
+                metadata = {**filename_metadata, "file_name": filename}
+                metadata["extraction_method"] = "filename"
+            elif header_only and not any(metadata.get(field) for field in TAG_FIELDS):
+                metadata["extraction_method"] = "header"
+            else:
+                metadata["extraction_method"] = "tags"
 
+            # Send response
+            with stage('json_encode'):
+                body = encode_json(metadata)
+            self.send_response(200)
+            self.send_body(body, 'application/json')
+
+        except ConnectionError:
+            self.close_connection = True
         except Exception as e:
             self.send_error(500, f"Error processing file: {str(e)}")
 
+    def read_body_chunks(self, content_length, buffer):
+        """
+        Copy the request body into ``buffer`` in UPLOAD_CHUNK_SIZE pieces.
+
+        Raises:
+            ConnectionError: If the client disconnects or stalls before sending everything
+        """
+        remaining = content_length
+        while remaining > 0:
+            try:
+                chunk = self.rfile.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            except TimeoutError:
+                raise ConnectionError("Upload stalled")
+            if not chunk:
+                raise ConnectionError("Upload ended early")
+            buffer.write(chunk)
+            remaining -= len(chunk)
+        return buffer
+
     def handle_version_info(self):
         """Return current version and attempt to fetch latest version (best-effort)."""
         try:
@@ -150,119 +1070,959 @@ class CustomHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 'update_available': (latest_version is not None and latest_version != current_version)
             }
             self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(payload).encode('utf-8'))
+            self.send_body(encode_json(payload), 'application/json')
         except Exception as e:
             self.send_error(500, f"Error generating version info: {str(e)}")
 
     def handle_music_folder_list(self):
-        """List all music files in the music folder."""
+        """
+        List all music files in the music folder.
+
+        Served from the in-memory library index. With ``?since=<epoch>-<generation>``
+        (the ``X-Library-Sync`` header of an earlier listing) only the files added,
+        modified or removed after that generation are returned, together with the
+        current epoch and generation for the next sync. Generations restart when
+        the index is rebuilt from scratch, so a token from another epoch gets a reset.
+        """
         try:
-            music_folder = Path('music')
-            
-            if not music_folder.exists():
+            index = self.library()
+            if index is None:
                 self.send_error(404, "Music folder not found")
                 return
+
+            # The listing changes exactly when the index generation does. Taken before
+            # the listing is built, so a sync token never skips a concurrent change.
+            epoch, generation = index.epoch, index.generation
+            etag = f'"lib-{epoch}-{generation}"'
+            if self.is_fresh(etag):
+                self.send_not_modified(etag, 'no-cache')
+                return
+
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            if 'since' in query:
+                # A bare generation cannot be matched to an epoch and is answered with a reset
+                epoch, _, since = query['since'][0].rpartition('-')
+                try:
+                    since = int(since)
+                except ValueError:
+                    self.send_error(400, "Invalid generation")
+                    return
+                payload = index.changes_since(since, epoch)
+            else:
+                # Full listing, sorted by name
+                payload = index.listing()
             
-            # Get all audio files
-            audio_extensions = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma'}
-            music_files = []
-            
-            for file_path in music_folder.rglob('*'):
-                if file_path.is_file() and file_path.suffix.lower() in audio_extensions:
-                    music_files.append({
-                        'name': file_path.name,
-                        'path': str(file_path.relative_to(music_folder)),
-                        'size': file_path.stat().st_size,
-                        'modified': file_path.stat().st_mtime
-                    })
-            
-            # Sort by name
-            music_files.sort(key=lambda x: x['name'].lower())
-            
+            with stage('json_encode'):
+                body = encode_json(payload)
             self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(music_files).encode('utf-8'))
+            self.send_header('X-Library-Generation', str(generation))
+            self.send_header('X-Library-Sync', f'{epoch}-{generation}')
+            self.send_body(body, 'application/json', etag, 'no-cache')
             
         except Exception as e:
             self.send_error(500, f"Error listing music folder: {str(e)}")
 
-    def handle_music_file(self):
-        """Serve a specific music file from the music folder."""
+    def library(self):
+        """The server's library index, or a freshly scanned one of ./music (None if it is missing)."""
+        index = getattr(self.server, 'library_index', None)
+        if index is None:
+            music_folder = Path('music')
+            if not music_folder.exists():
+                return None
+            index = LibraryIndex(music_folder, AUDIO_EXTENSIONS)
+            index.refresh()
+        return index
+
+    def music_path(self, rel_path):
+        """Filesystem path of a library path taken from a URL, or None if it names no library root."""
+        if not is_library_path(rel_path):
+            return None
+        index = getattr(self.server, 'library_index', None)
+        if index is None:
+            return Path('music') / rel_path
+        return index.file_path(rel_path)
+
+    def handle_music_file(self, head_only=False):
+        """Stream a music file from the music folder, honouring single byte ranges."""
         try:
             # Extract file path from URL (includes subfolders)
             file_path_str = urllib.parse.unquote(self.path.split('/api/music-file/')[-1])
-            music_folder = Path('music')
-            file_path = music_folder / file_path_str
+            file_path = self.music_path(file_path_str)
             
-            if not file_path.exists() or not file_path.is_file():
+            if file_path is None or not file_path.is_file():
                 self.send_error(404, "Music file not found")
                 return
             
             # Check if it's an audio file
-            audio_extensions = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma'}
-            if file_path.suffix.lower() not in audio_extensions:
+            if file_path.suffix.lower() not in AUDIO_EXTENSIONS:
                 self.send_error(400, "Not an audio file")
                 return
             
-            # Serve the file
-            self.send_response(200)
-            self.send_header('Content-Type', 'audio/mpeg')  # Default to MP3
-            self.send_header('Content-Length', str(file_path.stat().st_size))
-            self.end_headers()
-            
             with open(file_path, 'rb') as f:
-                self.wfile.write(f.read())
-                
+                st = os.fstat(f.fileno())
+                file_size = st.st_size
+                etag = file_etag(st)
+                policy = cache_control(self.server.audio_max_age)
+
+                if self.is_fresh(etag, st.st_mtime):
+                    self.send_not_modified(etag, policy, st.st_mtime)
+                    return
+
+                range_header = self.headers.get('Range')
+                if_range = self.headers.get('If-Range')
+                if range_header and if_range and not (
+                        etag_matches(if_range, etag) if if_range.strip().startswith(('"', 'W/'))
+                        else not modified_since(if_range, st.st_mtime)):
+                    # The client's partial copy is stale: send the whole file
+                    range_header = None
+
+                try:
+                    byte_range = parse_range_header(range_header, file_size)
+                except ValueError:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{file_size}')
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                if byte_range is None:
+                    start, end = 0, file_size - 1
+                    self.send_response(200)
+                else:
+                    start, end = byte_range
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{end}/{file_size}')
+                length = end - start + 1 if file_size else 0
+
+                self.send_header('Content-Type', AUDIO_MIME_TYPES[file_path.suffix.lower()])
+                self.send_header('Content-Length', str(length))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_validators(etag, policy, st.st_mtime)
+                self.end_headers()
+
+                if not head_only and length:
+                    self.stream_file_range(f, start, length)
+
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            # Client went away or stopped reading mid-stream (e.g. the user seeked)
+            self.close_connection = True
         except Exception as e:
             self.send_error(500, f"Error serving music file: {str(e)}")
 
+    def stream_file_range(self, f, offset, count):
+        """
+        Copy ``count`` bytes of an open file to the client starting at ``offset``.
+
+        ``socket.sendfile`` uses ``os.sendfile`` where the platform supports it
+        (zero-copy) and otherwise falls back to fixed-size reads, so memory use
+        stays constant regardless of file size.
+
+        Returns:
+            int: Number of bytes sent
+        """
+        self.wfile.flush()
+        with stage('socket_write'):
+            sent = self.connection.sendfile(f, offset=offset, count=count)
+        self.wfile.bytes_written += sent
+        return sent
+
     def handle_music_metadata(self):
         """Extract metadata from a music file in the music folder."""
         try:
             # Extract file path from URL (includes subfolders)
             file_path_str = urllib.parse.unquote(self.path.split('/api/music-metadata/')[-1])
-            music_folder = Path('music')
-            file_path = music_folder / file_path_str
+            file_path = self.music_path(file_path_str)
             
-            if not file_path.exists() or not file_path.is_file():
+            if file_path is None or not file_path.is_file():
                 self.send_error(404, "Music file not found")
                 return
             
             # Check if it's an audio file
-            audio_extensions = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma'}
-            if file_path.suffix.lower() not in audio_extensions:
+            if file_path.suffix.lower() not in AUDIO_EXTENSIONS:
                 self.send_error(400, "Not an audio file")
                 return
             
-            # Import metadata extraction function
-            from metadata_reader import extract_metadata, parse_filename_metadata
+            # Revalidation is answered from the file's identity without extracting
+            st = file_path.stat()
+            etag = file_etag(st, kind='m')
+            policy = cache_control(self.server.metadata_max_age)
+            if self.is_fresh(etag, st.st_mtime):
+                self.send_not_modified(etag, policy, st.st_mtime)
+                return
             
-            # Extract metadata
-            metadata = extract_metadata(str(file_path))
+            # Extract metadata, served from the persistent cache when the file is unchanged
+            extractor = partial(extract_metadata, art_store=self.server.art_store)
+            warmer = self.server.warmer
+            if warmer is not None:
+                # Not warmed yet: move it to the front of the background queue
+                extractor = partial(self.fetch_from_warmer, warmer, extractor)
+            cache = getattr(self.server, 'metadata_cache', None)
+            if cache is not None:
+                metadata, _ = cache.get_or_extract(str(file_path), extractor)
+            else:
+                metadata = extractor(str(file_path))
             
-            # If extraction failed, try filename parsing as fallback
-            if 'error' in metadata:
-                filename = file_path.name  # Use just the filename for parsing
-                filename_metadata = parse_filename_metadata(filename)
-                metadata = {**filename_metadata, "file_name": filename}
+            # If extraction failed, infer what we can from the file and folder names
+            metadata = with_path_fallback(metadata, file_path_str, self.server.library_root_depth)
             
             # Send JSON response
+            with stage('json_encode'):
+                body = encode_json(metadata)
             self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            
-            response_data = json.dumps(metadata, indent=2)
-            self.wfile.write(response_data.encode('utf-8'))
+            self.send_body(body, 'application/json', etag, policy, st.st_mtime)
                 
         except Exception as e:
             self.send_error(500, f"Error extracting metadata: {str(e)}")
 
+    @staticmethod
+    def fetch_from_warmer(warmer, extractor, file_path):
+        """Wait for the pre-warmer to extract a file, extracting inline if it cannot."""
+        with stage('prewarm_wait'):
+            metadata = warmer.fetch(file_path)
+        if metadata is None or metadata.get('transient'):
+            metadata = extractor(file_path)
+        return metadata
+
+    def handle_album_art(self):
+        """Serve a cover image from the art store as raw bytes: /api/art/<hash>?size=64|300|600."""
+        try:
+            url = urllib.parse.urlsplit(self.path)
+            digest = url.path[len('/api/art/'):]
+            query = urllib.parse.parse_qs(url.query)
+            try:
+                size = int(query.get('size', [DEFAULT_ART_SIZE])[0])
+            except ValueError:
+                size = None
+            if size not in ART_SIZES:
+                self.send_error(400, f"Unsupported art size (use one of {', '.join(map(str, ART_SIZES))})")
+                return
+
+            store = self.server.art_store
+            found = store.get(digest, size) if store is not None and is_valid_hash(digest) else None
+            if found is None:
+                self.send_error(404, "Album art not found")
+                return
+            art_path, mime = found
+
+            # The hash identifies the source image, so the ETag is stable forever
+            etag = f'"{digest}-{size}"'
+            if self.is_fresh(etag):
+                self.send_not_modified(etag, ART_CACHE_CONTROL)
+                return
+
+            with stage('art_read'):
+                data = art_path.read_bytes()
+            self.send_response(200)
+            self.send_header('Content-Type', mime)
+            self.send_header('Content-Length', str(len(data)))
+            self.send_validators(etag, ART_CACHE_CONTROL)
+            self.end_headers()
+            with stage('socket_write'):
+                self.wfile.write(data)
+
+        except Exception as e:
+            self.send_error(500, f"Error serving album art: {str(e)}")
+
+    def handle_search(self):
+        """Ranked, paginated search over the library: /api/search?q=&limit=&offset=."""
+        search_index = self.server.search_index
+        if search_index is None:
+            self.send_error(503, "Search index is still loading")
+            return
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        try:
+            limit = int(query.get('limit', [DEFAULT_SEARCH_LIMIT])[0])
+            offset = int(query.get('offset', [0])[0])
+        except ValueError:
+            self.send_error(400, "Invalid limit or offset")
+            return
+        if limit < 0 or offset < 0:
+            self.send_error(400, "Invalid limit or offset")
+            return
+
+        # Results change exactly when the index does
+        etag = f'"search-{self.server.library_index.epoch}-{search_index.version}"'
+        if self.is_fresh(etag):
+            self.send_not_modified(etag, 'no-cache')
+            return
+        payload = search_index.search(query.get('q', [''])[0],
+                                      limit=min(limit, MAX_SEARCH_LIMIT), offset=offset)
+        with stage('json_encode'):
+            body = encode_json(payload)
+        self.send_response(200)
+        self.send_body(body, 'application/json', etag, 'no-cache')
+
+    def catalog_request(self):
+        """
+        Return the catalog, parsed query and ETag for a browse request, or None
+        if the response has already been sent (error or 304).
+        """
+        catalog = self.server.catalog
+        if catalog is None:
+            self.send_error(503, "Library catalog is still loading")
+            return None
+        query = {key: values[0] for key, values in
+                 urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query).items()}
+        # Every page changes exactly when the catalog does
+        etag = f'"cat-{self.server.library_index.epoch}-{catalog.version}"'
+        if self.is_fresh(etag):
+            self.send_not_modified(etag, 'no-cache')
+            return None
+        return catalog, query, etag
+
+    def handle_tracks(self):
+        """
+        Page through the library in a chosen order.
+
+        ``/api/tracks?sort=artist&order=desc&limit=100&cursor=...`` returns up
+        to ``limit`` tracks plus a ``next`` cursor for the following page.
+        ``artist=`` and ``album=`` restrict the listing to one group.
+        """
+        request = self.catalog_request()
+        if request is None:
+            return
+        catalog, query, etag = request
+        try:
+            limit = int(query.get('limit', DEFAULT_PAGE_SIZE))
+            if limit < 1:
+                raise ValueError("limit must be positive")
+            if query.get('order', 'asc') not in ('asc', 'desc'):
+                raise ValueError("order must be asc or desc")
+            page = catalog.page(sort=query.get('sort', DEFAULT_SORT),
+                                descending=query.get('order') == 'desc',
+                                cursor=query.get('cursor'),
+                                limit=min(limit, MAX_PAGE_SIZE),
+                                artist=query.get('artist'), album=query.get('album'))
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+
+        # Same file fields as /api/music-folder, plus the track's metadata
+        index = self.server.library_index
+        for track in page['tracks']:
+            entry = index.get(track['path'])
+            if entry is not None:
+                track.update(entry.as_dict())
+        with stage('json_encode'):
+            body = encode_json(page)
+        self.send_response(200)
+        self.send_body(body, 'application/json', etag, 'no-cache')
+
+    def handle_groups(self, kind):
+        """List artists or albums with track counts and total duration (``offset``/``limit``)."""
+        request = self.catalog_request()
+        if request is None:
+            return
+        catalog, query, etag = request
+        try:
+            offset = int(query.get('offset', 0))
+            limit = int(query.get('limit', MAX_PAGE_SIZE))
+            if offset < 0 or limit < 1:
+                raise ValueError
+        except ValueError:
+            self.send_error(400, "Invalid limit or offset")
+            return
+        groups = catalog.artists() if kind == 'artists' else catalog.albums(query.get('artist'))
+        payload = {'total': len(groups), 'offset': offset, kind: groups[offset:offset + limit]}
+        with stage('json_encode'):
+            body = encode_json(payload)
+        self.send_response(200)
+        self.send_body(body, 'application/json', etag, 'no-cache')
+
+    def handle_ingest_status(self):
+        """Report background pre-warming progress: queue depth, rate and ETA."""
+        warmer = self.server.warmer
+        status = warmer.status() if warmer is not None else {'running': False}
+        index = self.server.library_index
+        status['library_files'] = len(index or ())
+        if isinstance(index, LibraryRoots):
+            status['roots'] = index.status()
+        self.send_response(200)
+        self.send_header('Cache-Control', 'no-store')
+        self.send_body(encode_json(status), 'application/json')
+
+    def client_disconnected(self):
+        """True if the client closed its end of the connection."""
+        readable, _, _ = select.select([self.connection], [], [], 0)
+        if not readable:
+            return False
+        self.connection.settimeout(0)
+        try:
+            return not self.rfile.peek(1)
+        except BlockingIOError:
+            return False
+        except OSError:
+            return True
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def handle_events(self):
+        """
+        Stream library changes and scan/ingest progress as Server-Sent Events.
+
+        A reconnecting client's ``Last-Event-ID`` header (or ``?lastEventId=``)
+        resumes the stream where it stopped; if those events are gone a
+        ``reset`` event tells it to re-list the library. Streams hold a worker
+        each, so only ``max_event_streams`` may be open at once, and they end
+        (for the client to reconnect) when the pool needs its workers back.
+        """
+        bus = self.server.events
+        if bus is None:
+            self.send_error(503, "Event stream not available")
+            return
+        if not bus.open_stream(self.server.max_event_streams):
+            self.send_error(503, "Too many event streams")
+            return
+        try:
+            query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+            last_id = (self.headers.get('Last-Event-ID')
+                       or query.get('lastEventId', [''])[0]).strip()
+            position = bus.resume(last_id)
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-store')
+            # Ask buffering reverse proxies to pass events through immediately
+            self.send_header('X-Accel-Buffering', 'no')
+            self._chunked = self.request_version != 'HTTP/1.0'
+            if self._chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Connection', 'close')
+            self.end_headers()
+
+            self.write_stream(b'retry: %d\n\n' % RETRY_MS)
+            if position is None or not last_id:
+                # New clients get the current state; unresumable ones a reset
+                event_type = 'hello' if position is not None else 'reset'
+                position = bus.resume(None)
+                self.write_stream(format_event(event_type, progress_status(self.server),
+                                               f'{bus.epoch}-{position}'))
+            last_write = time.monotonic()
+            while not (bus.closed or self.server.needs_workers or self.client_disconnected()):
+                events = bus.wait(position, EVENT_POLL_INTERVAL)
+                if events == [] and time.monotonic() - last_write < HEARTBEAT_INTERVAL:
+                    continue
+                last_write = time.monotonic()
+                if events is None:
+                    # Fell behind the kept history: start over from the current state
+                    position = bus.resume(None)
+                    self.write_stream(format_event('reset', progress_status(self.server),
+                                                   f'{bus.epoch}-{position}'))
+                elif events:
+                    position = events[-1][0]
+                    self.write_stream(b''.join(payload for _, payload in events))
+                elif not bus.closed:
+                    self.write_stream(b': heartbeat\n\n')
+            self.end_stream()
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            pass
+        finally:
+            bus.close_stream()
+            self.close_connection = True
+
+    def handle_duplicates(self):
+        """List groups of library files with identical audio content."""
+        fingerprints = self.server.fingerprints
+        if fingerprints is None:
+            self.send_error(503, "Content fingerprints need the metadata cache")
+            return
+        groups = fingerprints.duplicates()
+        payload = {'groups': groups, 'count': len(groups), **fingerprints.status()}
+        self.send_response(200)
+        self.send_header('Cache-Control', 'no-store')
+        self.send_body(encode_json(payload), 'application/json')
+
+    def handle_peaks(self):
+        """
+        Serve waveform peaks of a WAV file: /api/peaks/<path>?buckets=N.
+
+        The body is ``N`` (min, max) pairs of little-endian int16, merged across
+        channels; sample rate and duration are sent as X-Peaks-* headers.
+        """
+        peaks_cache = self.server.peaks_cache
+        if peaks_cache is None:
+            self.send_error(501, "Waveform peaks need numpy (pip install numpy)")
+            return
+        url = urllib.parse.urlsplit(self.path)
+        file_path = self.music_path(urllib.parse.unquote(url.path[len('/api/peaks/'):]))
+        if file_path is None or not file_path.is_file():
+            self.send_error(404, "Music file not found")
+            return
+        if file_path.suffix.lower() != '.wav':
+            self.send_error(415, "Waveform peaks are only available for WAV files")
+            return
+        try:
+            buckets = int(urllib.parse.parse_qs(url.query).get('buckets', [DEFAULT_BUCKETS])[0])
+        except ValueError:
+            self.send_error(400, "Invalid bucket count")
+            return
+        if not 1 <= buckets <= MAX_BUCKETS:
+            self.send_error(400, f"buckets must be between 1 and {MAX_BUCKETS}")
+            return
+
+        st = file_path.stat()
+        etag = file_etag(st, kind='p')
+        policy = cache_control(self.server.audio_max_age)
+        if self.is_fresh(etag, st.st_mtime):
+            self.send_not_modified(etag, policy, st.st_mtime)
+            return
+        try:
+            peaks, info = peaks_cache.get(str(file_path), st, buckets)
+        except ValueError as e:
+            self.send_error(415, str(e))
+            return
+        body = peaks.astype('<i2').tobytes()
+        self.send_response(200)
+        self.send_header('X-Peaks-Buckets', str(len(peaks)))
+        self.send_header('X-Peaks-Sample-Rate', str(info['sample_rate']))
+        self.send_header('X-Peaks-Duration', f"{info['duration']:.3f}")
+        self.send_body(body, 'application/octet-stream', etag, policy, st.st_mtime)
+
+    def handle_metrics(self):
+        """Expose counters, gauges and histograms in the Prometheus text format."""
+        body = metrics.REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Cache-Control', 'no-store')
+        self.send_body(body, metrics.CONTENT_TYPE)
+
+    def read_library_request(self):
+        """
+        Return the subset of library paths requested, or None for the whole folder.
+
+        GET accepts repeated ``?path=`` query parameters; POST accepts a JSON
+        body of the form ``{"paths": [...]}``.
+        """
+        if self.command == 'POST':
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length == 0:
+                return None
+            body = json.loads(self.rfile.read(content_length).decode('utf-8'))
+            paths = body.get('paths') if isinstance(body, dict) else None
+            return [str(p) for p in paths] if paths is not None else None
+
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        return query.get('path')
+
+    def handle_music_library(self):
+        """
+        Stream metadata for the music folder as NDJSON, one track per line.
+
+        Each library root is stat'ed by its own thread and its cached entries
+        are written as soon as that root is done, so a slow mount does not
+        hold up the others. The rest are extracted in parallel on a process
+        pool and written in completion order, so the client can render
+        progressively. A file that exceeds the per-file timeout is reported
+        with filename-based metadata instead of stalling the batch.
+        """
+        if not METADATA_AVAILABLE:
+            self.send_error(503, "Metadata extraction not available")
+            return
+
+        try:
+            index = self.library()
+            if index is None:
+                self.send_error(404, "Music folder not found")
+                return
+
+            try:
+                requested = self.read_library_request()
+            except (ValueError, UnicodeDecodeError):
+                self.send_error(400, "Invalid library request")
+                return
+
+            # Library paths to send, per root
+            roots = []
+            for root_index in index.indexes():
+                if requested is None:
+                    rel_paths = [entry.path for entry in root_index.entries()]
+                else:
+                    rel_paths = [rel_path for rel_path in dict.fromkeys(requested)
+                                 if is_library_path(rel_path)
+                                 and root_index.file_path(rel_path) is not None]
+                rel_paths = [rel_path for rel_path in rel_paths
+                             if os.path.splitext(rel_path)[1].lower() in AUDIO_EXTENSIONS]
+                roots.append((root_index, rel_paths))
+
+            finished = queue.Queue()
+
+            def stat_root(root_index, rel_paths):
+                try:
+                    finished.put(stat_files(root_index, rel_paths))
+                except Exception:
+                    finished.put({})
+
+            for root_index, rel_paths in roots:
+                threading.Thread(target=stat_root, args=(root_index, rel_paths),
+                                 name='library-stat', daemon=True).start()
+
+            encoding = self.response_encoding('application/x-ndjson')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.send_header('Cache-Control', 'no-store')
+            self.send_header('X-Total-Count', str(sum(len(rel_paths) for _, rel_paths in roots)))
+            self.send_header('Vary', 'Accept-Encoding')
+            if encoding:
+                self.send_header('Content-Encoding', encoding)
+            # The length is unknown up front: chunked for HTTP/1.1, close-delimited otherwise
+            self._chunked = self.request_version != 'HTTP/1.0'
+            if self._chunked:
+                self.send_header('Transfer-Encoding', 'chunked')
+            else:
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            encoder = StreamCompressor(encoding) if encoding else None
+
+            # Cached records go out in batches as each root finishes;
+            # each write is flushed through the encoder
+            cache = getattr(self.server, 'metadata_cache', None)
+            missing = {}
+            for _ in roots:
+                batch = []
+                for rel_path, (file_path, st) in finished.get().items():
+                    metadata = cache.get(file_path, st) if cache is not None else None
+                    if metadata is None:
+                        missing[file_path] = (rel_path, st)
+                        continue
+                    batch.append(self.library_record(rel_path, st, metadata, True))
+                    if len(batch) >= LIBRARY_BATCH_RECORDS:
+                        self.write_stream(b''.join(batch), encoder)
+                        batch = []
+                if batch:
+                    self.write_stream(b''.join(batch), encoder)
+
+            results = iter_metadata_parallel(
+                list(missing),
+                jobs=getattr(self.server, 'library_jobs', None),
+                timeout=getattr(self.server, 'file_timeout', DEFAULT_FILE_TIMEOUT),
+                extract_kwargs={'art_store': self.server.art_store}
+            )
+            for file_path, metadata in results:
+                rel_path, st = missing[file_path]
+                if cache is not None and not metadata.get('transient'):
+                    cache.put(file_path, metadata, st)
+                self.write_stream(self.library_record(rel_path, st, metadata, False), encoder)
+            self.end_stream(encoder)
+
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            # Client stopped reading; closing the generator terminates the pool
+            self.close_connection = True
+        except Exception as e:
+            # Once streaming has started this only closes the connection
+            self.send_error(500, f"Error loading music library: {str(e)}")
+
+    def write_stream(self, data, encoder=None):
+        """Write part of a streamed body, compressing it first if an encoder is given."""
+        if encoder is not None:
+            with stage('compress'):
+                data = encoder.write(data)
+        if not data:
+            # An empty chunk would end a chunked body
+            return
+        with stage('socket_write'):
+            if self._chunked:
+                self.wfile.write(b'%x\r\n%b\r\n' % (len(data), data))
+            else:
+                self.wfile.write(data)
+
+    def end_stream(self, encoder=None):
+        """Finish a streamed body: flush the encoder and send the last chunk."""
+        if encoder is not None:
+            self.write_stream(encoder.finish())
+        if self._chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def library_record(self, rel_path, st, metadata, cached):
+        """Return one NDJSON line describing a track in the library."""
+        name = rel_path.rsplit('/', 1)[-1]
+        record = {
+            'name': name,
+            'path': rel_path,
+            'size': st.st_size,
+            'modified': st.st_mtime,
+            'cached': cached,
+            'metadata': with_path_fallback(metadata, rel_path, self.server.library_root_depth),
+        }
+        with stage('json_encode'):
+            return encode_json(record) + b'\n'
+
+
+def parse_args(argv=None):
+    """Parse command-line options for the server."""
+    parser = argparse.ArgumentParser(description='Liquid Glass Music Player server')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f'Maximum concurrent requests (default: {DEFAULT_MAX_WORKERS})')
+    parser.add_argument('--event-streams', type=int, default=None,
+                        help='Concurrent /api/events streams allowed; each holds a worker '
+                             '(default: a quarter of --workers)')
+    parser.add_argument('--queue-depth', type=int, default=DEFAULT_MAX_QUEUE,
+                        help=f'Connections allowed to wait for a worker before '
+                             f'returning 503 (default: {DEFAULT_MAX_QUEUE})')
+    parser.add_argument('--drain-timeout', type=float, default=DEFAULT_DRAIN_TIMEOUT,
+                        help=f'Seconds to wait for in-flight streams on shutdown '
+                             f'(default: {DEFAULT_DRAIN_TIMEOUT:.0f})')
+    parser.add_argument('--keepalive-timeout', type=float, default=DEFAULT_KEEPALIVE_TIMEOUT,
+                        help=f'Seconds an idle connection is kept open for the next request '
+                             f'(default: {DEFAULT_KEEPALIVE_TIMEOUT:g}, 0 to close after every response)')
+    parser.add_argument('--keepalive-requests', type=int, default=DEFAULT_KEEPALIVE_REQUESTS,
+                        help=f'Requests answered on one connection before it is closed '
+                             f'(default: {DEFAULT_KEEPALIVE_REQUESTS})')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help=f'Seconds a new connection may wait before sending its request, and '
+                             f'any socket read or write may block (default: {DEFAULT_REQUEST_TIMEOUT:g}, '
+                             f'0 for no limit)')
+    parser.add_argument('--no-browser', action='store_true',
+                        help='Do not open a browser window on startup')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Disable the persistent metadata cache')
+    parser.add_argument('--scan-interval', type=float, default=DEFAULT_SCAN_INTERVAL,
+                        help=f'Seconds between quick rescans of the music folder '
+                             f'(default: {DEFAULT_SCAN_INTERVAL:g})')
+    parser.add_argument('--full-scan-interval', type=float, default=DEFAULT_FULL_SCAN_INTERVAL,
+                        help=f'Seconds between rescans that stat every file '
+                             f'(default: {DEFAULT_FULL_SCAN_INTERVAL:g})')
+    parser.add_argument('--library-root', action='append', default=[], metavar='NAME=PATH',
+                        help='Serve this folder as library root NAME instead of ./music; repeat '
+                             'for several disks or mounts. Paths are namespaced by root name')
+    parser.add_argument('--scan-jobs', type=int, default=DEFAULT_SCAN_JOBS,
+                        help=f'Directories of a library root listed at once while scanning '
+                             f'(default: {DEFAULT_SCAN_JOBS}; raise for SSDs and network mounts)')
+    parser.add_argument('--root-jobs', action='append', default=[], metavar='NAME=N',
+                        help='Scan concurrency of one library root, overriding --scan-jobs '
+                             '(e.g. nas=16 for a network mount, hdd=1 for a spinning disk)')
+    parser.add_argument('--max-upload-mb', type=int, default=DEFAULT_MAX_UPLOAD_MB,
+                        help=f'Largest file accepted by /extract-metadata in MB '
+                             f'(default: {DEFAULT_MAX_UPLOAD_MB})')
+    parser.add_argument('--library-jobs', type=int, default=None,
+                        help='Worker processes used to extract metadata for /api/music-library '
+                             '(default: CPU count)')
+    parser.add_argument('--file-timeout', type=float, default=DEFAULT_FILE_TIMEOUT,
+                        help=f'Seconds one file may take during a library load '
+                             f'(default: {DEFAULT_FILE_TIMEOUT:g})')
+    parser.add_argument('--audio-max-age', type=int, default=DEFAULT_AUDIO_MAX_AGE,
+                        help=f'Seconds browsers may reuse an audio file before revalidating '
+                             f'(default: {DEFAULT_AUDIO_MAX_AGE})')
+    parser.add_argument('--metadata-max-age', type=int, default=DEFAULT_METADATA_MAX_AGE,
+                        help=f'Seconds browsers may reuse track metadata before revalidating '
+                             f'(default: {DEFAULT_METADATA_MAX_AGE}, always revalidate)')
+    parser.add_argument('--static-max-age', type=int, default=DEFAULT_STATIC_MAX_AGE,
+                        help=f'Seconds browsers may reuse index.html, script.js and styles.css '
+                             f'before revalidating (default: {DEFAULT_STATIC_MAX_AGE}, always revalidate)')
+    parser.add_argument('--no-compression', action='store_true',
+                        help='Send JSON and text responses uncompressed')
+    parser.add_argument('--no-prewarm', action='store_true',
+                        help='Do not extract metadata and thumbnails in the background; '
+                             'files are read when first requested')
+    parser.add_argument('--prewarm-jobs', type=int, default=DEFAULT_PREWARM_JOBS,
+                        help=f'Low-priority worker processes used for background pre-warming '
+                             f'(default: {DEFAULT_PREWARM_JOBS}, plus one kept for on-demand files)')
+    parser.add_argument('--hash-jobs', type=int, default=DEFAULT_HASH_JOBS,
+                        help=f'Threads fingerprinting audio content to recognize moved and '
+                             f'duplicate files (default: {DEFAULT_HASH_JOBS}, 0 to disable)')
+    parser.add_argument('--trace', action='store_true',
+                        help='Add a Server-Timing stage breakdown to every response '
+                             '(otherwise only to requests sent with X-Trace: 1)')
+    args = parser.parse_args(argv)
+    if args.scan_jobs < 1:
+        parser.error('--scan-jobs must be at least 1')
+    try:
+        args.roots = parse_roots(args.library_root, args.root_jobs, args.scan_jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def progress_status(httpd):
+    """
+    Current library scan, pre-warm and fingerprint progress for /api/events.
+
+    Only slowly changing fields are included, so an idle server reports the
+    same status every time and publishes no progress events.
+    """
+    index = httpd.library_index
+    status = {'generation': index.generation, 'library_files': len(index), 'roots': []}
+    for root_index in index.indexes():
+        scanning = root_index.scan_progress
+        status['roots'].append({
+            'name': root_index.namespace,
+            'files': len(root_index),
+            'scanning': scanning is not None,
+            'directories_listed': scanning[0] if scanning else None,
+            'files_seen': scanning[1] if scanning else None,
+        })
+    warmer = httpd.warmer
+    if warmer is not None:
+        warm = warmer.status()
+        status['prewarm'] = {key: warm[key] for key in
+                             ('queued', 'completed', 'failed', 'paused', 'rate', 'eta_seconds')}
+    if httpd.fingerprints is not None:
+        status['fingerprints'] = httpd.fingerprints.status()
+    return status
+
+
+def register_server_metrics(httpd):
+    """Expose pool, cache and library state of a running server at /metrics."""
+    metrics.callback('liquid_music_requests_in_flight',
+                     'Connections queued or being processed', lambda: httpd.in_flight)
+    metrics.callback('liquid_music_worker_threads', 'Size of the request worker pool',
+                     lambda: httpd.max_workers)
+    cache = httpd.metadata_cache
+    if cache is not None:
+        metrics.callback('liquid_music_metadata_cache_hits_total',
+                         'Metadata lookups answered from the persistent cache',
+                         lambda: cache.hit_counts()[0], kind='counter')
+        metrics.callback('liquid_music_metadata_cache_misses_total',
+                         'Metadata lookups that required extraction',
+                         lambda: cache.hit_counts()[1], kind='counter')
+    index = httpd.library_index
+    if index is not None:
+        metrics.callback('liquid_music_library_files', 'Audio files in the library index',
+                         lambda: len(index))
+        metrics.callback('liquid_music_library_generation', 'Current library index generation',
+                         lambda: index.generation)
+        if isinstance(index, LibraryRoots):
+            metrics.callback('liquid_music_library_root_files', 'Audio files in each library root',
+                             lambda: {(root['name'],): root['files'] for root in index.status()},
+                             labelnames=('root',))
+    if httpd.search_index is not None:
+        metrics.callback('liquid_music_search_documents', 'Tracks in the search index',
+                         lambda: len(httpd.search_index))
+    if httpd.events is not None:
+        metrics.callback('liquid_music_event_streams', 'Open /api/events streams',
+                         lambda: httpd.events.streams)
+        metrics.callback('liquid_music_events_published_total', 'Server-Sent Events published',
+                         lambda: httpd.events.published, kind='counter')
+    fingerprints = httpd.fingerprints
+    if fingerprints is not None:
+        metrics.callback('liquid_music_files_hashed_total',
+                         'Audio files fingerprinted', lambda: fingerprints.hashed, kind='counter')
+        metrics.callback('liquid_music_files_moved_total',
+                         'Renamed or moved files whose cached data was carried over',
+                         lambda: fingerprints.moved, kind='counter')
+    warmer = httpd.warmer
+    if warmer is not None:
+        metrics.callback('liquid_music_prewarm_queued', 'Files waiting to be pre-warmed',
+                         lambda: warmer.status()['queued'])
+        metrics.callback('liquid_music_prewarm_completed_total',
+                         'Files pre-warmed in the background', lambda: warmer.completed,
+                         kind='counter')
+        metrics.callback('liquid_music_prewarm_failed_total',
+                         'Files the pre-warmer could not read', lambda: warmer.failed,
+                         kind='counter')
+
+
+def with_path_fallback(metadata, rel_path, root_depth=0):
+    """Replace a failed extraction result with metadata inferred from the file and folder names."""
+    if 'error' not in metadata:
+        return metadata
+    return {**infer_path_metadata(rel_path, root_depth), "file_name": rel_path.rsplit('/', 1)[-1]}
+
+
+def describe_track(path, metadata, root_depth=0):
+    """Metadata the search index and catalog keep for a path, from its name until it is read."""
+    if METADATA_AVAILABLE and (metadata is None or 'error' in metadata):
+        return with_path_fallback({'error': 'not read'}, path, root_depth)
+    return metadata
+
+
+def stop_on_signal(signum, frame):
+    """Signal handler that stops serve_forever() the way Ctrl+C does."""
+    raise KeyboardInterrupt
+
+
+def preload_libraries():
+    """Import mutagen, Pillow and NumPy in the background so the first request need not."""
+    if METADATA_AVAILABLE:
+        load_libraries()
+    if NUMPY_AVAILABLE:
+        load_numpy()
+
+
+def finish_startup(httpd, args, rescan):
+    """
+    Work deferred until the server is listening.
+
+    Catches up with changes made while the server was stopped, builds the
+    search index and catalog (their endpoints answer 503 until then), relinks
+    moved files and starts the background workers. The parsing libraries are
+    imported last, so they do not compete with the first requests.
+
+    Args:
+        httpd (PooledHTTPServer): The running server
+        args (argparse.Namespace): Command-line options
+        rescan (bool): Refresh the library index first (it was restored from a snapshot)
+    """
+    started = time.perf_counter()
+    library_index = httpd.library_index
+    metadata_cache = httpd.metadata_cache
+    try:
+        changed = True
+        if rescan:
+            changes = library_index.refresh()
+            changed = sum(len(paths) for paths in changes.values())
+            if changed:
+                print(f"📚 {changed} file(s) changed since the last run")
+        if changed and library_index.snapshot is not None:
+            library_index.save_snapshot()
+
+        # Unchanged files take their metadata from the memory-mapped snapshot
+        # instead of decoding every cache entry
+        source, snapshot = metadata_cache, None
+        if metadata_cache is not None:
+            snapshot = open_snapshot(LIBRARY_METADATA_PATH, root=library_index.location)
+            if snapshot is not None:
+                source = SnapshotMetadata(snapshot, library_index, metadata_cache)
+        try:
+            describe = partial(describe_track, root_depth=httpd.library_root_depth)
+            search_index = SearchIndex(describe=describe)
+            search_index.attach(library_index, metadata_cache)
+            print(f"🔎 Search index: {search_index.build(library_index, source)} tracks")
+            httpd.search_index = search_index
+            catalog = TrackCatalog(describe=describe)
+            catalog.attach(library_index, metadata_cache)
+            catalog.build(library_index, source)
+            httpd.catalog = catalog
+        finally:
+            if snapshot is not None:
+                snapshot.close()
+        if metadata_cache is not None:
+            httpd.snapshot_writer = SnapshotWriter(LIBRARY_METADATA_PATH, library_index,
+                                                   metadata_cache)
+            if snapshot is None or changed or source.from_cache:
+                httpd.snapshot_writer.mark_dirty()
+            httpd.snapshot_writer.start()
+
+        if metadata_cache is not None and args.hash_jobs > 0:
+            # Started before the warmer so moves are relinked before anything is re-read
+            fingerprints = FingerprintIndex(library_index, metadata_cache, jobs=args.hash_jobs,
+                                            peaks_cache=httpd.peaks_cache)
+            moved = fingerprints.relink_missing()
+            if moved:
+                print(f"🔗 Recognized {moved} moved or renamed file(s)")
+            fingerprints.start()
+            httpd.fingerprints = fingerprints
+        if (MetadataWarmer is not None and METADATA_AVAILABLE and metadata_cache is not None
+                and not args.no_prewarm):
+            # Background work backs off while at least half the request workers are busy
+            httpd.warmer = MetadataWarmer(
+                library_index, metadata_cache, httpd.art_store,
+                jobs=args.prewarm_jobs, timeout=args.file_timeout,
+                is_busy=lambda: httpd.in_flight >= max(1, httpd.max_workers // 2),
+                peaks_cache=httpd.peaks_cache)
+            httpd.warmer.start()
+        library_index.start(interval=args.scan_interval, full_interval=args.full_scan_interval)
+        register_server_metrics(httpd)
+        print(f"✅ Library services ready in {time.perf_counter() - started:.2f}s")
+        preload_libraries()
+    except Exception as e:
+        print(f"⚠️  Startup failed: {e}")
+
+
 def main():
-    PORT = 8000
+    args = parse_args()
+    PORT = args.port
     
     # Change to the directory containing this script
     script_dir = Path(__file__).parent
@@ -276,34 +2036,110 @@ def main():
         print(f"Error: Missing required files: {', '.join(missing_files)}")
         sys.exit(1)
     
-    # Create music folder if it doesn't exist
-    music_folder = Path('music')
-    if not music_folder.exists():
-        music_folder.mkdir()
-        print(f"📁 Created music folder: {music_folder.absolute()}")
-        print(f"💡 Add your music files to this folder for unlimited storage!")
+    if args.roots:
+        # Several folders, each scanned by its own thread; paths are namespaced by root
+        for root in args.roots:
+            if not root.path.is_dir():
+                print(f"⚠️  Library root {root.name} not found: {root.path}")
+        cache_roots = {root.name: root.path for root in args.roots}
+        library_index = LibraryRoots(args.roots, AUDIO_EXTENSIONS, snapshot=LIBRARY_SNAPSHOT_PATH)
+        print("📚 Library roots: " + ', '.join(
+            f"{root.name} ({root.path}, {root.scan_jobs} scan job{'s' if root.scan_jobs > 1 else ''})"
+            for root in args.roots))
+    else:
+        # Create music folder if it doesn't exist
+        music_folder = Path('music')
+        if not music_folder.exists():
+            music_folder.mkdir()
+            print(f"📁 Created music folder: {music_folder.absolute()}")
+            print(f"💡 Add your music files to this folder for unlimited storage!")
+        cache_roots = {'': music_folder}
+        library_index = LibraryIndex(music_folder, AUDIO_EXTENSIONS, snapshot=LIBRARY_SNAPSHOT_PATH,
+                                     scan_jobs=args.scan_jobs)
+
+    # Open the persistent metadata cache (shared by all worker threads)
+    metadata_cache = None
+    if MetadataCache is not None and not args.no_cache:
+        try:
+            metadata_cache = MetadataCache(roots=cache_roots)
+        except Exception as e:
+            print(f"⚠️  Metadata cache disabled: {e}")
     
+    # Restore the index saved by the last run; a rescan after binding catches
+    # up with changes. Only the first run walks the folder before listening.
+    restored = library_index.load_snapshot()
+    if restored:
+        print(f"📚 Restored {len(library_index)} music files from the last run")
+    else:
+        library_index.refresh()
+        print(f"📚 Indexed {len(library_index)} music files")
+
     # Create server
-    with socketserver.TCPServer(("", PORT), CustomHTTPRequestHandler) as httpd:
+    with PooledHTTPServer(("", PORT), CustomHTTPRequestHandler,
+                          max_workers=args.workers,
+                          max_queue=args.queue_depth,
+                          drain_timeout=args.drain_timeout) as httpd:
+        httpd.metadata_cache = metadata_cache
+        httpd.art_store = ArtStore()
+        httpd.library_index = library_index
+        httpd.library_jobs = args.library_jobs
+        httpd.library_root_depth = 1 if args.roots else 0
+        httpd.max_upload_size = args.max_upload_mb * 1024 * 1024
+        httpd.file_timeout = args.file_timeout
+        httpd.keepalive_timeout = max(0.0, args.keepalive_timeout)
+        httpd.keepalive_requests = max(1, args.keepalive_requests)
+        httpd.request_timeout = max(0.0, args.request_timeout)
+        httpd.trace_all = args.trace
+        httpd.audio_max_age = args.audio_max_age
+        httpd.metadata_max_age = args.metadata_max_age
+        httpd.static_max_age = args.static_max_age
+        httpd.compression = not args.no_compression
+        httpd.static_compression = StaticCompressionCache()
+        if NUMPY_AVAILABLE:
+            httpd.peaks_cache = PeaksCache()
+        # Library changes and progress pushed to /api/events subscribers
+        httpd.events = EventBus()
+        httpd.max_event_streams = (args.event_streams if args.event_streams is not None
+                                   else max(1, httpd.max_workers // 4))
+        watch_library(httpd.events, library_index)
+        progress = ProgressReporter(httpd.events, partial(progress_status, httpd))
+        progress.start()
+        threading.Thread(target=finish_startup, args=(httpd, args, restored),
+                         name='startup', daemon=True).start()
         print(f"🎵 Liquid Glass Music Player Server")
         print(f"📡 Server running at http://localhost:{PORT}")
-        print(f"🌐 Opening browser...")
+        print(f"🧵 Workers: {httpd.max_workers} (queue depth {httpd.max_queue})")
         print(f"📁 Serving files from: {script_dir}")
         print(f"⏹️  Press Ctrl+C to stop the server")
         print("-" * 50)
         
         # Open browser
-        try:
-            webbrowser.open(f'http://localhost:{PORT}')
-        except Exception as e:
-            print(f"Could not open browser automatically: {e}")
-            print(f"Please manually open http://localhost:{PORT}")
+        if not args.no_browser:
+            print(f"🌐 Opening browser...")
+            try:
+                webbrowser.open(f'http://localhost:{PORT}')
+            except Exception as e:
+                print(f"Could not open browser automatically: {e}")
+                print(f"Please manually open http://localhost:{PORT}")
         
+        # Service managers stop the server with SIGTERM: shut down as for Ctrl+C,
+        # so in-flight requests finish and the library snapshot is saved
+        signal.signal(signal.SIGTERM, stop_on_signal)
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
-            print("\n🛑 Server stopped by user")
-            httpd.shutdown()
+            print("\n🛑 Server stopped by user, finishing in-flight requests...")
+        finally:
+            # End open event streams so their workers can drain
+            httpd.events.close()
+            progress.stop()
+            if httpd.warmer is not None:
+                httpd.warmer.stop()
+            if httpd.fingerprints is not None:
+                httpd.fingerprints.stop()
+            library_index.stop()
+            if httpd.snapshot_writer is not None:
+                httpd.snapshot_writer.stop()
 
 if __name__ == "__main__":
     main()
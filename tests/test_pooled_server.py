@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Pooled Server Tests
+A metadata request must be answered while another client is still in the
+middle of streaming a large file it has stopped reading, and stopping the
+server must end every worker even when clients never finish their requests.
+
+Run with ``python -m pytest tests`` or ``python -m unittest discover tests``.
+"""
+
+import sys
+import time
+import socket
+import struct
+import tempfile
+import threading
+import unittest
+import http.client
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from server import PooledHTTPServer, CustomHTTPRequestHandler
+from library_index import LibraryIndex
+from metadata_reader import AUDIO_EXTENSIONS
+
+# Far more than the socket buffers hold, so the stream cannot finish unread
+LARGE_FILE_SIZE = 64 * 1024 * 1024
+# Seconds the metadata request may take
+METADATA_TIMEOUT = 5.0
+# Seconds stopped servers give in-flight requests, and workers then get to end
+DRAIN_TIMEOUT = 1.0
+WORKER_EXIT_TIMEOUT = 5.0
+
+
+def write_wav(path, data_size):
+    """Write a silent 16-bit mono WAV file with ``data_size`` bytes of samples."""
+    header = (b'RIFF' + struct.pack('<I', 36 + data_size) + b'WAVE'
+              + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, 44100, 88200, 2, 16)
+              + b'data' + struct.pack('<I', data_size))
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.truncate(len(header) + data_size)
+
+
+class PooledServerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        music = Path(self.tmp.name)
+        write_wav(music / 'large.wav', LARGE_FILE_SIZE)
+        write_wav(music / 'small.wav', 44100 * 2)
+        self.index = LibraryIndex(music, AUDIO_EXTENSIONS)
+        self.index.refresh()
+        self.httpd = None
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        if self.httpd is not None:
+            self.stop_server()
+        self.tmp.cleanup()
+
+    def start_server(self, max_workers=4, max_queue=4, request_timeout=None):
+        self.httpd = PooledHTTPServer(('127.0.0.1', 0), CustomHTTPRequestHandler,
+                                      max_workers=max_workers, max_queue=max_queue,
+                                      drain_timeout=DRAIN_TIMEOUT)
+        self.httpd.library_index = self.index
+        if request_timeout is not None:
+            self.httpd.request_timeout = request_timeout
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop_server(self):
+        httpd, self.httpd = self.httpd, None
+        httpd.shutdown()
+        httpd.server_close()
+        self.thread.join(timeout=5)
+
+    def connect(self):
+        sock = socket.create_connection(('127.0.0.1', self.port), timeout=METADATA_TIMEOUT)
+        self.sockets.append(sock)
+        return sock
+
+    def open_stalled_stream(self):
+        """Request the large file and read only the response head."""
+        sock = self.connect()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.sendall(b'GET /api/music-file/large.wav HTTP/1.1\r\n'
+                     b'Host: localhost\r\nConnection: close\r\n\r\n')
+        head = sock.recv(4096)
+        self.assertTrue(head.startswith(b'HTTP/1.0 200') or head.startswith(b'HTTP/1.1 200'), head[:64])
+        return sock
+
+    def test_metadata_while_streaming(self):
+        self.start_server()
+        self.open_stalled_stream()
+        self.assertGreaterEqual(self.httpd.in_flight, 1)
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=METADATA_TIMEOUT)
+        try:
+            conn.request('GET', '/api/music-metadata/small.wav')
+            response = conn.getresponse()
+            body = response.read()
+        finally:
+            conn.close()
+        self.assertEqual(response.status, 200, body[:200])
+        # The large file is still being sent to the stalled client
+        self.assertGreaterEqual(self.httpd.in_flight, 1)
+
+    def test_shutdown_ends_stuck_workers(self):
+        # No request timeout: only the shutdown can free these workers
+        self.start_server(max_workers=2, max_queue=0, request_timeout=0)
+        self.open_stalled_stream()
+        partial = self.connect()
+        partial.sendall(b'GET /api/music-metadata/small.wav HTTP/1.1\r\nHost: local')
+        deadline = time.monotonic() + METADATA_TIMEOUT
+        while self.httpd.in_flight < 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        rejected = self.connect()
+        rejected.sendall(b'GET /version HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        self.assertTrue(rejected.recv(4096).startswith(b'HTTP/1.0 503'))
+
+        started = time.monotonic()
+        self.stop_server()
+        self.assertLess(time.monotonic() - started, DRAIN_TIMEOUT + WORKER_EXIT_TIMEOUT)
+        # Interpreter exit joins the pool's threads, so they must all end
+        deadline = time.monotonic() + WORKER_EXIT_TIMEOUT
+        while time.monotonic() < deadline and any(
+                thread.name.startswith('liquid-music-worker') for thread in threading.enumerate()):
+            time.sleep(0.05)
+        workers = [thread.name for thread in threading.enumerate()
+                   if thread.name.startswith('liquid-music-worker')]
+        self.assertEqual(workers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Waveform Peaks
+Min/max peak pairs for drawing waveforms of PCM and floating-point WAV files. The
+sample data is memory-mapped and reduced with vectorized NumPy a block at a time,
+so even hour-long recordings are never loaded into Python objects. Peaks for several
+zoom levels are computed once per file version and cached on disk.
+
+Requires the optional numpy package. Can be run directly to print a file's peaks.
+"""
+
+import os
+import sys
+import struct
+import hashlib
+import argparse
+import tempfile
+import threading
+import importlib.util
+from pathlib import Path
+
+# NumPy is imported by load_numpy() when peaks are first computed or loaded
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+np = None
+
+from metrics import stage
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+DEFAULT_PEAKS_PATH = SCRIPT_DIR / '.cache' / 'peaks'
+
+# Bucket counts stored per file; other counts are reduced from the next finer level
+PEAK_LEVELS = (256, 1024, 4096, 16384)
+DEFAULT_BUCKETS = 1024
+MAX_BUCKETS = PEAK_LEVELS[-1]
+
+# Frames reduced per NumPy block (bounds memory use regardless of file length)
+BLOCK_FRAMES = 1 << 20
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class WavInfo:
+    """Layout of a WAV file's sample data."""
+
+    __slots__ = ('format', 'channels', 'sample_rate', 'bits', 'block_align', 'data_offset', 'frames')
+
+    def __init__(self, fmt, channels, sample_rate, bits, block_align, data_offset, frames):
+        self.format = fmt
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.bits = bits
+        self.block_align = block_align
+        self.data_offset = data_offset
+        self.frames = frames
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate if self.sample_rate else 0.0
+
+
+def read_wav_info(file_path):
+    """
+    Parse the RIFF chunks of a WAV file.
+
+    Returns:
+        WavInfo: Sample format and where the sample data starts
+
+    Raises:
+        ValueError: If the file is not a WAV file this module can decode
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:12] != b'WAVE':
+            raise ValueError("Not a RIFF/WAVE file")
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError("No data chunk")
+            chunk_id, chunk_size = header[:4], struct.unpack('<I', header[4:])[0]
+            if chunk_id == b'fmt ':
+                body = f.read(chunk_size)
+                if len(body) < 16:
+                    raise ValueError("Truncated fmt chunk")
+                audio_format, channels, sample_rate, _, block_align, bits = \
+                    struct.unpack('<HHIIHH', body[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    # The first two bytes of the sub-format GUID hold the real format code
+                    audio_format = struct.unpack('<H', body[24:26])[0]
+                fmt = (audio_format, channels, sample_rate, bits, block_align)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError("data chunk before fmt chunk")
+                data_offset = f.tell()
+                # Streamed files may leave the size unset; trust the file length instead
+                data_size = min(chunk_size, file_size - data_offset)
+                audio_format, channels, sample_rate, bits, block_align = fmt
+                if not channels or not block_align:
+                    raise ValueError("Invalid fmt chunk")
+                if (audio_format, bits) not in _DTYPES or block_align != channels * bits // 8:
+                    raise ValueError(f"Unsupported WAV encoding (format {audio_format}, {bits}-bit)")
+                return WavInfo(audio_format, channels, sample_rate, bits, block_align,
+                               data_offset, data_size // block_align)
+            else:
+                f.seek(chunk_size, os.SEEK_CUR)
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)  # chunks are word-aligned
+
+
+def load_numpy():
+    """Import NumPy on first use."""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+# NumPy dtype of one sample for each (format, bits); 24-bit is unpacked by hand
+_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): 'u1',
+    (WAVE_FORMAT_PCM, 16): '<i2',
+    (WAVE_FORMAT_PCM, 24): 'u1',
+    (WAVE_FORMAT_PCM, 32): '<i4',
+    (WAVE_FORMAT_IEEE_FLOAT, 32): '<f4',
+    (WAVE_FORMAT_IEEE_FLOAT, 64): '<f8',
+}
+
+
+def _samples(block, info):
+    """Return a block of frames as numbers (24-bit bytes are combined into int32)."""
+    if info.bits == 24:
+        b = block.astype(np.int32)
+        values = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+        return (values ^ 0x800000) - 0x800000
+    return block
+
+
+def _to_int16(values, info):
+    """Scale reduced peaks to the int16 range (scaling keeps min/max order)."""
+    if info.format == WAVE_FORMAT_IEEE_FLOAT:
+        values = np.nan_to_num(values.astype(np.float64))
+        return np.clip(np.round(values * 32767), -32768, 32767).astype(np.int16)
+    values = values.astype(np.int64)
+    if info.bits == 8:
+        values = (values - 128) << 8
+    elif info.bits == 24:
+        values >>= 8
+    elif info.bits == 32:
+        values >>= 16
+    return values.astype(np.int16)
+
+
+def compute_peaks(file_path, info=None):
+    """
+    Reduce a WAV file to its finest peak level.
+
+    All channels are merged: each bucket holds the lowest and highest sample
+    of any channel within it.
+
+    Returns:
+        numpy.ndarray: int16 array of shape (buckets, 2) holding (min, max)
+    """
+    load_numpy()
+    info = info or read_wav_info(file_path)
+    if info.frames == 0:
+        return np.zeros((0, 2), dtype=np.int16)
+
+    per_bucket = -(-info.frames // MAX_BUCKETS)
+    buckets = -(-info.frames // per_bucket)
+    shape = (info.frames, info.channels, 3) if info.bits == 24 else (info.frames, info.channels)
+    samples = np.memmap(file_path, dtype=_DTYPES[(info.format, info.bits)], mode='r',
+                        offset=info.data_offset, shape=shape)
+
+    mins = np.empty(buckets, dtype=np.float64 if info.format == WAVE_FORMAT_IEEE_FLOAT else np.int64)
+    maxs = np.empty_like(mins)
+    # Whole buckets per block, so block boundaries never split a bucket
+    step = max(1, BLOCK_FRAMES // per_bucket) * per_bucket
+    for start in range(0, info.frames, step):
+        block = _samples(samples[start:start + step], info)
+        first = start // per_bucket
+        whole = len(block) // per_bucket
+        if whole:
+            # Rows of one bucket's samples across all channels: a single contiguous reduction
+            rows = block[:whole * per_bucket].reshape(whole, per_bucket * info.channels)
+            mins[first:first + whole] = rows.min(axis=1)
+            maxs[first:first + whole] = rows.max(axis=1)
+        if len(block) % per_bucket:
+            mins[first + whole] = block[whole * per_bucket:].min()
+            maxs[first + whole] = block[whole * per_bucket:].max()
+    del samples
+
+    return np.stack([_to_int16(mins, info), _to_int16(maxs, info)], axis=1)
+
+
+def downsample(peaks, buckets):
+    """Merge a peak level into ``buckets`` buckets (``buckets`` <= current length)."""
+    load_numpy()
+    if buckets >= len(peaks):
+        return peaks
+    edges = (np.arange(buckets) * len(peaks)) // buckets
+    return np.stack([np.minimum.reduceat(peaks[:, 0], edges),
+                     np.maximum.reduceat(peaks[:, 1], edges)], axis=1)
+
+
+class PeaksCache:
+    """
+    On-disk cache of peak levels, one ``.npz`` file per source file version.
+
+    Entries are named after a hash of the source path plus its size and mtime,
+    so a rewritten file gets new peaks and the old entry is removed.
+    """
+
+    def __init__(self, root=DEFAULT_PEAKS_PATH):
+        self.root = Path(root)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def __getstate__(self):
+        # Picklable for process pools; each process gets its own locks
+        return {'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'])
+
+    def _lock_for(self, name):
+        with self._locks_guard:
+            return self._locks.setdefault(name, threading.Lock())
+
+    def get(self, file_path, st=None, buckets=DEFAULT_BUCKETS):
+        """
+        Return peaks of a WAV file at the requested resolution.
+
+        Args:
+            file_path (str): WAV file
+            st (os.stat_result): Optional current stat of the file
+            buckets (int): Number of (min, max) pairs wanted, at most MAX_BUCKETS
+
+        Returns:
+            tuple: (int16 array of shape (n, 2), dict with 'sample_rate',
+            'channels' and 'duration'); n is smaller than ``buckets`` only for
+            very short files
+
+        Raises:
+            ValueError: If the file is not a decodable WAV file
+        """
+        load_numpy()
+        st = st or os.stat(file_path)
+        prefix = self._prefix(file_path)
+        target = self.root / f'{prefix}-{st.st_size:x}-{st.st_mtime_ns:x}.npz'
+
+        with self._lock_for(prefix):
+            levels = self._load(target)
+            if levels is None:
+                with stage('peaks_compute'):
+                    levels = self._compute(file_path)
+                self._save(target, prefix, levels)
+
+        info = {key: levels[key].item() for key in ('sample_rate', 'channels', 'duration')}
+        buckets = max(1, min(int(buckets), MAX_BUCKETS))
+        level = next((n for n in PEAK_LEVELS if n >= buckets), MAX_BUCKETS)
+        return downsample(levels[f'l{level}'], buckets), info
+
+    def move(self, old_path, new_path, st=None):
+        """Keep the peaks of a file that was renamed or moved (same audio content)."""
+        old_prefix = self._prefix(old_path)
+        st = st or os.stat(new_path)
+        target = self.root / f'{self._prefix(new_path)}-{st.st_size:x}-{st.st_mtime_ns:x}.npz'
+        for source in self.root.glob(f'{old_prefix}-*.npz'):
+            try:
+                os.replace(source, target)
+            except OSError:
+                pass
+            return
+
+    def _prefix(self, file_path):
+        return hashlib.blake2b(Path(file_path).resolve().as_posix().encode('utf-8'),
+                               digest_size=16).hexdigest()
+
+    def _compute(self, file_path):
+        info = read_wav_info(file_path)
+        finest = compute_peaks(file_path, info)
+        levels = {f'l{MAX_BUCKETS}': finest}
+        for n in PEAK_LEVELS[:-1]:
+            levels[f'l{n}'] = downsample(finest, n)
+        levels['sample_rate'] = np.array(info.sample_rate)
+        levels['channels'] = np.array(info.channels)
+        levels['duration'] = np.array(info.duration)
+        return levels
+
+    def _load(self, target):
+        try:
+            with np.load(target) as data:
+                return {key: data[key] for key in data.files}
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, target, prefix, levels):
+        temp_path = None
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **levels)
+            os.replace(temp_path, target)
+        except OSError:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return
+        # Drop peaks computed from older versions of this file
+        for stale in self.root.glob(f'{prefix}-*.npz'):
+            if stale != target:
+                try:
+                    stale.unlink()
+                except OSError:
+                    pass
+
+
+def main():
+    """Main function for command-line usage."""
+    parser = argparse.ArgumentParser(description='Print waveform peaks of a WAV file')
+    parser.add_argument('file_path', help='WAV file')
+    parser.add_argument('--buckets', type=int, default=64,
+                        help='Number of (min, max) pairs (default: 64)')
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        print("Error: numpy is required (pip install numpy)")
+        sys.exit(1)
+    try:
+        info = read_wav_info(args.file_path)
+        peaks = downsample(compute_peaks(args.file_path, info), args.buckets)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"{info.channels} channel(s), {info.sample_rate} Hz, {info.bits}-bit, {info.duration:.2f}s")
+    for low, high in peaks:
+        print(f"{low:7d} {high:7d}")
+
+
+if __name__ == "__main__":
+    main()
+
+# Version: v5.2.0